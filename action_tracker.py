@@ -0,0 +1,200 @@
+"""ネクストアクションの期限管理
+
+データJSON の actions は期限を「次回まで」「1週間後」のような自由な文字列で持つ。
+resolve_deadline() でその記録の 日付 を起点に実際の日付へ直し、ActionIndex に
+期限順の並びと、担当メンター・教科・優先度ごとの (期限順の) 位置の配列を持たせる。
+「メンター X の期限切れの優先度・高のアクション」は、該当する配列を期限で二分探索して切り出すだけで引ける。
+
+保存した行は add_rows() で追加分だけ差し込む。完了の記録はログとは別の小さな表
+(storage の action_status) に (記録ID, 番号, 状態) を追記していき、同じアクションは最後の記録を使う。
+"""
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from records import ACTION_FIELDS
+
+# 「次回まで」は次の面談までの標準的な間隔とみなす
+NEXT_MEETING_DAYS = 14
+
+ACTION_ID = "アクションID"
+STATUS_DONE = "完了"
+STATUS_OPEN = "未完了"
+TABLE_COLUMNS = [ACTION_ID, "記録ID", "日付", "生徒氏名", "担当メンター", "row", "seq", *ACTION_FIELDS, "due"]
+
+_KANJI_DIGITS = str.maketrans("〇一二三四五六七八九", "0123456789")
+_RELATIVE = re.compile(r"^(\d+)(日|週間|週|ヶ月|か月|カ月|ヵ月)(後|以内)?$")
+_MONTH_DAY = re.compile(r"^(\d{1,2})[/月](\d{1,2})日?$")
+_NO_DUE = np.iinfo(np.int64).max  # 期限が読めないアクションは最後に並べる
+
+
+def resolve_deadline(text, base):
+    """期限の文字列を 日付 (base) 起点の日付 (pd.Timestamp) にする。読めなければ NaT"""
+    if base is None or pd.isna(base):
+        return pd.NaT
+    base = pd.Timestamp(base).normalize()
+    t = unicodedata.normalize("NFKC", str(text or "")).translate(_KANJI_DIGITS)
+    t = "".join(t.split())
+    t = t.removesuffix("まで").removesuffix("に") or t
+    if not t:
+        return pd.NaT
+    if t in ("次回", "次の面談", "次回面談"):
+        return base + pd.Timedelta(days=NEXT_MEETING_DAYS)
+    if t in ("今日", "今日中", "当日"):
+        return base
+    if t in ("明日", "明日中"):
+        return base + pd.Timedelta(days=1)
+    if t in ("今週", "今週中"):
+        return base + pd.Timedelta(days=6 - base.weekday())
+    if t in ("来週", "来週中"):
+        return base + pd.Timedelta(days=13 - base.weekday())
+    if t in ("今月", "今月中", "月末"):
+        return base + pd.offsets.MonthEnd(0)
+    if t in ("来月", "来月中"):
+        return base + pd.offsets.MonthBegin(1) + pd.offsets.MonthEnd(0)
+    if t in ("年内", "今年中"):
+        return pd.Timestamp(base.year, 12, 31)
+    if t.startswith("夏休み"):
+        end = pd.Timestamp(base.year, 8, 31)
+        return end if base <= end else pd.Timestamp(base.year + 1, 8, 31)
+    if t.startswith("冬休み"):
+        end = pd.Timestamp(base.year + (1 if base.month >= 4 else 0), 1, 7)
+        return end if base <= end else pd.Timestamp(end.year + 1, 1, 7)
+    m = _RELATIVE.match(t)
+    if m:
+        n, unit = int(m.group(1)), m.group(2)
+        if unit == "日":
+            return base + pd.Timedelta(days=n)
+        if unit in ("週間", "週"):
+            return base + pd.Timedelta(weeks=n)
+        return base + pd.DateOffset(months=n)
+    m = _MONTH_DAY.match(t)
+    if m:
+        try:
+            due = pd.Timestamp(base.year, int(m.group(1)), int(m.group(2)))
+        except ValueError:
+            return pd.NaT
+        return due if due >= base else pd.Timestamp(base.year + 1, due.month, due.day)
+    if re.match(r"^\d{4}[-/年]", t):
+        return pd.to_datetime(t.replace("年", "-").replace("月", "-").rstrip("日"), errors="coerce")
+    return pd.NaT
+
+
+def action_rows(df, actions):
+    """decode_logs() の actions 表にログのメタ情報と解決した期限 (due) を付けた表"""
+    if actions.empty:
+        return pd.DataFrame(columns=TABLE_COLUMNS)
+    keys = actions.index
+    meta = df.loc[keys, ["記録ID", "日付", "生徒氏名", "担当メンター"]]
+    table = pd.DataFrame({
+        "記録ID": meta["記録ID"].to_numpy(),
+        "日付": pd.to_datetime(meta["日付"], errors="coerce").to_numpy(),
+        "生徒氏名": meta["生徒氏名"].to_numpy(),
+        "担当メンター": meta["担当メンター"].to_numpy(),
+        "row": keys.to_numpy(),
+        **{col: actions[col].to_numpy() for col in ["seq", *ACTION_FIELDS]},
+    })
+    # 同じ (期限の文字列, 日付) の組は 1 回だけ解決する
+    pairs = pd.MultiIndex.from_arrays([table["deadline"].astype(str), table["日付"]])
+    unique = pairs.unique()
+    resolved = pd.Series([resolve_deadline(text, base) for text, base in unique], index=unique, dtype="datetime64[ns]")
+    table["due"] = resolved.reindex(pairs).to_numpy()
+    ids = table["記録ID"].fillna("").astype(str)
+    table[ACTION_ID] = np.where(ids != "", ids + "#" + table["seq"].astype(str), "")
+    return table[TABLE_COLUMNS]
+
+
+def latest_status(status_df):
+    """状態の記録 (追記順) から、アクションID → 最新の状態 の dict を作る"""
+    if status_df is None or status_df.empty:
+        return {}
+    # シートから読むと番号が "0.0" のような表記になることがあるので整数に直す
+    seqs = pd.to_numeric(status_df["番号"], errors="coerce").fillna(-1).astype(int).astype(str)
+    ids = status_df["記録ID"].astype(str) + "#" + seqs
+    return dict(zip(ids, status_df["状態"]))
+
+
+class ActionIndex:
+    """アクションを期限順に引くためのインデックス。
+
+    table は追加順 (位置 = 追加した順番) のままにしておき、_order に期限の昇順に並べた位置を、
+    _groups[列][値] にその値を持つ位置を同じく期限順で持つ。追加時は新しい位置を二分探索で差し込む。
+    """
+
+    GROUP_FIELDS = ("担当メンター", "subject", "priority")
+
+    def __init__(self):
+        self.table = pd.DataFrame(columns=TABLE_COLUMNS)
+        self._keys = np.array([], dtype=np.int64)  # 位置 → 期限 (ns)。期限なしは _NO_DUE
+        self._order = np.array([], dtype=np.int64)
+        self._groups = {f: {} for f in self.GROUP_FIELDS}
+
+    @classmethod
+    def build(cls, df, actions):
+        index = cls()
+        index.add_rows(df, actions)
+        return index
+
+    def __len__(self):
+        return len(self.table)
+
+    def _merge(self, positions, new_positions):
+        new_positions = new_positions[np.argsort(self._keys[new_positions], kind="stable")]
+        at = np.searchsorted(self._keys[positions], self._keys[new_positions], side="right")
+        return np.insert(positions, at, new_positions)
+
+    def add_rows(self, df, actions):
+        """保存した行 (df) とその actions 表をインデックスに加える"""
+        new = action_rows(df, actions)
+        if new.empty:
+            return self
+        start = len(self.table)
+        self.table = new if self.table.empty else pd.concat([self.table, new], ignore_index=True)
+        due = new["due"].to_numpy(dtype="datetime64[ns]")
+        keys = np.where(np.isnat(due), _NO_DUE, due.astype(np.int64))
+        self._keys = np.concatenate([self._keys, keys])
+        positions = np.arange(start, start + len(new))
+        self._order = self._merge(self._order, positions)
+        for field in self.GROUP_FIELDS:
+            groups = self._groups[field]
+            for value, pos in pd.Series(positions).groupby(new[field].astype(str).to_numpy()):
+                groups[value] = self._merge(groups.get(value, np.array([], dtype=np.int64)), pos.to_numpy())
+        return self
+
+    def values(self, field):
+        """field の値の一覧 (絞り込みの選択肢用)"""
+        return sorted(self._groups[field])
+
+    def select(self, mentor=None, subject=None, priorities=None, due_from=None, due_to=None,
+               statuses=None, show_done=False):
+        """条件に合うアクションの位置 (table の行番号) を期限の早い順に返す。
+
+        due_from / due_to は期限の範囲 (両端を含む)。statuses は latest_status() の dict で、
+        show_done=False なら完了のものを除き、True なら完了のものだけを返す。
+        """
+        candidates = self._order
+        for field, value in (("担当メンター", mentor), ("subject", subject)):
+            if value:
+                group = self._groups[field].get(value)
+                if group is None:
+                    return np.array([], dtype=np.int64)
+                candidates = group if candidates is self._order else candidates[np.isin(candidates, group)]
+        if due_from is not None or due_to is not None:
+            keys = self._keys[candidates]
+            lo = 0 if due_from is None else np.searchsorted(keys, pd.Timestamp(due_from).value, side="left")
+            hi = len(keys) if due_to is None else np.searchsorted(keys, pd.Timestamp(due_to).value, side="right")
+            candidates = candidates[lo:hi]
+        if priorities:
+            values = self.table["priority"].to_numpy()[candidates]
+            candidates = candidates[np.isin(values, list(priorities))]
+        done = [k for k, v in (statuses or {}).items() if v == STATUS_DONE]
+        if done or show_done:
+            is_done = np.isin(self.table[ACTION_ID].to_numpy()[candidates], done)
+            candidates = candidates[is_done if show_done else ~is_done]
+        return candidates
+
+    def query(self, limit=None, **conditions):
+        """select() の結果を表で返す (limit 件まで)"""
+        return self.table.iloc[self.select(**conditions)[:limit]]
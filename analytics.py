@@ -0,0 +1,62 @@
+"""模試の成績推移の集計
+
+records.decode_logs() の scores 表とログのメタ情報 (日付・生徒・学年など) を結合し、
+全生徒分をまとめて pandas の groupby で計算する (行ごとのループは使わない)。
+
+build_trends() の結果は 1 行 = 1 生徒 × 1 模試 で、次の列を持つ。
+
+- 科目コードごとの点数、total (入力された科目の合計)、n_subjects
+- d_<科目コード> / d_total: 同じ生徒・同じ模試種別で、ひとつ前の模試からの増減
+- pct_学年 / pct_文理 / pct_志望科類: 同じ模試を受けた同じ区分の生徒の中での total のパーセンタイル
+"""
+import pandas as pd
+
+from records import SCORE_CODES
+
+META_COLUMNS = ["日付", "生徒氏名", "学年", "文理", "志望科類", "模試名"]
+COHORT_COLUMNS = ["学年", "文理", "志望科類"]
+
+
+def build_trends(df, scores):
+    """ログ全体の推移表を作る。index は生徒氏名 (ソート済み) で、row 列に元のログの行キーを持つ"""
+    value_cols = [*SCORE_CODES, "total"]
+    out_cols = [
+        *META_COLUMNS, "exam_type", "exam_key", "row", *SCORE_CODES, "total", "n_subjects",
+        *[f"d_{c}" for c in value_cols], *[f"pct_{c}" for c in COHORT_COLUMNS],
+    ]
+    if scores.empty:
+        return pd.DataFrame(columns=out_cols).set_index("生徒氏名", drop=False)
+
+    t = df.loc[scores.index, META_COLUMNS].join(scores)
+    has_score = t[SCORE_CODES].notna()
+    t = t[has_score.any(axis=1)].copy()
+    t["row"] = t.index
+    t["日付"] = pd.to_datetime(t["日付"], errors="coerce")
+    t["total"] = t[SCORE_CODES].sum(axis=1, min_count=1)
+    t["n_subjects"] = has_score.loc[t.index].sum(axis=1)
+
+    # 模試名が空の記録は日付で区別する。同じ模試を複数回記録した場合は最後の記録を使う
+    exam_name = t["模試名"].fillna("").astype(str).str.strip()
+    t["exam_key"] = exam_name.where(exam_name != "", t["日付"].dt.strftime("%Y-%m-%d"))
+    t = t.sort_values(["生徒氏名", "exam_type", "日付", "row"], kind="mergesort")
+    t = t.drop_duplicates(["生徒氏名", "exam_type", "exam_key"], keep="last")
+
+    deltas = t.groupby(["生徒氏名", "exam_type"], sort=False)[value_cols].diff()
+    deltas.columns = [f"d_{c}" for c in value_cols]
+    t = t.join(deltas)
+
+    for col in COHORT_COLUMNS:
+        cohort = t.groupby(["exam_type", "exam_key", t[col].fillna("")], sort=False)["total"]
+        t[f"pct_{col}"] = cohort.rank(pct=True) * 100
+
+    return t[out_cols].set_index("生徒氏名", drop=False).sort_index(kind="mergesort")
+
+
+def student_trend(trends, student, exam_type=None):
+    """1 人分の推移を日付順で返す"""
+    if student not in trends.index:
+        return trends.iloc[0:0]
+    hist = trends.loc[[student]]
+    if exam_type is not None:
+        hist = hist[hist["exam_type"] == exam_type]
+    return hist.sort_values("日付", kind="mergesort")
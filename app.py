@@ -1,86 +1,547 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import datetime
 import json
+import os
+import threading
+import time
+
+import metrics
+from action_tracker import ACTION_ID, STATUS_DONE, STATUS_OPEN, ActionIndex, latest_status
+from analytics import COHORT_COLUMNS, build_trends, student_trend
+from dashboard import DashboardAggregates
+from master_data import EXAM_KYOTSU, EXAM_NIJI, SCORE_LABELS, SUBJECTS
+from records import decode_logs, encode_payload, extend_decoded, row_actions, row_errors, row_scores
+from reports import build_report_archive, latest_per_student, render_report, report_data_from_row
+from score_import import (
+    FIELD_LABELS, build_records, default_column_map, iter_chunks, map_columns, normalize_header, read_headers,
+)
+from search_index import SearchIndex
+from storage import (
+    ACTION_STATUS_COLUMNS, COLUMNS, ROW_ID, UPDATED_AT, create_backend, filter_logs, format_stamp, log_fingerprint, merge_changes,
+    parse_stamp, stamp_rows,
+)
+from write_queue import Flusher, WriteQueue
 
 # --- 設定 ---
 # ブラウザのタブ名
 st.set_page_config(page_title="ALOHA Mentoring Base", layout="wide")
 
-# --- マスタデータ（定数） ---
-SUBJECTS = {
-    '理系': ['英語', '数学(理系)', '現代文', '古文', '漢文', '物理', '化学', '生物'],
-    '文系': ['英語', '数学(文系)', '現代文', '古文', '漢文', '世界史', '日本史', '地理']
+# 過去ログ検索の対象 (None は全項目)
+SEARCH_TARGETS = {
+    '生徒名': ['生徒氏名'], 'メンター': ['担当メンター'], '志望科類': ['志望科類'],
+    '模試名': ['模試名'], '課題': ['課題'], 'すべて': None
 }
 
-# 表示用のラベル変換マップ（二次試験用）
-SCORE_LABELS_NIJI = {
-    'eng': '英語', 'math': '数学',
-    'jp_mod': '現代文', 'jp_anc': '古文', 'jp_chi': '漢文',
-    'sci1': '理科①', 'sci2': '理科②',
-    'soc1': '社会①', 'soc2': '社会②'
+# 過去ログ一覧の並び順: 表示名 → (列, 昇順か)。None は検索の一致度順
+LOG_SORT_OPTIONS = {
+    '一致度順': None,
+    '日付 (新しい順)': ('日付', False),
+    '日付 (古い順)': ('日付', True),
+    '生徒氏名': ('生徒氏名', True),
+    '担当メンター': ('担当メンター', True),
 }
+LOG_PAGE_SIZES = [25, 50, 100]
 
-# 表示用のラベル変換マップ（共通テスト用）
-SCORE_LABELS_KYOTSU = {
-    'eng_r': '英語R', 'eng_l': '英語L',
-    'math_1': '数IA', 'math_2': '数IIBC',
-    'jp_mod': '現代文', 'jp_anc': '古文', 'jp_chi': '漢文',
-    'info': '情報',
-    # 文系用
-    'k_soc1': '社会①', 'k_soc2': '社会②',
-    'k_sci_base1': '理科基礎①', 'k_sci_base2': '理科基礎②',
-    # 理系用
-    'k_soc_r': '社会', 
-    'k_sci1': '理科①', 'k_sci2': '理科②'
-}
+# --- 設定値の取得 ---
+def get_setting(name, default=None):
+    """環境変数 (ALOHA_<NAME>) → st.secrets の順に設定値を探す"""
+    env_val = os.environ.get(f"ALOHA_{name.upper()}")
+    if env_val is not None:
+        return env_val
+    try:
+        return st.secrets.get(name, default)
+    except Exception:
+        return default
 
-# --- データベース接続 (Google Sheets) ---
-try:
-    from streamlit_gsheets import GSheetsConnection
-    conn = st.connection("gsheets", type=GSheetsConnection)
-    DB_MODE = True
-except:
-    DB_MODE = False
+# --- 計測 (診断タブ) ---
+# metrics = true (または ALOHA_METRICS=1) で処理時間の計測を有効にする。
+# 診断タブは admin_token を設定し、URL に ?admin=<admin_token> を付けたときだけ表示する。
+metrics.configure(str(get_setting("metrics", "")).lower() in ("1", "true", "yes", "on"))
+ADMIN_TOKEN = get_setting("admin_token")
+IS_ADMIN = bool(ADMIN_TOKEN) and st.query_params.get("admin") == str(ADMIN_TOKEN)
+_rerun_started = time.perf_counter()
 
-COLUMNS = ["日付", "担当メンター", "生徒氏名", "学年", "文理", "志望科類", "模試名", "課題", "データJSON"]
+# --- データベース接続 ---
+# storage_backend: gsheets (既定) / sqlite / parquet / demo。ローカルエンジンは storage_path に保存する。
+# demo は保存先を使わず、セッション内だけにデータを持つ。
+STORAGE_BACKEND = get_setting("storage_backend", "gsheets")
+# log_partition = year (4 月始まりの年度) / month にすると、gsheets のログを logs_2026 / logs_2026_10 の
+# ワークシートに分けて保存する。既存の logs シートは tools/partition_logs.py cutover で分割してから切り替える。
+# 閉じたパーティションの移し先は archive_spreadsheet (スプレッドシートの名前か URL) で指定する。
+LOG_PARTITION = get_setting("log_partition", "")
 
-# データ読み込み関数
-def load_data():
-    if DB_MODE:
+# 接続に失敗したら、この秒数が経つまでは接続し直さない (その間の保存は書き込みキューに保管する)
+BACKEND_RETRY_SEC = float(get_setting("backend_retry_sec", 30))
+
+# 保存先への接続はプロセスに 1 つだけ作り、全セッションで共有する。作るのはログの読み書きが
+# 初めて必要になったとき (get_backend) で、新規面談タブを開いただけでは gsheets のクライアントも import しない。
+@st.cache_resource
+def _open_backend(kind, partition, archive_spreadsheet, path):
+    if kind == "gsheets":
+        # import に時間がかかるため、ここまで遅らせる
+        from streamlit_gsheets import GSheetsConnection
+        conn = st.connection("gsheets", type=GSheetsConnection)
+        # パーティションの指紋を覚えておくため、プロセスで 1 つにする
+        return create_backend("gsheets", conn=conn, partition=partition, archive_spreadsheet=archive_spreadsheet)
+    return create_backend(kind, path=path)
+
+@st.cache_resource
+def _backend_health():
+    return {
+        "state": "idle",   # idle (未接続) / ok / error
+        "backend": None,
+        "error": None,
+        "checked_at": None,  # 最後に接続を確かめた時刻 (time.time())
+        "lock": threading.Lock(),
+    }
+
+def get_backend(force=False):
+    """共有の保存先を返す。初回は接続して ping() で確かめ、接続できなければ None を返す。
+
+    失敗した後は BACKEND_RETRY_SEC 秒経つまで (force=True を除き) 接続し直さない。
+    同時に来たセッションはロックで待たせ、接続を作るのは 1 回だけにする。
+    """
+    if STORAGE_BACKEND == "demo":
+        return None
+    health = _backend_health()
+    with health["lock"]:
+        if health["state"] == "ok" and not force:
+            return health["backend"]
+        if health["state"] == "error" and not force and time.time() - health["checked_at"] < BACKEND_RETRY_SEC:
+            return None
+        started = time.perf_counter()
         try:
-            df = conn.read(worksheet="logs", ttl=0)
-            for col in COLUMNS:
-                if col not in df.columns:
-                    df[col] = None
-            return df
-        except Exception:
-            return pd.DataFrame(columns=COLUMNS)
+            backend = _open_backend(STORAGE_BACKEND, LOG_PARTITION, get_setting("archive_spreadsheet"),
+                                    get_setting("storage_path"))
+            backend.ping()
+        except Exception as e:
+            health.update(state="error", backend=None, error=f"{type(e).__name__}: {e}", checked_at=time.time())
+            return None
+        finally:
+            metrics.record("backend.connect", time.perf_counter() - started)
+        health.update(state="ok", backend=backend, error=None, checked_at=time.time())
+    # まだ送っていない保存があれば、接続できた時点で送り始める
+    _get_flusher(backend)
+    return backend
+
+def mark_backend_error(error):
+    """ログの読み込みの失敗を接続の状態に記録する (BACKEND_RETRY_SEC の間は get_backend() が None を返す)"""
+    health = _backend_health()
+    with health["lock"]:
+        health.update(state="error", backend=None, error=f"{type(error).__name__}: {error}", checked_at=time.time())
+
+def db_mode():
+    """保存先を使えるか (使えなければセッション内のデータで動く)"""
+    return get_backend() is not None
+
+# --- ログのスナップショットキャッシュ ---
+# 1回の再実行で検索タブとレポートタブがそれぞれ load_data() を呼ぶため、
+# シートの読み込み結果をプロセス内で共有し、バージョンと経過時間で鮮度を管理する。
+LOG_CACHE_TTL = float(get_setting("log_cache_ttl", 30))  # 秒。これより古いスナップショットは再取得
+# log_sync = delta (既定) なら、再取得は前回以降に追加・更新された行だけを読んでスナップショットに取り込む。
+# 列の変更やチェックサムの不一致を見つけたときだけ全件を読み直す。full にすると毎回全件を読む。
+LOG_SYNC = get_setting("log_sync", "delta")
+# 差分の取得は「取り込んだ最新の更新日時」からこの秒数だけさかのぼる (端末間の時計のずれの吸収。
+# 重複して取った行は 記録ID で突き合わせるので二重にはならない)
+LOG_SYNC_OVERLAP = float(get_setting("log_sync_overlap", 120))
+
+@st.cache_resource
+def _get_log_cache():
+    return {
+        "df": None,
+        "version": 0,          # save_data などの書き込みで進む
+        "fetched_version": -1,  # df を取得した時点の version
+        "fetched_at": 0.0,
+        "derived": {},         # df から作った派生データ (DERIVED_BUILDERS 参照)
+        "hits": 0,
+        "misses": 0,
+        "watermark": "",        # 取り込んだ行の 更新日時 の最大値
+        "columns": None,        # 保存先の列 (変わったら全件を読み直す)
+        "syncs": {"delta": 0, "full": 0, "last_full_reason": None, "last_delta_bytes": None},
+        "lock": threading.Lock(),
+    }
+
+def invalidate_log_cache():
+    """書き込み後に呼び、次回の load_data() で必ず再取得させる"""
+    cache = _get_log_cache()
+    with cache["lock"]:
+        cache["version"] += 1
+
+def log_cache_stats():
+    cache = _get_log_cache()
+    with cache["lock"]:
+        age = time.monotonic() - cache["fetched_at"] if cache["df"] is not None else None
+        return {
+            "hits": cache["hits"],
+            "misses": cache["misses"],
+            "version": cache["version"],
+            "rows": 0 if cache["df"] is None else len(cache["df"]),
+            "age_sec": age,
+            "watermark": cache["watermark"],
+            **{f"sync_{k}": v for k, v in cache["syncs"].items()},
+        }
+
+# --- 書き込みキュー ---
+# 保存はまずローカルのファイル (WriteQueue) に書いて完了とし、保存先への送信は
+# プロセスに 1 つの Flusher スレッドがまとめて行う。保存先に接続できないときは
+# 送信されずに残り、次に保存先へ接続できたプロセスが送る。デモモードでは使わない。
+@st.cache_resource
+def _get_write_queue():
+    return WriteQueue(get_setting("write_queue_path", os.path.join("data", "pending_writes.jsonl")))
+
+@st.cache_resource
+def _get_flusher(_backend):
+    # 保存先に初めて接続できたときに get_backend() から 1 度だけ作られる
+    cache = _get_log_cache()
+
+    def on_flushed():
+        # 送信済みの行を保存先から読み直させる (送信待ちの行とはここで入れ替わる)
+        with cache["lock"]:
+            cache["version"] += 1
+
+    flusher = Flusher(_get_write_queue(), _backend, on_flushed=on_flushed)
+    flusher.start()
+    return flusher
+
+def current_flusher():
+    """送信スレッド (保存先にまだ接続していなければ None)"""
+    health = _backend_health()
+    return _get_flusher(health["backend"]) if health["state"] == "ok" else None
+
+def _with_pending_rows(df):
+    """保存先から読んだログの後ろに、まだ送信していない行を足す"""
+    pending = _get_write_queue().pending_rows()
+    if pending.empty:
+        return df
+    start = int(df.index.max()) + 1 if len(df) else 0
+    pending.index = range(start, start + len(pending))
+    return pd.concat([df, pending.reindex(columns=df.columns)])
+
+# データ読み込み関数
+def load_data(max_age=None):
+    """ログ全体を古い順 (index 昇順) で返す。
+
+    DBモードでは全セッション共有のスナップショットを返すため、戻り値を直接変更しないこと。
+    max_age (秒) を指定するとその回だけ鮮度の上限を上書きする (0 で必ず再取得)。
+    """
+    backend = get_backend()
+    if backend is not None:
+        max_age = LOG_CACHE_TTL if max_age is None else max_age
+        cache = _get_log_cache()
+        # 取得中はロックを保持し、同時に来た再実行が重複して読みに行かないようにする
+        with cache["lock"]:
+            if (
+                cache["df"] is not None
+                and cache["fetched_version"] == cache["version"]
+                and time.monotonic() - cache["fetched_at"] < max_age
+            ):
+                cache["hits"] += 1
+                return cache["df"]
+
+            cache["misses"] += 1
+            fetch_started = time.perf_counter()
+            try:
+                synced = _sync_changes(cache, backend)
+            except Exception as e:
+                # 差分を取れなければ全件を読み直す (壊れた 更新日時 なども読み直しで作り直す)
+                cache["syncs"]["last_full_reason"] = f"差分同期のエラー ({type(e).__name__}: {e})"
+                synced = False
+            try:
+                if synced:
+                    metrics.record("load_data.delta", time.perf_counter() - fetch_started,
+                                   cache["syncs"]["last_delta_bytes"])
+                else:
+                    raw = backend.read_all()
+                    cache["df"] = _with_pending_rows(raw)
+                    cache["derived"] = {}
+                    cache["watermark"] = _max_stamp(raw)
+                    cache["columns"] = None
+                    cache["syncs"]["full"] += 1
+                    metrics.record("load_data.fetch", time.perf_counter() - fetch_started, metrics.frame_bytes(raw))
+            except Exception as e:
+                # 取得に失敗したら接続の状態をエラーにし (BACKEND_RETRY_SEC の間は読みに行かない)、
+                # 今回は手元のスナップショット (無ければ送信待ちの行だけ) を返す
+                cache["syncs"]["last_full_reason"] = f"読み込みのエラー ({type(e).__name__}: {e})"
+                mark_backend_error(e)
+                if cache["df"] is not None:
+                    return cache["df"]
+                return _with_pending_rows(pd.DataFrame(columns=COLUMNS))
+            cache["fetched_version"] = cache["version"]
+            cache["fetched_at"] = time.monotonic()
+            return cache["df"]
     else:
         if "demo_data" not in st.session_state:
-            st.session_state.demo_data = pd.DataFrame(columns=COLUMNS)
+            empty = pd.DataFrame(columns=COLUMNS)
+            # 保存先に接続できないときは書き込みキューに残っている行から始めるので、リロードしても消えない。
+            # デモモードはキューを使わないので空から始める
+            st.session_state.demo_data = empty if STORAGE_BACKEND == "demo" else _with_pending_rows(empty)
         return st.session_state.demo_data
 
+def _max_stamp(df):
+    # 形式の崩れた 更新日時 (手で書き換えた行など) は差分同期の起点にしない
+    stamps = df[UPDATED_AT].dropna().astype(str)
+    stamps = stamps[stamps.str.fullmatch(r"\d{8}T\d{6}\.\d{3}Z")]
+    return stamps.max() if len(stamps) else ""
+
+def _append_to_snapshot(cache, rows_df):
+    """スナップショットの末尾に行を足し、派生データを追加分だけ更新する (cache["lock"] 内で呼ぶ)"""
+    df = cache["df"]
+    start = int(df.index.max()) + 1 if len(df) else 0
+    new_rows = rows_df.reindex(columns=df.columns)
+    new_rows.index = range(start, start + len(new_rows))
+    cache["df"] = pd.concat([df, new_rows])
+    # 追加分の データJSON は一度だけ解析し、解析済みの表・アクション・ダッシュボードの更新で共有する
+    added = decode_logs(new_rows) if cache["derived"] else None
+    # 追加分で更新できないもの (推移表など) は捨てて、次に使うときに作り直す
+    cache["derived"] = {
+        name: DERIVED_BUILDERS[name][1](value, new_rows, added)
+        for name, value in cache["derived"].items()
+        if DERIVED_BUILDERS[name][1] is not None
+    }
+
+def _sync_changes(cache, backend):
+    """前回の取り込み以降に保存先で追加・更新された行だけをスナップショットに取り込む (cache["lock"] 内で呼ぶ)。
+
+    取り込めたら True。列が変わった・差分を取れない・取り込んだ結果のチェックサムが保存先と合わない
+    (行の削除や時計のずれで取りこぼした行がある) ときは False を返し、呼び出し側が全件を読み直す。
+    """
+    if LOG_SYNC != "delta" or cache["df"] is None:
+        return False
+    since = cache["watermark"]
+    if since:
+        since = format_stamp(parse_stamp(since) - LOG_SYNC_OVERLAP)
+    result = backend.read_changes(since)
+    if result is None:
+        cache["syncs"]["last_full_reason"] = "差分を取得できない形式"
+        return False
+    changed, remote = result
+    # 差分で読んだ量 (2 列と変更行)。計測が無効なら None
+    cache["syncs"]["last_delta_bytes"] = remote.get("bytes")
+    if cache["columns"] is not None and remote["columns"] != cache["columns"]:
+        cache["syncs"]["last_full_reason"] = "列の変更"
+        cache["columns"] = None
+        return False
+
+    # 共有のスナップショットは他のセッションがロックの外で読んでいるので書き換えず、
+    # 新しい表を作って version と一緒に差し替える (_append_to_snapshot も新しい表を作る)
+    merged, added, updated, content_changed = merge_changes(cache["df"], changed)
+    if updated:
+        cache["df"] = merged
+        if content_changed:
+            cache["derived"] = {}
+    if len(added):
+        _append_to_snapshot(cache, added)
+    if updated or len(added):
+        cache["version"] += 1
+
+    # 送信待ちの行はまだ保存先に無いので除いて比べる
+    df = cache["df"]
+    pending_ids = _get_write_queue().pending_rows()[ROW_ID].dropna()
+    local = log_fingerprint(df[~df[ROW_ID].isin(pending_ids)])
+    if (local["rows"], local["checksum"]) != (remote["rows"], remote["checksum"]):
+        cache["syncs"]["last_full_reason"] = "チェックサムの不一致"
+        return False
+    cache["columns"] = remote["columns"]
+    cache["watermark"] = max(cache["watermark"], _max_stamp(changed))
+    cache["syncs"]["delta"] += 1
+    return True
+
+def _apply_saved_rows(new_row_df):
+    """保存した行をスナップショットと検索インデックスに直接足す (シートは読み直さない)"""
+    cache = _get_log_cache()
+    with cache["lock"]:
+        current = cache["df"] is not None and cache["fetched_version"] == cache["version"]
+        cache["version"] += 1
+        if not current:
+            return
+        _append_to_snapshot(cache, new_row_df)
+        cache["fetched_version"] = cache["version"]
+
+def _extend_index(index, new_rows, added):
+    index.add_rows(new_rows)
+    return index
+
+def _extend_action_index(index, new_rows, added):
+    return index.add_rows(new_rows, added["actions"])
+
+def _extend_dashboard(aggregates, new_rows, added):
+    return aggregates.add_rows(new_rows, added)
+
+# スナップショットから作る派生データ: 名前 → (作る関数, 保存した行で更新する関数 or None)
+# 作る関数は (df, dep) を受け取り、dep(名前) で他の派生データを使える。
+# 更新する関数は (今の値, 追加した行, 追加した行の decode_logs() の結果) を受け取る
+DERIVED_BUILDERS = {
+    "index": (lambda df, dep: SearchIndex.build(df), _extend_index),
+    "decoded": (lambda df, dep: decode_logs(df), extend_decoded),
+    "trends": (lambda df, dep: build_trends(df, dep("decoded")["scores"]), None),
+    "log_views": (lambda df, dep: build_log_views(df), None),
+    "action_index": (lambda df, dep: ActionIndex.build(df, dep("decoded")["actions"]), _extend_action_index),
+    "dashboard": (lambda df, dep: DashboardAggregates.build(df, dep("decoded")), _extend_dashboard),
+}
+
+def build_log_views(df):
+    """一覧表示用: 列ごとの並び順 (行キーの配列) と、生徒ごとの最新記録の行キー"""
+    order = {}
+    for col in ("日付", "生徒氏名", "担当メンター"):
+        values = pd.to_datetime(df[col], errors="coerce") if col == "日付" else df[col].astype(str)
+        order[col] = values.sort_values(kind="mergesort").index.to_numpy()
+    latest = df.drop_duplicates("生徒氏名", keep="last").index.to_numpy()
+    return {"order": order, "latest": latest}
+
+def _derive(store, name, df):
+    if name not in store:
+        # derive.decoded が データJSON の解析、derive.index が検索インデックスの作成時間
+        with metrics.timer(f"derive.{name}"):
+            store[name] = DERIVED_BUILDERS[name][0](df, lambda dep: _derive(store, dep, df))
+    return store[name]
+
+def load_derived(name):
+    """ログと、そこから作った派生データ (検索インデックス・解析済みの表など) を返す。
+
+    派生データはスナップショット (= データのバージョン) ごとに一度だけ作り、
+    保存時は追加行の分だけ更新する。
+    """
+    df = load_data()
+    if db_mode():
+        cache = _get_log_cache()
+        with cache["lock"]:
+            if cache["df"] is df:
+                return df, _derive(cache["derived"], name, df)
+        return df, _derive({}, name, df)
+    # デモモード: セッション内のデータの行数が変わったら作り直す
+    if st.session_state.get("demo_derived_rows") != len(df):
+        st.session_state.demo_derived = {}
+        st.session_state.demo_derived_rows = len(df)
+    return df, _derive(st.session_state.demo_derived, name, df)
+
+def rebuild_derived(name):
+    """派生データを捨て、次に使うときにログ全体から作り直させる"""
+    if db_mode():
+        cache = _get_log_cache()
+        with cache["lock"]:
+            cache["derived"].pop(name, None)
+    else:
+        st.session_state.get("demo_derived", {}).pop(name, None)
+
 # データ保存関数
 def save_data(new_row_df):
-    current_df = load_data()
-    if not current_df.empty:
-        for col in COLUMNS:
-            if col not in current_df.columns:
-                current_df[col] = None
-    
-    updated_df = pd.concat([new_row_df, current_df], ignore_index=True)
-    
-    if DB_MODE:
-        try:
-            conn.update(worksheet="logs", data=updated_df)
-            return True
-        except Exception as e:
-            st.error(f"保存エラー: {e}")
-            return False
-    else:
-        st.session_state.demo_data = updated_df
+    """書き込みキューに記録した時点で完了とする。保存先への送信 (追記) はバックグラウンドで行う"""
+    new_row_df = stamp_rows(new_row_df)
+    if STORAGE_BACKEND == "demo":
+        # デモの保存は書き込みキューに入れない (送られずに残り、他のセッションや後で設定した保存先に混ざるため)
+        st.session_state.demo_data = pd.concat([load_data(), new_row_df], ignore_index=True)
         return True
+    queue = _get_write_queue()
+    backend = get_backend()
+    if backend is None:
+        # セッション内のデータは書き込みキューの行から作るので、新しい行をキューに入れる前に用意しておく
+        # (後から作ると、キューから読んだ分と下の concat で同じ行が 2 回入る)
+        load_data()
+    try:
+        with metrics.timer("save_data"):
+            queue.enqueue(new_row_df)
+    except OSError as e:
+        st.error(f"保存エラー: {e}")
+        return False
+    if backend is not None:
+        _apply_saved_rows(new_row_df)
+        _get_flusher(backend).wake()
+    else:
+        st.session_state.demo_data = pd.concat([st.session_state.demo_data, new_row_df], ignore_index=True)
+    return True
+
+# --- アクションの完了状態 ---
+# 完了の印はログの行を書き換えず、保存先の action_status に (記録ID, 番号, 状態) を追記する。
+# 読み込んだ結果はログと同じ鮮度 (LOG_CACHE_TTL) でプロセス内に持ち、印を付けたときは手元にも足す。
+@st.cache_resource
+def _get_status_cache():
+    return {"df": None, "latest": {}, "fetched_at": 0.0, "lock": threading.Lock()}
+
+def load_action_status():
+    """アクションID → 最新の状態 の dict"""
+    backend = get_backend()
+    if backend is None:
+        return latest_status(st.session_state.get("demo_action_status"))
+    cache = _get_status_cache()
+    with cache["lock"]:
+        if cache["df"] is None or time.monotonic() - cache["fetched_at"] >= LOG_CACHE_TTL:
+            try:
+                started = time.perf_counter()
+                cache["df"] = backend.read_action_status()
+                metrics.record("load_action_status", time.perf_counter() - started, metrics.frame_bytes(cache["df"]))
+                cache["latest"] = latest_status(cache["df"])
+            except Exception:
+                pass  # 読めなければ手元の状態のまま、次回また取りに行く
+            cache["fetched_at"] = time.monotonic()
+        return cache["latest"]
+
+def set_action_status(action_ids, status):
+    """アクション (ACTION_ID のリスト) の状態を記録する。記録ID の無い行のアクションは記録できない"""
+    rows = []
+    stamp = format_stamp(time.time())
+    for action_id in action_ids:
+        row_id, _, seq = action_id.rpartition("#")
+        if row_id:
+            rows.append({ROW_ID: row_id, "番号": seq, "状態": status, UPDATED_AT: stamp})
+    if not rows:
+        return 0
+    rows_df = pd.DataFrame(rows, columns=ACTION_STATUS_COLUMNS)
+    backend = get_backend()
+    if backend is None:
+        st.session_state.demo_action_status = pd.concat(
+            [st.session_state.get("demo_action_status", pd.DataFrame(columns=ACTION_STATUS_COLUMNS)), rows_df],
+            ignore_index=True,
+        )
+        return len(rows)
+    started = time.perf_counter()
+    backend.append_action_status(rows_df)
+    metrics.record("set_action_status", time.perf_counter() - started, metrics.frame_bytes(rows_df))
+    cache = _get_status_cache()
+    with cache["lock"]:
+        if cache["df"] is not None:
+            cache["df"] = pd.concat([cache["df"], rows_df], ignore_index=True)
+        cache["latest"] = {**cache["latest"], **latest_status(rows_df)}
+    return len(rows)
+
+def has_data():
+    backend = get_backend()
+    if backend is not None and backend.name != "gsheets":
+        return not backend.is_empty() or len(_get_write_queue()) > 0
+    return not load_data().empty
+
+def search_data(text, fields=None):
+    """検索ボックス用。一致度の高い順 (同点は新しい順) に並べた行を返す。空なら新しい順の全件。
+
+    index はスナップショットの行キーなので、load_derived() の派生データをそのまま引ける。
+    """
+    if not text:
+        return load_data().sort_index(ascending=False)
+    df, index = load_derived("index")
+    return df.loc[index.search(text, fields=fields)]
+
+def search_keys(text, fields=None, sort=None, latest_only=False):
+    """過去ログ一覧用。該当する行キーを表示順に並べた配列とログを返す。
+
+    並び替えはスナップショットごとに作った並び順を絞り込むだけで、行そのものは
+    表示するページの分しか取り出さない。sort が None なら一致度順 (検索語なしは新しい順)。
+    """
+    with metrics.timer("search"):
+        if text:
+            df, index = load_derived("index")
+            keys = np.asarray(index.search(text, fields=fields), dtype=np.int64)
+        else:
+            df, keys = load_data(), None
+            sort = sort or ("日付", False)
+        _, views = load_derived("log_views")
+        if sort is not None:
+            col, ascending = sort
+            order = views["order"][col] if ascending else views["order"][col][::-1]
+            keys = order if keys is None else order[np.isin(order, keys)]
+        if latest_only:
+            keys = keys[np.isin(keys, views["latest"])]
+    return df, keys
 
 # --- 初期化・リセット関数 ---
 def init_session_state():
@@ -132,6 +593,19 @@ def clear_inputs():
     for k in keys_to_delete:
         del st.session_state[k]
 
+# 開いていないタブのウィジェットは描画されず、そのままでは値が消えるため、毎回書き戻して保つ
+TAB_WIDGET_KEYS = [
+    "search_target", "search_text", "log_sort", "log_latest_only", "log_page_size", "log_page",
+    "report_source", "rep_search_input",
+    "act_mentor", "act_subject", "act_priority", "act_state",
+    "dash_weeks", "dash_days", "dash_exam",
+]
+
+def keep_widget_values(keys):
+    for key in keys:
+        if key in st.session_state:
+            st.session_state[key] = st.session_state[key]
+
 # 1. セッション初期化
 init_session_state()
 
@@ -141,46 +615,81 @@ if st.session_state.get("needs_clear", False):
     st.session_state["needs_clear"] = False 
     st.toast("保存し、入力内容をリセットしました", icon="✅")
 
-# --- UI構築 ---
+# --- 一括出力 ---
+@st.fragment
+def batch_export_section():
+    """条件に合う記録のレポートをまとめて ZIP にする。
 
-st.title("🎓 ALOHA Mentoring Base")
+    フラグメント内で動くため、生成中も他のタブは再実行されない。
+    """
+    if not has_data():
+        st.warning("保存されたデータがありません。")
+        return
 
-tab_new, tab_search, tab_preview = st.tabs(["📝 新規面談・保存", "🔍 過去ログ検索", "📄 レポート出力"])
+    # 行キーが解析済みの表 (decoded) と揃うよう、スナップショットから絞り込む
+    all_df, decoded = load_derived("decoded")
+    bc1, bc2, bc3 = st.columns(3)
+    with bc1:
+        mentors = sorted(all_df["担当メンター"].dropna().astype(str).unique())
+        batch_mentor = st.selectbox("担当メンター", ["すべて"] + mentors, key="batch_mentor")
+    with bc2:
+        today = datetime.date.today()
+        batch_dates = st.date_input("期間", (today - datetime.timedelta(days=90), today), key="batch_dates")
+    with bc3:
+        batch_grades = st.multiselect("学年", ["中1", "中2", "中3", "高1", "高2", "高3", "既卒"], key="batch_grades")
+    
+    bc4, bc5 = st.columns(2)
+    with bc4:
+        latest_only = st.checkbox("生徒ごとに最新の記録のみ", value=True, key="batch_latest")
+    with bc5:
+        formats = st.multiselect("形式", ["text", "markdown"], default=["text", "markdown"], key="batch_formats")
 
-# ==========================================
-# 1. 新規作成タブ
-# ==========================================
-with tab_new:
-    st.subheader("面談記録の入力")
+    date_from, date_to = (batch_dates + (None, None))[:2] if isinstance(batch_dates, tuple) else (batch_dates, None)
+    rows_df = filter_logs(
+        all_df, mentor=None if batch_mentor == "すべて" else batch_mentor,
+        date_from=date_from, date_to=date_to,
+    )
+    if batch_grades:
+        rows_df = rows_df[rows_df["学年"].isin(batch_grades)]
+    if latest_only:
+        rows_df = latest_per_student(rows_df)
+    
+    st.caption(f"対象: {len(rows_df)} 件 (一覧表の CSV / Excel も同梱します)")
+    
+    if st.button("📦 一括作成", disabled=rows_df.empty, key="batch_build"):
+        bar = st.progress(0.0, text="作成中...")
+        with metrics.timer("report.batch"):
+            archive = build_report_archive(
+                rows_df, formats=formats or ["text"],
+                progress=lambda done, total: bar.progress(done / total, text=f"作成中... {done}/{total}"),
+                decoded=decoded,
+            )
+        bar.progress(1.0, text=f"{len(rows_df)} 件を作成しました")
+        st.session_state.batch_archive = archive
     
-    def add_action(stream_val):
-        initial_subject = SUBJECTS[stream_val][0]
-        st.session_state.actions.append({
-            'subject': initial_subject, 'priority': '中', 'policy': '', 'specificTask': '', 'deadline': '1週間後'
-        })
-    def remove_action(index):
-        st.session_state.actions.pop(index)
+    if st.session_state.get("batch_archive"):
+        st.download_button(
+            "⬇️ ZIP をダウンロード", st.session_state.batch_archive,
+            file_name=f"aloha_reports_{datetime.date.today():%Y%m%d}.zip", mime="application/zip",
+        )
 
-    # 入力フォーム
-    with st.container():
-        c1, c2 = st.columns(2)
-        with c1:
-            mentor_name = st.text_input("担当メンター", key="in_mentor")
-            student_name = st.text_input("生徒氏名", key="in_student")
-            stream = st.radio("文理", ["理系", "文系"], horizontal=True, key="in_stream")
-        with c2:
-            date_val = st.date_input("実施日", datetime.date.today(), key="in_date")
-            
-            # 学年の選択肢
-            grade_options = ["中1", "中2", "中3", "高1", "高2", "高3", "既卒"]
-            default_grade_idx = grade_options.index("高3")
-            grade = st.selectbox("学年", grade_options, index=default_grade_idx, key="in_grade")
-            
-            default_target = "理科一類" if stream == "理系" else "文科一類"
-            target = st.text_input("志望科類", value=default_target, key="in_target")
+# --- 新規面談の入力欄 ---
+# 成績とアクションの欄はフラグメントにして、入力しても欄の中だけが再実行されるようにする
+# (他のタブや基本情報の欄は再実行しない)。文理を切り替えたときはアプリ全体が再実行され、
+# 両方の欄が新しい文理で作り直される。
+def add_action(stream_val):
+    initial_subject = SUBJECTS[stream_val][0]
+    st.session_state.actions.append({
+        'subject': initial_subject, 'priority': '中', 'policy': '', 'specificTask': '', 'deadline': '1週間後'
+    })
 
-    st.divider()
+def remove_action(index):
+    st.session_state.actions.pop(index)
 
+@st.fragment
+def score_section(stream):
+    """模試・成績・課題の入力欄。(模試種別, 模試名, 点数の dict, 課題) を返す (アプリ全体の再実行時のみ使われる)"""
+    section_started = time.perf_counter()
     # 模試・課題
     st.caption("成績入力")
     exam_col1, exam_col2 = st.columns([1, 2])
@@ -254,8 +763,14 @@ with tab_new:
 
     current_issue = st.text_area("課題認識", key="in_issue")
 
-    st.divider()
 
+    metrics.record("render.entry_scores", time.perf_counter() - section_started)
+    return exam_type, exam_name, scores, current_issue
+
+@st.fragment
+def action_section(stream):
+    """ネクストアクションの入力欄。値は st.session_state.actions に入る"""
+    section_started = time.perf_counter()
     # アクション
     st.caption("ネクストアクション")
     for i, action in enumerate(st.session_state.actions):
@@ -278,13 +793,264 @@ with tab_new:
             st.session_state.actions[i]['policy'] = st.text_input("方針設定", action.get('policy', ''), key=f"pol_{i}", placeholder="例: 部分点を確実に取るための記述強化")
             st.session_state.actions[i]['specificTask'] = st.text_input("具体的タスク", action['specificTask'], key=f"t_{i}", placeholder="例: 鉄壁Section1-5を毎日実施")
             
-            if st.button("削除", key=f"del_{i}"):
-                remove_action(i)
-                st.rerun()
+            st.button("削除", key=f"del_{i}", on_click=remove_action, args=(i,))
     
-    if st.button("＋ アクション追加"):
-        add_action(stream)
-        st.rerun()
+    # 追加・削除はコールバックで行い、同じ再実行の中で欄に反映させる
+    st.button("＋ アクション追加", on_click=add_action, args=(stream,))
+
+    metrics.record("render.entry_actions", time.perf_counter() - section_started)
+
+# --- 成績表の一括取り込み ---
+# score_import_columns: 成績表の列名 → 取り込み先 (科目コード / name / date / exam) の対応。
+# 既定の対応表 (科目の表示名・科目コード・氏名など) に足す。環境変数では JSON で指定する
+def _import_column_overrides():
+    value = get_setting("score_import_columns")
+    if not value:
+        return {}
+    return json.loads(value) if isinstance(value, str) else dict(value)
+
+def find_student(name):
+    """氏名 (かな・全角半角・空白の違いは無視) で既存のログを引き、最新の記録の生徒情報を返す。無ければ None"""
+    df, index = load_derived("index")
+    keys = index.lookup(name)
+    if not keys:
+        return None
+    row = df.loc[max(keys)]
+    return {col: row[col] for col in ("生徒氏名", "学年", "文理", "志望科類", "担当メンター")}
+
+@st.fragment
+def import_section():
+    """予備校の成績表を読み、確認してからまとめて 1 回で保存する"""
+    uploaded = st.file_uploader("成績表 (CSV / Excel)", type=["csv", "xlsx"], key="imp_file")
+    ic1, ic2, ic3 = st.columns(3)
+    with ic1:
+        exam_type = st.radio("模試種別", [EXAM_NIJI, EXAM_KYOTSU], key="imp_exam_type")
+    with ic2:
+        exam_name = st.text_input("模試名 (ファイルに列が無い場合)", key="imp_exam")
+    with ic3:
+        exam_date = st.date_input("実施日 (ファイルに列が無い場合)", datetime.date.today(), key="imp_date")
+    if uploaded is None:
+        return
+
+    # 列の対応表: 既定の対応で埋め、画面で直せるようにする
+    targets = {"": "(取り込まない)", **FIELD_LABELS,
+               **{code: f"{label} ({code})" for code, label in SCORE_LABELS[exam_type].items()}}
+    headers = read_headers(uploaded, uploaded.name)
+    mapped = map_columns(headers, default_column_map(exam_type, _import_column_overrides()))
+    edited = st.data_editor(
+        pd.DataFrame({"列名": headers, "取り込み先": [targets.get(mapped.get(h, ""), targets[""]) for h in headers]}),
+        column_config={
+            "列名": st.column_config.TextColumn(disabled=True),
+            "取り込み先": st.column_config.SelectboxColumn(options=list(targets.values()), required=True),
+        },
+        hide_index=True, width="stretch", key=f"imp_map_{uploaded.file_id}_{exam_type}",
+    )
+    by_label = {label: target for target, label in targets.items()}
+    column_map = {normalize_header(h): by_label[t] for h, t in zip(edited["列名"], edited["取り込み先"]) if by_label.get(t)}
+    signature = (uploaded.file_id, exam_type, exam_name, exam_date, tuple(sorted(column_map.items())))
+
+    if st.button("🔍 内容を確認", key="imp_check"):
+        try:
+            with metrics.timer("import.scores"):
+                records, errors = build_records(
+                    iter_chunks(uploaded, uploaded.name), column_map, exam_type, find_student,
+                    exam_name=exam_name, date=exam_date,
+                )
+            st.session_state.import_result = (signature, records, errors)
+        except ValueError as e:
+            st.error(str(e))
+        finally:
+            uploaded.seek(0)
+
+    result = st.session_state.get("import_result")
+    if not result or result[0] != signature:
+        return
+    _, records, errors = result
+    st.caption(f"取り込める行: {len(records)} 件 / エラー: {len(errors)} 件")
+    if not errors.empty:
+        with st.expander(f"⚠️ 取り込めない行 ({len(errors)} 件)"):
+            st.dataframe(errors, width="stretch", hide_index=True)
+    if records.empty:
+        return
+    st.dataframe(records[["日付", "生徒氏名", "担当メンター", "模試名"]].head(100), width="stretch", hide_index=True)
+    if st.button(f"💾 {len(records)} 件をまとめて保存する", type="primary", key="imp_save"):
+        # 全件を 1 回の save_data() で書き込みキューに入れ、保存先へも 1 回の追記で送る
+        if save_data(records):
+            st.session_state.pop("import_result", None)
+            st.success(f"{len(records)} 件を保存しました")
+
+# --- アクション管理 ---
+ACTION_STATES = ["期限切れ", "今週まで", "未完了すべて", "完了済み"]
+ACTION_DISPLAY_LIMIT = 200
+
+@st.fragment
+def action_tracker_section():
+    """期限の早い順にネクストアクションを絞り込み、完了の印を付ける"""
+    _, index = load_derived("action_index")
+    if not len(index):
+        st.info("保存されたアクションがありません。")
+        return
+    statuses = load_action_status()
+
+    ac1, ac2, ac3, ac4 = st.columns(4)
+    with ac1:
+        mentor = st.selectbox("担当メンター", ["(すべて)", *index.values("担当メンター")], key="act_mentor")
+    with ac2:
+        subject = st.selectbox("教科", ["(すべて)", *index.values("subject")], key="act_subject")
+    with ac3:
+        priorities = st.multiselect("優先度", ["高", "中", "低"], key="act_priority")
+    with ac4:
+        state = st.radio("状態", ACTION_STATES, horizontal=True, key="act_state")
+
+    today = pd.Timestamp(datetime.date.today())
+    due_to = {
+        "期限切れ": today - pd.Timedelta(days=1),
+        "今週まで": today + pd.Timedelta(days=6 - today.weekday()),
+    }.get(state)
+    with metrics.timer("actions.query"):
+        positions = index.select(
+            mentor=None if mentor == "(すべて)" else mentor,
+            subject=None if subject == "(すべて)" else subject,
+            priorities=priorities, due_to=due_to, statuses=statuses, show_done=state == "完了済み",
+        )
+    st.caption(f"{len(positions)} 件 (期限の早い順。表示は先頭 {ACTION_DISPLAY_LIMIT} 件まで)")
+    if not len(positions):
+        return
+
+    shown = index.table.iloc[positions[:ACTION_DISPLAY_LIMIT]]
+    view = pd.DataFrame({
+        "完了": shown[ACTION_ID].map(lambda k: statuses.get(k) == STATUS_DONE).to_numpy(),
+        "期限": shown["due"].dt.date.to_numpy(),
+        "期限 (入力)": shown["deadline"].to_numpy(),
+        "生徒氏名": shown["生徒氏名"].to_numpy(),
+        "担当メンター": shown["担当メンター"].to_numpy(),
+        "教科": shown["subject"].to_numpy(),
+        "優先度": shown["priority"].to_numpy(),
+        "内容": shown["specificTask"].to_numpy(),
+        "面談日": shown["日付"].dt.date.to_numpy(),
+    })
+    # 表示する行が変わったら編集状態を捨てる (行の位置で編集内容を覚えているため)
+    editor_key = f"act_editor_{hash(tuple(shown[ACTION_ID]))}"
+    edited = st.data_editor(
+        view, key=editor_key, hide_index=True, width="stretch",
+        disabled=[c for c in view.columns if c != "完了"],
+    )
+    changed = edited["完了"].to_numpy() != view["完了"].to_numpy()
+    if changed.any() and st.button(f"✅ {int(changed.sum())} 件の状態を保存", type="primary", key="act_save"):
+        ids = shown[ACTION_ID].to_numpy()[changed]
+        done = edited["完了"].to_numpy()[changed]
+        try:
+            saved = set_action_status(ids[done].tolist(), STATUS_DONE) + set_action_status(ids[~done].tolist(), STATUS_OPEN)
+        except Exception as e:
+            st.error(f"保存エラー: {e}")
+            return
+        if saved < len(ids):
+            st.warning("記録ID の無い古い記録のアクションは状態を保存できません")
+        else:
+            # 表示中の行 (と編集状態) を新しい状態で作り直す
+            st.rerun()
+
+# --- ダッシュボード ---
+def _csv_download(table, label, file_name, key):
+    # Excel で開いても文字化けしないよう BOM 付きの UTF-8 にする
+    st.download_button(f"⬇️ {label} を CSV で保存", table.to_csv().encode("utf-8-sig"),
+                       file_name=file_name, mime="text/csv", key=key)
+
+@st.fragment
+def dashboard_section():
+    """保存のたびに更新している集計表 (DashboardAggregates) だけから描画する"""
+    _, aggregates = load_derived("dashboard")
+    if not aggregates.rows:
+        st.info("保存されたデータがありません。")
+        return
+    today = datetime.date.today()
+
+    st.write("■ メンター別の面談数 (週ごと)")
+    # 既定値はセッションに入れておく (keep_widget_values で書き戻す値と二重に指定しないため)
+    st.session_state.setdefault("dash_weeks", 12)
+    st.session_state.setdefault("dash_days", 30)
+    n_weeks = st.slider("表示する週数", 4, 52, key="dash_weeks")
+    weekly = aggregates.weekly_table(n_weeks, today)
+    st.bar_chart(weekly)
+    with st.expander("表で見る"):
+        st.dataframe(weekly, width="stretch")
+    _csv_download(weekly, "週ごとの面談数", f"aloha_weekly_{today:%Y%m%d}.csv", "dash_csv_weekly")
+
+    st.write("■ しばらく面談していない生徒")
+    days = st.number_input("最後の面談からの日数", min_value=1, step=1, key="dash_days")
+    not_seen = aggregates.not_seen(days, today)
+    st.caption(f"{len(not_seen)} 人")
+    st.dataframe(not_seen, width="stretch", hide_index=True)
+    _csv_download(not_seen.set_index("生徒氏名"), "面談していない生徒", f"aloha_not_seen_{today:%Y%m%d}.csv", "dash_csv_not_seen")
+
+    st.write("■ 志望科類別の得点率の分布 (各生徒の最新の模試)")
+    exam_type = st.radio("模試種別", [EXAM_NIJI, EXAM_KYOTSU], horizontal=True, key="dash_exam")
+    cohort = aggregates.cohort_table(exam_type)
+    if cohort.empty:
+        st.caption("この模試種別の成績はまだありません")
+    else:
+        st.bar_chart(cohort)
+        with st.expander("表で見る"):
+            st.dataframe(cohort, width="stretch")
+        _csv_download(cohort, "得点率の分布", f"aloha_cohort_{today:%Y%m%d}.csv", "dash_csv_cohort")
+
+    st.write("■ 教科別のアクション数")
+    action_counts = aggregates.action_table()
+    if action_counts.empty:
+        st.caption("アクションはまだありません")
+    else:
+        st.bar_chart(action_counts)
+        _csv_download(action_counts, "教科別のアクション数", f"aloha_actions_{today:%Y%m%d}.csv", "dash_csv_actions")
+
+    st.divider()
+    st.caption(f"集計済みの記録: {aggregates.rows} 件 (保存のたびに追加分だけ更新しています)")
+    # コールバックで捨てておき、ボタンを押した後の再実行で作り直す
+    st.button("集計を作り直す", key="dash_rebuild", on_click=rebuild_derived, args=("dashboard",))
+
+# --- UI構築 ---
+
+st.title("🎓 ALOHA Mentoring Base")
+
+tab_labels = ["📝 新規面談・保存", "🔍 過去ログ検索", "📄 レポート出力", "✅ アクション", "📊 ダッシュボード"]
+if IS_ADMIN:
+    tab_labels.append("🛠 診断")
+# 選んでいるタブの中身だけを実行する (tab.open)。新規作成タブは入力中の値を保つため常に描画する
+tab_new, tab_search, tab_preview, tab_actions, tab_dashboard, *tab_admin = st.tabs(tab_labels, key="main_tab", on_change="rerun")
+keep_widget_values(TAB_WIDGET_KEYS)
+
+# ==========================================
+# 1. 新規作成タブ
+# ==========================================
+_section_started = time.perf_counter()
+with tab_new:
+    st.subheader("面談記録の入力")
+    
+    # 入力フォーム
+    with st.container():
+        c1, c2 = st.columns(2)
+        with c1:
+            mentor_name = st.text_input("担当メンター", key="in_mentor")
+            student_name = st.text_input("生徒氏名", key="in_student")
+            stream = st.radio("文理", ["理系", "文系"], horizontal=True, key="in_stream")
+        with c2:
+            date_val = st.date_input("実施日", datetime.date.today(), key="in_date")
+            
+            # 学年の選択肢
+            grade_options = ["中1", "中2", "中3", "高1", "高2", "高3", "既卒"]
+            default_grade_idx = grade_options.index("高3")
+            grade = st.selectbox("学年", grade_options, index=default_grade_idx, key="in_grade")
+            
+            default_target = "理科一類" if stream == "理系" else "文科一類"
+            target = st.text_input("志望科類", value=default_target, key="in_target")
+
+    st.divider()
+
+    # 模試・課題
+    exam_type, exam_name, scores, current_issue = score_section(stream)
+
+    st.divider()
+
+    action_section(stream)
 
     st.divider()
 
@@ -293,13 +1059,6 @@ with tab_new:
         if not student_name:
             st.error("生徒氏名を入力してください")
         else:
-            full_data = {
-                "mentor": mentor_name,
-                "scores": scores,
-                "exam_type": exam_type,
-                "actions": st.session_state.actions,
-                "stream": stream
-            }
             new_row = pd.DataFrame([{
                 "日付": date_val.strftime('%Y-%m-%d'),
                 "担当メンター": mentor_name,
@@ -309,176 +1068,354 @@ with tab_new:
                 "志望科類": target,
                 "模試名": exam_name,
                 "課題": current_issue,
-                "データJSON": json.dumps(full_data, ensure_ascii=False)
+                "データJSON": encode_payload(scores, exam_type, st.session_state.actions)
             }])
             
+            # 保存できなかったとき (save_data がエラーを表示する) は入力を消さずに残す
             if save_data(new_row):
                 st.session_state["needs_clear"] = True
                 st.rerun()
-            else:
-                if not DB_MODE:
-                    st.warning("⚠️ データベース未設定のため、一時保存しました（リロードで消えます）。")
-                    st.session_state["needs_clear"] = True
-                    st.rerun()
+
+    st.divider()
+    with st.expander("📥 模試の成績表を一括で取り込む (CSV / Excel)"):
+        import_section()
+
+metrics.record("render.new_tab", time.perf_counter() - _section_started)
 
 # ==========================================
 # 2. 検索タブ
 # ==========================================
-with tab_search:
-    st.subheader("過去ログ検索")
-    
-    df = load_data()
+if tab_search.open:
+    _section_started = time.perf_counter()
+    with tab_search:
+        st.subheader("過去ログ検索")
     
-    if df.empty:
-        st.info("まだ保存されたデータはありません。")
-    else:
-        search_name = st.text_input("生徒名で検索", placeholder="名前の一部を入力")
-        
-        if search_name:
-            if '生徒氏名' in df.columns:
-                filtered_df = df[df['生徒氏名'].str.contains(search_name, na=False)]
-            else:
-                filtered_df = df
+        if not has_data():
+            st.info("まだ保存されたデータはありません。")
         else:
-            filtered_df = df
+            sc1, sc2 = st.columns([1, 3])
+            with sc1:
+                search_target = st.selectbox("検索対象", list(SEARCH_TARGETS.keys()), key="search_target")
+            with sc2:
+                search_name = st.text_input("検索語", placeholder="名前などの一部を入力 (かな・カナ、全角・半角は区別しません)", key="search_text")
+        
+            sc3, sc4, sc5, sc6 = st.columns([2, 2, 1, 1])
+            with sc3:
+                sort_label = st.selectbox("並び順", list(LOG_SORT_OPTIONS.keys()), key="log_sort")
+            with sc4:
+                st.write("")
+                latest_only = st.checkbox("生徒ごとに最新の記録のみ", key="log_latest_only")
+            with sc5:
+                page_size = st.selectbox("表示件数", LOG_PAGE_SIZES, key="log_page_size")
+        
+            log_df, result_keys = search_keys(
+                search_name, fields=SEARCH_TARGETS[search_target],
+                sort=LOG_SORT_OPTIONS[sort_label], latest_only=latest_only,
+            )
+            n_pages = max(1, -(-len(result_keys) // page_size))
+            # 条件が変わったら 1 ページ目に戻す
+            page_signature = (search_name, search_target, sort_label, latest_only, page_size)
+            if st.session_state.get("log_page_signature") != page_signature:
+                st.session_state["log_page_signature"] = page_signature
+                st.session_state["log_page"] = 1
+            st.session_state["log_page"] = min(st.session_state.get("log_page", 1), n_pages)
+            with sc6:
+                page = st.number_input(f"ページ (全 {n_pages})", min_value=1, max_value=n_pages, step=1, key="log_page")
+        
+            page_keys = result_keys[(page - 1) * page_size:page * page_size]
+            filtered_df = log_df.loc[page_keys]
 
-        filtered_df = filtered_df.sort_index(ascending=False)
+            _, decoded = load_derived("decoded")
+            if not decoded["errors"].empty:
+                with st.expander(f"⚠️ 読み込めなかったデータ ({len(decoded['errors'])} 件)"):
+                    st.dataframe(decoded["errors"], width="stretch")
 
-        display_cols = [c for c in ["日付", "担当メンター", "生徒氏名", "学年", "文理", "志望科類", "課題"] if c in df.columns]
-        st.dataframe(filtered_df[display_cols], use_container_width=True)
+            st.caption(f"{len(result_keys)} 件中 {(page - 1) * page_size + 1 if len(page_keys) else 0}〜{(page - 1) * page_size + len(page_keys)} 件目")
+            display_cols = [c for c in ["日付", "担当メンター", "生徒氏名", "学年", "文理", "志望科類", "課題"] if c in filtered_df.columns]
+            st.dataframe(filtered_df[display_cols], width="stretch")
 
-        st.divider()
-        st.write("▼ 詳細を確認したい行を選択")
+            st.divider()
+            st.write("▼ 詳細を確認したい行を選択")
         
-        if not filtered_df.empty:
-            def format_func(x):
-                row = filtered_df.loc[x]
-                return f"{row.get('日付', '')} - {row.get('生徒氏名', '')}"
+            if not filtered_df.empty:
+                def format_func(x):
+                    row = filtered_df.loc[x]
+                    return f"{row.get('日付', '')} - {row.get('生徒氏名', '')}"
 
-            selected_index = st.selectbox("詳細を表示", filtered_df.index.tolist(), format_func=format_func)
+                selected_index = st.selectbox("詳細を表示", filtered_df.index.tolist(), format_func=format_func)
             
-            if selected_index is not None:
-                row = filtered_df.loc[selected_index]
-                json_data = row.get('データJSON')
+                if selected_index is not None:
+                    row = filtered_df.loc[selected_index]
+                    _, decoded = load_derived("decoded")
+                    exam_type_val, raw_scores = row_scores(decoded, selected_index)
+                    errors = row_errors(decoded, selected_index)
                 
-                if pd.isna(json_data) or json_data == "" or json_data is None:
-                    st.warning("詳細データなし")
-                    st.write(f"概要: {row.get('課題', 'なし')}")
-                else:
-                    try:
-                        detail = json.loads(json_data)
-                        
+                    if errors and exam_type_val is None:
+                        st.error("データの形式が正しくありません。")
+                        for err in errors:
+                            st.caption(err)
+                    elif exam_type_val is None:
+                        st.warning("詳細データなし")
+                        st.write(f"概要: {row.get('課題', 'なし')}")
+                    else:
                         st.markdown(f"**{row.get('生徒氏名')}** ({row.get('日付')})")
                         st.write(f"担当: {row.get('担当メンター')} / {row.get('文理')} / {row.get('志望科類')}")
                         st.info(f"課題: {row.get('課題')}")
-                        
+                    
                         st.write("■ 成績")
                         exam_name_val = row.get('模試名')
-                        exam_type_val = detail.get('exam_type', '東大二次(本番レベル)')
-                        
+                    
                         if not pd.isna(exam_name_val) and str(exam_name_val).strip() != "":
                              st.markdown(f"📊 **{exam_name_val}** ({exam_type_val})")
-                        
-                        raw_scores = detail.get('scores', {})
-                        
-                        if raw_scores:
-                            label_map = SCORE_LABELS_NIJI if exam_type_val == "東大二次(本番レベル)" else SCORE_LABELS_KYOTSU
-                            score_display_data = {label_map.get(k, k): v for k, v in raw_scores.items() if v}
-                            
-                            if score_display_data:
-                                score_df = pd.DataFrame([score_display_data])
-                                st.table(score_df)
-                            else:
-                                st.caption("点数データなし")
+                    
+                        label_map = SCORE_LABELS.get(exam_type_val, SCORE_LABELS[EXAM_NIJI])
+                        score_display_data = {label_map.get(k, k): f"{v:g}" for k, v in raw_scores.items()}
+                    
+                        if score_display_data:
+                            score_df = pd.DataFrame([score_display_data])
+                            st.table(score_df)
+                        else:
+                            st.caption("点数データなし")
+                        for err in errors:
+                            st.caption(f"⚠️ {err}")
 
                         st.write("■ アクション")
-                        for act in detail.get('actions', []):
+                        for act in row_actions(decoded, selected_index):
                             policy_text = act.get('policy', '')
                             policy_display = f"【方針】{policy_text} / " if policy_text else ""
-                            
+                        
                             st.write(f"- 【{act['subject']}】 **{act['specificTask']}**")
                             st.caption(f"　 └ {policy_display}優先度: {act.get('priority','-')} (期限: {act['deadline']})")
-                            
-                    except json.JSONDecodeError:
-                        st.error("データの形式が正しくありません。")
+
+                    # 成績推移 (全生徒分を一括で集計した表から、この生徒の分だけを取り出す)
+                    st.divider()
+                    st.write(f"■ 成績推移: {row.get('生徒氏名')}")
+                    _, trends = load_derived("trends")
+                    history = student_trend(trends, row.get('生徒氏名'))
+                
+                    if history.empty:
+                        st.caption("点数の記録がありません")
+                    for exam_type_key in history["exam_type"].unique():
+                        hist = history[history["exam_type"] == exam_type_key]
+                        label_map = SCORE_LABELS.get(exam_type_key, SCORE_LABELS[EXAM_NIJI])
+                        codes = [c for c in label_map if hist[c].notna().any()]
+                    
+                        st.markdown(f"**{exam_type_key}** ({len(hist)} 回)")
+                        chart_df = hist.set_index("exam_key")[codes + ["total"]]
+                        st.line_chart(chart_df.rename(columns={**label_map, "total": "合計"}))
+                    
+                        trend_table = pd.DataFrame({
+                            "日付": hist["日付"].dt.strftime("%Y-%m-%d"),
+                            "模試": hist["exam_key"],
+                            "合計": hist["total"],
+                            "前回比": hist["d_total"],
+                            **{f"{col}内 %": hist[f"pct_{col}"].round(1) for col in COHORT_COLUMNS},
+                        })
+                        st.dataframe(trend_table.reset_index(drop=True), width="stretch")
+
+    metrics.record("render.search_tab", time.perf_counter() - _section_started)
 
 # ==========================================
 # 3. プレビュー（出力）タブ
 # ==========================================
-with tab_preview:
-    st.subheader("レポート出力")
+if tab_preview.open:
+    _section_started = time.perf_counter()
+    with tab_preview:
+        st.subheader("レポート出力")
     
-    report_source = st.radio("出力するデータを選択", ["現在入力中の内容", "過去の保存データ"], horizontal=True)
+        report_source = st.radio("出力するデータを選択", ["現在入力中の内容", "過去の保存データ", "一括出力"], horizontal=True, key="report_source")
 
-    target_data = {}
+        target_data = {}
     
-    if report_source == "現在入力中の内容":
-        target_data = {
-            "date": date_val.strftime('%Y/%m/%d'),
-            "mentor": mentor_name,
-            "student": student_name,
-            "grade": grade,
-            "stream": stream,
-            "target": target,
-            "issue": current_issue,
-            "actions": st.session_state.actions
-        }
-    else:
-        df = load_data()
-        if df.empty:
-            st.warning("保存されたデータがありません。")
-        else:
-            st.caption("検索フィルタ")
-            rep_search = st.text_input("生徒名で絞り込み", key="rep_search_input")
-            
-            df_sorted = df.sort_index(ascending=False)
+        if report_source == "現在入力中の内容":
+            target_data = {
+                "date": date_val.strftime('%Y/%m/%d'),
+                "mentor": mentor_name,
+                "student": student_name,
+                "grade": grade,
+                "stream": stream,
+                "target": target,
+                "issue": current_issue,
+                "actions": st.session_state.actions
+            }
+        elif report_source == "過去の保存データ":
+            if not has_data():
+                st.warning("保存されたデータがありません。")
+            else:
+                st.caption("検索フィルタ")
+                rep_search = st.text_input("生徒名で絞り込み", key="rep_search_input")
             
-            if rep_search:
-                if '生徒氏名' in df_sorted.columns:
-                    df_sorted = df_sorted[df_sorted['生徒氏名'].str.contains(rep_search, na=False)]
+                df_sorted = search_data(rep_search, fields=["生徒氏名"])
             
-            if df_sorted.empty:
-                st.warning("該当するデータが見つかりません。")
-            else:
-                def format_report_func(x):
-                    r = df_sorted.loc[x]
-                    return f"{r.get('日付', '')} - {r.get('生徒氏名', '')}"
+                if df_sorted.empty:
+                    st.warning("該当するデータが見つかりません。")
+                else:
+                    def format_report_func(x):
+                        r = df_sorted.loc[x]
+                        return f"{r.get('日付', '')} - {r.get('生徒氏名', '')}"
                 
-                rep_idx = st.selectbox("レポートにする記録を選択", df_sorted.index.tolist(), format_func=format_report_func)
+                    rep_idx = st.selectbox("レポートにする記録を選択", df_sorted.index.tolist(), format_func=format_report_func)
                 
-                if rep_idx is not None:
-                    row = df_sorted.loc[rep_idx]
-                    json_raw = row.get('データJSON')
-                    if json_raw:
-                        try:
-                            d = json.loads(json_raw)
-                            target_data = {
-                                "date": row.get('日付'),
-                                "mentor": row.get('担当メンター'),
-                                "student": row.get('生徒氏名'),
-                                "grade": row.get('学年'),
-                                "stream": row.get('文理'),
-                                "target": row.get('志望科類'),
-                                "issue": row.get('課題'),
-                                "actions": d.get('actions', [])
-                            }
-                        except:
+                    if rep_idx is not None:
+                        row = df_sorted.loc[rep_idx]
+                        _, decoded = load_derived("decoded")
+                        exam_type_val, _ = row_scores(decoded, rep_idx)
+                        if exam_type_val is not None:
+                            target_data = report_data_from_row(row, row_actions(decoded, rep_idx))
+                        elif row_errors(decoded, rep_idx):
                             st.error("データの読み込みに失敗しました")
 
-    # レポート生成
-    if target_data:
-        report_text = f"【東大志望者面談シート】\n"
-        report_text += f"日付: {target_data['date']} / 担当: {target_data['mentor']}\n"
-        report_text += f"生徒: {target_data['student']} ({target_data['grade']})\n"
-        report_text += f"文理: {target_data['stream']} / 志望: {target_data['target']}\n"
-        report_text += f"課題: {target_data['issue']}\n\n"
-        report_text += f"■ ネクストアクション\n"
+        elif report_source == "一括出力":
+            batch_export_section()
+
+        # レポート生成
+        if target_data:
+            with metrics.timer("report.render"):
+                report_text = render_report(target_data)
+            st.code(report_text)
+            st.caption("右上のコピーボタンでコピーできます")
+
+    metrics.record("render.report_tab", time.perf_counter() - _section_started)
+
+# ==========================================
+# 4. アクション管理タブ
+# ==========================================
+if tab_actions.open:
+    _section_started = time.perf_counter()
+    with tab_actions:
+        st.subheader("ネクストアクション")
+        action_tracker_section()
+
+    metrics.record("render.actions_tab", time.perf_counter() - _section_started)
+
+# ==========================================
+# 5. ダッシュボードタブ
+# ==========================================
+if tab_dashboard.open:
+    _section_started = time.perf_counter()
+    with tab_dashboard:
+        st.subheader("ダッシュボード")
+        dashboard_section()
+
+    metrics.record("render.dashboard_tab", time.perf_counter() - _section_started)
+
+# ==========================================
+# 保存先の状態と送信状況 (サイドバー)
+# ==========================================
+# デモモードは書き込みキューを使わない
+n_pending = 0 if STORAGE_BACKEND == "demo" else len(_get_write_queue())
+if n_pending:
+    # まだ送っていない保存があれば、ここで接続して送り始める
+    get_backend()
+health = _backend_health()
+if STORAGE_BACKEND == "demo":
+    st.sidebar.info("🧪 デモモード: 保存先を使わず、データはこのセッション内だけに保持します")
+elif health["state"] == "ok":
+    st.sidebar.caption(f"🟢 保存先: {STORAGE_BACKEND} (接続済み)")
+elif health["state"] == "idle":
+    st.sidebar.caption(f"⚪ 保存先: {STORAGE_BACKEND} (ログを使うときに接続します)")
+else:
+    st.sidebar.error(f"🔴 保存先 ({STORAGE_BACKEND}) に接続できません: {health['error']}")
+    st.sidebar.caption(
+        "保存はこの端末に保管し、接続できたら送信します。検索・レポートはこのセッションで保存した分だけが対象です"
+    )
+    st.sidebar.button("再接続", key="reconnect_backend", on_click=get_backend, kwargs={"force": True})
+
+flusher = current_flusher()
+if STORAGE_BACKEND == "demo":
+    pass
+elif n_pending == 0:
+    st.sidebar.caption("📮 保存はすべて送信済みです")
+elif flusher is None:
+    st.sidebar.warning(f"📮 送信待ち {n_pending} 件 (保存先に未接続のため、この端末に保管中)")
+else:
+    st.sidebar.info(f"📮 送信待ち {n_pending} 件")
+    if flusher.status["last_error"]:
+        retry_in = max(0.0, (flusher.status["next_retry_at"] or time.time()) - time.time())
+        st.sidebar.caption(f"送信エラー: {flusher.status['last_error']} ({retry_in:.0f} 秒後に再送)")
+
+# ==========================================
+# 6. 診断タブ (管理者のみ)
+# ==========================================
+if IS_ADMIN and tab_admin[0].open:
+    with tab_admin[0]:
+        st.subheader("診断")
+        diag_extra = {
+            "log_cache": log_cache_stats() if db_mode() else None,
+            "write_queue": {"pending": n_pending, **(flusher.status if flusher else {})},
+            "storage_backend": STORAGE_BACKEND,
+            "backend_state": health["state"],
+            "backend_error": health["error"],
+        }
         
-        for idx, act in enumerate(target_data['actions']):
-            p_text = act.get('policy', '')
-            p_str = f"方針: {p_text} / " if p_text else ""
-            
-            report_text += f"{idx+1}. 【{act['subject']}】 {act['specificTask']}\n   ({p_str}期限: {act['deadline']})\n"
+        if not metrics.is_enabled():
+            st.info("処理時間の計測は無効です (secrets の metrics = true か、環境変数 ALOHA_METRICS=1 で有効になります)")
+        else:
+            metric_rows = pd.DataFrame(metrics.summary())
+            if metric_rows.empty:
+                st.caption("まだ計測値がありません")
+            else:
+                st.caption(f"直近 {metrics.WINDOW} 回分のパーセンタイル (ミリ秒)。avg_bytes・bytes_total は保存先と読み書きしたセルの中身の UTF-8 のバイト数")
+                st.dataframe(metric_rows, width="stretch", hide_index=True)
+                st.bar_chart(metric_rows.set_index("name")[["p50_ms", "p95_ms", "p99_ms"]])
         
-        st.code(report_text)
-        st.caption("右上のコピーボタンでコピーできます")
+        st.write("■ 保存先")
+        checked = (f"{datetime.datetime.fromtimestamp(health['checked_at']):%H:%M:%S} に確認"
+                   if health["checked_at"] else "未確認")
+        st.caption(f"{STORAGE_BACKEND}: {health['state']} ({checked})" + (f" / {health['error']}" if health["error"] else ""))
+        if STORAGE_BACKEND != "demo" and st.button("接続を確認", key="check_backend"):
+            with metrics.timer("backend.health_check"):
+                ok = get_backend(force=True) is not None
+            (st.success if ok else st.error)("接続できました" if ok else f"接続できません: {health['error']}")
+
+        st.write("■ ログキャッシュ")
+        if diag_extra["log_cache"] is not None:
+            cache_stats = diag_extra["log_cache"]
+            st.caption(f"ヒット: {cache_stats['hits']} / ミス: {cache_stats['misses']}")
+            st.caption(f"行数: {cache_stats['rows']} / バージョン: {cache_stats['version']}")
+            st.caption(
+                f"同期 ({LOG_SYNC}): 差分 {cache_stats['sync_delta']} 回 / 全件 {cache_stats['sync_full']} 回"
+                f" / 取り込み済みの更新日時: {cache_stats['watermark'] or '-'}"
+            )
+            if cache_stats["sync_last_full_reason"]:
+                st.caption(f"直近の全件読み直しの理由: {cache_stats['sync_last_full_reason']}")
+            if cache_stats["age_sec"] is not None:
+                st.caption(f"取得から {cache_stats['age_sec']:.1f} 秒 (上限 {LOG_CACHE_TTL:.0f} 秒)")
+            if st.button("再読み込み", key="reload_logs"):
+                invalidate_log_cache()
+                st.rerun()
+        else:
+            st.caption("デモモードのためキャッシュは使っていません")
+        
+        backend = get_backend()
+        if backend is not None and STORAGE_BACKEND == "gsheets" and LOG_PARTITION:
+            st.write("■ ログのパーティション")
+            try:
+                parts = backend.partitions()
+                st.dataframe(pd.DataFrame([
+                    {"ワークシート": name, "置き場所": source or "既定",
+                     "状態": "閉じた" if backend.is_closed(name) else "書き込み中"}
+                    for name, source in parts.items()
+                ]), width="stretch", hide_index=True)
+            except Exception as e:
+                st.error(f"パーティションの一覧を取得できませんでした: {e}")
+            keep = int(get_setting("log_partition_keep", 2))
+            st.caption(f"閉じたパーティションは新しい方から {keep} 個を残して縮め、それより古いものはアーカイブ先へ移します")
+            if st.button("閉じたパーティションを整理", key="maintain_partitions"):
+                with st.spinner("整理しています..."):
+                    done = backend.maintain(keep=keep)
+                labels = {"compact": "縮小", "archive": "アーカイブ"}
+                st.success(" / ".join(f"{name}: {labels[op]} ({n} 行)" for op, name, n in done) or "整理するものはありません")
+        
+        dc1, dc2 = st.columns(2)
+        with dc1:
+            st.download_button(
+                "⬇️ 計測値を JSON で保存", metrics.export_json(diag_extra),
+                file_name=f"aloha_metrics_{datetime.datetime.now():%Y%m%d_%H%M%S}.json", mime="application/json",
+            )
+        with dc2:
+            if st.button("計測値をリセット", key="reset_metrics"):
+                metrics.reset()
+                st.rerun()
+
+metrics.record("rerun", time.perf_counter() - _rerun_started)
@@ -0,0 +1,80 @@
+"""アクション管理タブの絞り込みのベンチマーク
+
+実行: python benchmarks/bench_actions.py
+
+合成ログから decode_logs() の actions 表を作り、「メンター X の期限切れの優先度・高のアクション」などの
+絞り込みを次の 2 通りで比べる。
+
+- scan:  actions 表に毎回 resolve_deadline() で期限を付け、pandas で絞り込んで期限順に並べる
+- index: ActionIndex (期限順の位置の配列) から切り出す (タブの処理)
+
+あわせて ActionIndex.build() の時間と、保存 1 件分を add_rows() で足す時間を表示する。
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from action_tracker import ActionIndex, action_rows  # noqa: E402
+from records import decode_logs  # noqa: E402
+from storage import stamp_rows  # noqa: E402
+from synthetic import END_DATE, make_logs  # noqa: E402
+
+SIZES = [10_000, 100_000]
+REPEAT = 20
+QUERIES = {
+    "overdue/mentor/high": dict(mentor="メンター3", priorities=["高"], due_to=END_DATE - pd.Timedelta(days=1)),
+    "week/all": dict(due_from=END_DATE, due_to=END_DATE + pd.Timedelta(days=6)),
+    "open/subject": dict(subject="英語"),
+}
+
+
+def _scan(df, actions, mentor=None, subject=None, priorities=None, due_from=None, due_to=None):
+    table = action_rows(df, actions)
+    mask = pd.Series(True, index=table.index)
+    if mentor:
+        mask &= table["担当メンター"] == mentor
+    if subject:
+        mask &= table["subject"] == subject
+    if priorities:
+        mask &= table["priority"].isin(priorities)
+    if due_from is not None:
+        mask &= table["due"] >= due_from
+    if due_to is not None:
+        mask &= table["due"] <= due_to
+    return table[mask].sort_values("due", kind="mergesort")
+
+
+def _best(fn, repeat=REPEAT):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    print(f"{'rows':>7} | {'query':<20} | {'scan ms':>8} | {'index ms':>8} | {'hits':>6}")
+    print("-" * 62)
+    for n in SIZES:
+        df = make_logs(n)
+        actions = decode_logs(df)["actions"]
+        build_sec, index = _best(lambda: ActionIndex.build(df, actions), repeat=1)
+        for label, cond in QUERIES.items():
+            scan_sec, expected = _best(lambda: _scan(df, actions, **cond), repeat=3)
+            index_sec, got = _best(lambda: index.query(**cond))
+            assert set(got["アクションID"]) == set(expected["アクションID"]), label
+            print(f"{n:>7} | {label:<20} | {scan_sec * 1000:>8.2f} | {index_sec * 1000:>8.3f} | {len(got):>6}")
+
+        new_row = stamp_rows(df.tail(1).reset_index(drop=True))
+        new_row.index = [len(df)]
+        add_sec, _ = _best(lambda: index.add_rows(new_row, decode_logs(new_row)["actions"]), repeat=1)
+        print(f"{n:>7} | build {build_sec * 1000:.0f} ms / add_rows (1 件) {add_sec * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
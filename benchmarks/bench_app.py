@@ -0,0 +1,192 @@
+"""アプリ全体のベンチマーク: 起動・検索・詳細表示・レポート・保存を AppTest で通して測る
+
+実行: python benchmarks/bench_app.py [--sizes 1000 10000 100000] [--latency 0.05] [--fail-rate 0.1]
+                                     [--partition year] [--update-baseline]
+
+合成ログ (synthetic.make_logs) をメモリ上のシート (fake_sheets.FakeBook) に置き、app.py の
+streamlit_gsheets をそのシートにつながる接続に差し替えて (fake_sheets.install)、次の操作を順に行う。
+
+- startup: 最初の実行 (新規面談タブ。ログはまだ読まない)
+- load:    過去ログ検索タブを初めて開く (ログの全件読み込みと検索用の派生データ作成を含む)
+- search:  過去ログ検索タブで氏名の一部を検索
+- detail:  検索結果の 2 件目の詳細 (成績・アクション・成績推移) を表示
+- report:  レポート出力タブで過去の保存データを選んでレポートを作る
+- save:    新規面談タブで保存ボタンを押した実行
+- flush:   保存ボタンを押してから、保存した行が書き込みキュー経由でシートに届くまで
+
+各操作の経過時間 (秒) と、終了時のプロセスの最大常駐メモリ (peak_rss_mb) を表示する。
+行数ごとに別プロセスで測る (st.cache_resource のスナップショットを持ち越さないため)。
+
+結果は benchmarks/baselines.json の値と比べ、経過時間が (1 + --tolerance) 倍 + 0.05 秒、
+メモリが 1.25 倍 + 20 MB を超えた項目があれば一覧を出して終了コード 1 で終わる。
+基準値は測ったマシンに依存するので、マシンを変えたら --update-baseline で取り直すこと。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES = os.path.join(ROOT, "benchmarks", "baselines.json")
+STEPS = ["startup", "load", "search", "detail", "report", "save", "flush"]
+TAB_NEW, TAB_SEARCH, TAB_REPORT = "📝 新規面談・保存", "🔍 過去ログ検索", "📄 レポート出力"
+FLUSH_TIMEOUT = 60
+
+
+def _peak_rss_mb():
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def _run(at, tab):
+    # AppTest はタブの選択状態を送り返さないので、実行のたびに指定する
+    at.session_state["main_tab"] = tab
+    start = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return elapsed
+
+
+def _book_rows(book):
+    return sum(len(df) for df in book.sheets.values() if "データJSON" in df.columns)
+
+
+def measure(n_rows, latency, fail_rate, partition):
+    """1 つの行数で全操作を測り、{操作: 秒, "peak_rss_mb": MB} を返す (別プロセスで呼ぶ)"""
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+    sys.path.insert(0, os.path.join(ROOT, "tools"))
+    from streamlit.testing.v1 import AppTest
+
+    from fake_sheets import FakeBook, install
+    from synthetic import make_logs
+
+    df = make_logs(n_rows)
+    book = FakeBook(df)
+    if partition:
+        from partition_logs import cutover
+
+        cutover(book, partition)
+    book.latency, book.fail_rate = latency, fail_rate
+    install(book)
+
+    result = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ.update({
+            "ALOHA_STORAGE_BACKEND": "gsheets",
+            "ALOHA_LOG_PARTITION": partition or "",
+            "ALOHA_WRITE_QUEUE_PATH": os.path.join(workdir, "pending.jsonl"),
+        })
+        at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=600)
+        result["startup"] = _run(at, TAB_NEW)
+
+        result["load"] = _run(at, TAB_SEARCH)
+        at.text_input(key="search_text").input(df["生徒氏名"].iloc[n_rows // 2][:2])
+        result["search"] = _run(at, TAB_SEARCH)
+
+        next(s for s in at.selectbox if s.label == "詳細を表示").select_index(1)
+        result["detail"] = _run(at, TAB_SEARCH)
+
+        _run(at, TAB_REPORT)
+        at.radio(key="report_source").set_value("過去の保存データ")
+        _run(at, TAB_REPORT)
+        at.text_input(key="rep_search_input").input(df["生徒氏名"].iloc[n_rows // 3])
+        result["report"] = _run(at, TAB_REPORT)
+        if not at.code:
+            raise RuntimeError("レポートが表示されませんでした")
+
+        at.text_input(key="in_student").input("ベンチ太郎")
+        at.text_input(key="in_exam").input("第1回東大実戦")
+        _run(at, TAB_NEW)
+        next(b for b in at.button if b.label == "💾 この内容を保存する").click()
+        before = _book_rows(book)
+        start = time.perf_counter()
+        result["save"] = _run(at, TAB_NEW)
+        while _book_rows(book) <= before:
+            if time.perf_counter() - start > FLUSH_TIMEOUT:
+                raise RuntimeError("保存した行がシートに届きませんでした")
+            time.sleep(0.01)
+        result["flush"] = time.perf_counter() - start
+
+    result["peak_rss_mb"] = _peak_rss_mb()
+    return result
+
+
+def _baseline_key(n_rows, args):
+    options = [f"latency={args.latency:g}"] if args.latency else []
+    options += [f"fail_rate={args.fail_rate:g}"] if args.fail_rate else []
+    options += [f"partition={args.partition}"] if args.partition else []
+    return "/".join([str(n_rows), *options])
+
+
+def _regressions(result, baseline, tolerance):
+    found = []
+    for name in STEPS:
+        if name in baseline and result[name] > baseline[name] * (1 + tolerance) + 0.05:
+            found.append(f"{name}: {result[name]:.3f} 秒 (基準 {baseline[name]:.3f} 秒)")
+    if "peak_rss_mb" in baseline and result["peak_rss_mb"] > baseline["peak_rss_mb"] * 1.25 + 20:
+        found.append(f"peak_rss_mb: {result['peak_rss_mb']:.0f} MB (基準 {baseline['peak_rss_mb']:.0f} MB)")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--latency", type=float, default=0.0, help="API 1 回あたりの待ち時間 (秒)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="API 呼び出しを失敗させる割合")
+    parser.add_argument("--partition", choices=["year", "month"])
+    parser.add_argument("--tolerance", type=float, default=0.5, help="経過時間の許容増加率")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--measure", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.latency, args.fail_rate, args.partition)))
+        return
+
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES, encoding="utf-8") as f:
+            baselines = json.load(f)
+
+    print(f"{'rows':>7} | " + " | ".join(f"{s:>7}" for s in STEPS) + f" | {'rss MB':>7}")
+    print("-" * (10 + 10 * len(STEPS) + 9))
+    failures = []
+    for n in args.sizes:
+        child = [sys.executable, os.path.abspath(__file__), "--measure", str(n),
+                 "--latency", str(args.latency), "--fail-rate", str(args.fail_rate)]
+        if args.partition:
+            child += ["--partition", args.partition]
+        proc = subprocess.run(child, capture_output=True, text=True)
+        if proc.returncode != 0:
+            sys.exit(f"{n} 行の計測に失敗しました:\n{proc.stderr}")
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"{n:>7} | " + " | ".join(f"{result[s]:>7.3f}" for s in STEPS) + f" | {result['peak_rss_mb']:>7.0f}")
+
+        key = _baseline_key(n, args)
+        if args.update_baseline:
+            baselines[key] = {k: round(v, 3) for k, v in result.items()}
+        elif key in baselines:
+            failures += [f"{key} {msg}" for msg in _regressions(result, baselines[key], args.tolerance)]
+
+    if args.update_baseline:
+        with open(BASELINES, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"基準値を {os.path.relpath(BASELINES, ROOT)} に保存しました")
+    elif failures:
+        print("基準値より遅く (大きく) なった項目:")
+        for msg in failures:
+            print(f"  {msg}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
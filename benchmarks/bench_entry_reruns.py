@@ -0,0 +1,147 @@
+"""面談記録 1 件を入力し終えるまでの再実行回数と処理時間の計測
+
+実行: python benchmarks/bench_entry_reruns.py [--rows 10000] [--baseline <git のリビジョン>]
+
+合成ログを一時的な SQLite に入れ、担当メンター・生徒氏名・成績 7 科目・課題・アクション 2 件を入力して
+保存するまでの操作 (STEPS) を Streamlit の AppTest で順に再生する。
+--baseline を付けると、そのリビジョンの app.py でも同じ操作を行って並べて表示する。
+
+AppTest はフラグメントだけの再実行を再現できない (操作のたびにスクリプト全体を実行する) ため、
+フラグメント内の操作は、アプリ内で計測したその欄の描画時間 (render.entry_*) を 1 回分の処理時間とみなす。
+それ以外の操作はスクリプト全体の実行時間をそのまま数える。
+アプリごとにモジュールが混ざらないよう、計測は別プロセスで行う。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (欄, 操作, キーまたはボタンの表示名, 値)。欄はフラグメントの計測名 render.entry_<欄> に対応する
+STEPS = [
+    ("basic", "text", "in_mentor", "メンターA"),
+    ("basic", "text", "in_student", "東大太郎"),
+    ("scores", "text", "in_exam", "第1回東大実戦"),
+    ("scores", "text", "in_s_eng", "78"),
+    ("scores", "text", "in_s_math", "65"),
+    ("scores", "text", "in_s_jp_mod", "30"),
+    ("scores", "text", "in_s_jp_anc", "20"),
+    ("scores", "text", "in_s_jp_chi", "18"),
+    ("scores", "text", "in_s_sci1", "35"),
+    ("scores", "text", "in_s_sci2", "31"),
+    ("scores", "area", "in_issue", "数学の完答数が少ない"),
+    ("actions", "text", "t_0", "鉄壁 Section 6-10"),
+    ("actions", "button", "＋ アクション追加", None),
+    ("actions", "select", "s_1", "数学(理系)"),
+    ("actions", "text", "d_1", "2週間後"),
+    ("actions", "text", "pol_1", "完答できる大問を増やす"),
+    ("actions", "text", "t_1", "過去問 5 年分"),
+    ("save", "button", "💾 この内容を保存する", None),
+]
+
+
+def _apply(at, kind, target, value):
+    if kind == "text":
+        at.text_input(key=target).input(value)
+    elif kind == "area":
+        at.text_area(key=target).input(value)
+    elif kind == "select":
+        at.selectbox(key=target).select(value)
+    else:
+        next(b for b in at.button if b.label == target).click()
+
+
+def measure(app_dir, n_rows):
+    """app_dir の app.py で STEPS を再生し、結果を dict で返す (別プロセスで呼ぶ)"""
+    sys.path.insert(0, app_dir)
+    sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+    from streamlit.testing.v1 import AppTest
+
+    import metrics
+    from storage import create_backend
+    from synthetic import make_logs
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "logs.db")
+        create_backend("sqlite", path=path).append(make_logs(n_rows))
+        os.environ.update({
+            "ALOHA_STORAGE_BACKEND": "sqlite",
+            "ALOHA_STORAGE_PATH": path,
+            "ALOHA_WRITE_QUEUE_PATH": os.path.join(workdir, "pending.jsonl"),
+            "ALOHA_METRICS": "1",
+        })
+        at = AppTest.from_file(os.path.join(app_dir, "app.py"), default_timeout=600)
+        at.run()
+        at.run()  # 2 回目以降の状態 (スナップショット作成済み) から測る
+
+        result = {"full_reruns": 0, "fragment_reruns": 0, "seconds": 0.0, "cpu_seconds": 0.0}
+        last = getattr(metrics, "last", None)
+        for section, kind, target, value in STEPS:
+            _apply(at, kind, target, value)
+            wall, cpu = time.perf_counter(), time.process_time()
+            at.run()
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            if at.exception:
+                raise RuntimeError(f"{target}: {at.exception[0].message}")
+            fragment_time = last(f"render.entry_{section}") if last else None
+            if fragment_time is not None:
+                result["fragment_reruns"] += 1
+                result["seconds"] += fragment_time
+                result["cpu_seconds"] += fragment_time
+            else:
+                result["full_reruns"] += 1
+                result["seconds"] += wall
+                result["cpu_seconds"] += cpu
+        return result
+
+
+def _run_child(app_dir, n_rows):
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--measure", app_dir, "--rows", str(n_rows)],
+        check=True, stdout=subprocess.PIPE, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def _export_revision(rev, dest):
+    archive = subprocess.run(["git", "-C", ROOT, "archive", rev], check=True, capture_output=True).stdout
+    archive_path = os.path.join(dest, "src.tar")
+    with open(archive_path, "wb") as f:
+        f.write(archive)
+    with tarfile.open(archive_path) as tar:
+        tar.extractall(dest)
+    return dest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--baseline")
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.rows)))
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.baseline:
+            results.append((args.baseline, _run_child(_export_revision(args.baseline, workdir), args.rows)))
+        results.append(("worktree", _run_child(ROOT, args.rows)))
+
+    print(f"{args.rows} 行のログ、操作 {len(STEPS)} 回 (入力 → 保存)")
+    print(f"{'app':>12} | {'full reruns':>11} | {'fragment':>8} | {'total ms':>9} | {'cpu ms':>9}")
+    print("-" * 62)
+    for label, r in results:
+        print(f"{label:>12} | {r['full_reruns']:>11} | {r['fragment_reruns']:>8} | "
+              f"{r['seconds'] * 1000:>9.1f} | {r['cpu_seconds'] * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
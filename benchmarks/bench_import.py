@@ -0,0 +1,81 @@
+"""成績表の一括取り込みのベンチマーク
+
+実行: python benchmarks/bench_import.py
+
+合成ログ LOG_ROWS 件の生徒に対する成績表 (CSV, cp932) を作り、score_import.build_records で
+検証・変換するまでの時間と、tracemalloc で測ったメモリの最大使用量を比べる。
+
+- chunked: iter_chunks で CHUNK_ROWS 行ずつ読む (アプリの取り込み)
+- whole:   ファイル全体を 1 つの DataFrame に読んでから渡す
+"""
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from master_data import EXAM_NIJI  # noqa: E402
+from score_import import build_records, default_column_map, iter_chunks  # noqa: E402
+from search_index import SearchIndex  # noqa: E402
+from synthetic import make_logs  # noqa: E402
+
+LOG_ROWS = 20_000
+SIZES = [1_000, 10_000, 50_000]
+
+
+def _score_sheet(names, n_rows):
+    return pd.DataFrame({
+        "氏名": [names[i % len(names)] for i in range(n_rows)],
+        "英語": [str(60 + i % 50) for i in range(n_rows)],
+        "数学": [str(i % 100) for i in range(n_rows)],
+        "現代文": "35", "古文": "18", "漢文": "20", "理科①": "41", "理科②": "38",
+    }).to_csv(index=False).encode("cp932")
+
+
+def _measure(fn):
+    # tracemalloc は処理を大きく遅くするので、時間とメモリは別々に測る
+    start = time.perf_counter()
+    records, errors = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, len(records), len(errors)
+
+
+def main():
+    logs = make_logs(LOG_ROWS)
+    index = SearchIndex.build(logs, fields=["生徒氏名"])
+
+    def find_student(name):
+        keys = index.lookup(name)
+        if not keys:
+            return None
+        row = logs.loc[max(keys)]
+        return {col: row[col] for col in ("生徒氏名", "学年", "文理", "志望科類", "担当メンター")}
+
+    column_map = default_column_map(EXAM_NIJI)
+    names = logs["生徒氏名"].unique().tolist()
+    print(f"{'rows':>7} | {'mode':<7} | {'ms':>8} | {'peak MB':>8} | {'records':>7} | {'errors':>6}")
+    print("-" * 56)
+    for n in SIZES:
+        data = _score_sheet(names, n)
+        modes = {
+            "chunked": lambda: build_records(iter_chunks(io.BytesIO(data), "s.csv"), column_map, EXAM_NIJI, find_student),
+            "whole": lambda: build_records(
+                [pd.read_csv(io.BytesIO(data), dtype=str, encoding="cp932", keep_default_na=False)],
+                column_map, EXAM_NIJI, find_student,
+            ),
+        }
+        for label, fn in modes.items():
+            elapsed, peak, n_records, n_errors = _measure(fn)
+            print(f"{n:>7} | {label:<7} | {elapsed * 1000:>8.1f} | {peak / 1e6:>8.1f} | {n_records:>7} | {n_errors:>6}")
+
+
+if __name__ == "__main__":
+    main()
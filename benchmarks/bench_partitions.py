@@ -0,0 +1,90 @@
+"""1 枚の logs シートと年度ごとのパーティションの比較
+
+実行: python benchmarks/bench_partitions.py
+
+直近 3 年分に広げた合成ログを、1 枚のシート (GSheetsBackend) と tools/partition_logs.py cutover で
+年度ごとに分けたシート (PartitionedSheetsBackend) に置き、次の 3 つを比べる。
+
+- full:  全件の読み込み (パーティションは並行に読む)
+- delta: 他の端末が CHANGED_ROWS 件を追記した後の差分同期 (閉じた年度は読まない)
+- query: 直近 90 日の絞り込み (日付の最大値がそれより前の閉じた年度は読まない)
+
+fake_sheets.FakeBook に API 1 回あたりの往復時間と 1 セルあたりの転送時間を待たせ、実際の経過時間を測る。
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools"))
+
+from fake_sheets import FakeBook  # noqa: E402
+from partition_logs import cutover  # noqa: E402
+from storage import UPDATED_AT, GSheetsBackend, PartitionedSheetsBackend, stamp_rows  # noqa: E402
+from synthetic import make_logs  # noqa: E402
+
+ROUND_TRIP_SEC = 0.25     # API 1 回あたりの往復
+SEC_PER_CELL = 20e-6      # 1 セルあたりの転送コスト
+SIZES = [10_000, 100_000]
+CHANGED_ROWS = 5
+YEARS = 3
+
+
+def _spread_logs(n_rows):
+    """日付を直近 YEARS 年に均等に広げ、更新日時をその日の 10 時 (UTC) にしたログ"""
+    df = make_logs(n_rows)
+    end = pd.Timestamp.now().normalize() - pd.Timedelta(days=1)
+    dates = pd.date_range(end - pd.DateOffset(years=YEARS), end, periods=n_rows).normalize()
+    df["日付"] = dates.strftime("%Y-%m-%d")
+    df[UPDATED_AT] = (dates + pd.Timedelta(hours=10)).strftime("%Y%m%dT%H%M%S.000Z")
+    return df
+
+
+def _timed(book, fn):
+    book.calls = book.cells = 0
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start, book.calls, book.cells
+
+
+def _measure(n_rows):
+    df = _spread_logs(n_rows)
+    since = (pd.Timestamp.now() - pd.Timedelta(minutes=5)).strftime("%Y%m%dT%H%M%S.000Z")
+    date_from = (pd.Timestamp.now() - pd.Timedelta(days=90)).strftime("%Y-%m-%d")
+
+    single_book = FakeBook(df.copy())
+    parted_book = FakeBook(df.copy())
+    cutover(parted_book, "year")
+    backends = {
+        "single": (single_book, GSheetsBackend(single_book)),
+        "partitioned": (parted_book, PartitionedSheetsBackend(parted_book, scheme="year")),
+    }
+
+    results = {}
+    for label, (book, backend) in backends.items():
+        backend.read_all()  # 閉じた年度の指紋を覚えさせる (アプリの初回読み込みに相当)
+        backend.append(stamp_rows(make_logs(CHANGED_ROWS, seed=1)))
+        book.latency, book.sec_per_cell = ROUND_TRIP_SEC, SEC_PER_CELL
+        results[label] = {
+            "full": _timed(book, backend.read_all),
+            "delta": _timed(book, lambda: backend.read_changes(since)),
+            "query": _timed(book, lambda: backend.query(date_from=date_from)),
+        }
+    return results
+
+
+def main():
+    print(f"{'rows':>8} | {'op':<5} | {'layout':<11} | {'s':>7} | {'calls':>5} | {'cells':>9}")
+    print("-" * 60)
+    for n in SIZES:
+        results = _measure(n)
+        for op in ("full", "delta", "query"):
+            for label, ops in results.items():
+                seconds, calls, cells = ops[op]
+                print(f"{n:>8} | {op:<5} | {label:<11} | {seconds:>7.3f} | {calls:>5} | {cells:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""データJSON の保存形式 (版 1 / 版 2) の比較
+
+実行: python benchmarks/bench_payload.py
+
+合成ログ (旧形式 = 版 1) を records.upgrade_logs で版 2 にしたものと比べ、次を表示する。
+
+- json MB:   データJSON 列の UTF-8 のバイト数の合計
+- row MB:    全列を合わせた 1 行あたりのバイト数 × 行数 (シートから読むときの転送量の目安)
+- decode ms: decode_logs() の時間 (mixed は前半が版 1、後半が版 2 の移行途中のログ)
+
+最後に、アクションの多い行で zlib + base64 に詰めたときの大きさを比べる。
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+import records  # noqa: E402
+from records import decode_logs, encode_payload, upgrade_logs  # noqa: E402
+from synthetic import make_logs  # noqa: E402
+
+SIZES = [10_000, 100_000]
+
+
+def _bytes(series):
+    return int(series.fillna("").astype(str).str.encode("utf-8").str.len().sum())
+
+
+def _best(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print(f"{'rows':>7} | {'format':<6} | {'json MB':>8} | {'row MB':>7} | {'decode ms':>9}")
+    print("-" * 50)
+    for n in SIZES:
+        v1 = make_logs(n)
+        start = time.perf_counter()
+        v2, upgraded = upgrade_logs(v1)
+        upgrade_sec = time.perf_counter() - start
+        mixed = pd.concat([v1.iloc[: n // 2], v2.iloc[n // 2:]])
+        for label, df in (("v1", v1), ("v2", v2), ("mixed", mixed)):
+            json_mb = _bytes(df["データJSON"]) / 1e6
+            row_mb = sum(_bytes(df[c]) for c in df.columns) / 1e6
+            decode_ms = _best(lambda: decode_logs(df)) * 1000
+            print(f"{n:>7} | {label:<6} | {json_mb:>8.2f} | {row_mb:>7.2f} | {decode_ms:>9.1f}")
+        saved = 1 - _bytes(v2["データJSON"]) / _bytes(v1["データJSON"])
+        print(f"{n:>7} | upgrade_logs {upgraded} 行: {upgrade_sec * 1000:.0f} ms / データJSON {saved:.0%} 削減")
+
+    actions = [
+        {"subject": "英語", "priority": "高", "policy": "毎日少しずつ", "specificTask": f"鉄壁 Section {i}-{i + 4}",
+         "deadline": "次回まで"}
+        for i in range(1, 41, 2)
+    ]
+    packed = encode_payload({}, None, actions)
+    records.PACK_MIN_CHARS = float("inf")
+    plain = encode_payload({}, None, actions)
+    print(f"アクション {len(actions)} 件の行: 圧縮あり {len(packed.encode('utf-8'))} bytes"
+          f" / 圧縮なし {len(plain.encode('utf-8'))} bytes")
+
+
+if __name__ == "__main__":
+    main()
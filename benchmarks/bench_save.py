@@ -0,0 +1,58 @@
+"""保存処理のベンチマーク: 全体書き戻し (旧方式) と追記のみ (append_logs) の比較
+
+実行: python benchmarks/bench_save.py
+
+Google Sheets には接続せず、シートをメモリ上の DataFrame で模したうえで
+「API 呼び出し 1 回あたりの往復時間 + 転送セル数に比例する時間」で通信時間を見積もる。
+表示するのはローカル処理の実測値と、転送セル数・見積もり時間。
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_sheets import FakeBook  # noqa: E402
+from storage import append_logs, normalize_logs  # noqa: E402
+from synthetic import make_logs  # noqa: E402
+
+ROUND_TRIP_SEC = 0.25     # API 1 回あたりの往復
+SEC_PER_CELL = 20e-6      # 1 セルあたりの転送コスト
+SIZES = [1_000, 5_000, 10_000, 20_000, 50_000]
+SAVES_PER_SIZE = 5
+
+
+def _legacy_save(conn, new_row_df):
+    """変更前の save_data と同じ手順: 全体を読み、先頭に足して全体を書き戻す"""
+    current_df = normalize_logs(conn.read(worksheet="logs", ttl=0))
+    updated_df = pd.concat([new_row_df, current_df], ignore_index=True)
+    conn.update(worksheet="logs", data=updated_df)
+
+
+def _measure(save_fn, n_rows):
+    base = make_logs(n_rows + 1)
+    conn = FakeBook(base.iloc[:n_rows].reset_index(drop=True))
+    new_row = base.iloc[n_rows:]
+    start = time.perf_counter()
+    for _ in range(SAVES_PER_SIZE):
+        save_fn(conn, new_row)
+    local = (time.perf_counter() - start) / SAVES_PER_SIZE
+    calls = conn.calls / SAVES_PER_SIZE
+    cells = conn.cells / SAVES_PER_SIZE
+    modeled = local + calls * ROUND_TRIP_SEC + cells * SEC_PER_CELL
+    return local, cells, modeled
+
+
+def main():
+    print(f"{'rows':>8} | {'mode':<8} | {'local ms':>9} | {'cells/save':>10} | {'est. s/save':>11}")
+    print("-" * 60)
+    for n in SIZES:
+        for label, fn in (("rewrite", _legacy_save), ("append", append_logs)):
+            local, cells, modeled = _measure(fn, n)
+            print(f"{n:>8} | {label:<8} | {local * 1000:>9.2f} | {cells:>10.0f} | {modeled:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
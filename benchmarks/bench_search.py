@@ -0,0 +1,42 @@
+"""生徒検索のベンチマーク: pandas の str.contains 全件走査と SearchIndex の比較
+
+実行: python benchmarks/bench_search.py [行数 ...]   (既定: 1000 10000 100000)
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import SearchIndex  # noqa: E402
+from synthetic import make_logs  # noqa: E402
+
+REPEAT = 50
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        result = fn()
+    return (time.perf_counter() - start) / REPEAT * 1000, result
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    print(f"{'rows':>7} | {'query':<10} | {'hits':>6} | {'contains ms':>11} | {'index ms':>8} | {'build ms':>8}")
+    print("-" * 66)
+    for n in sizes:
+        df = make_logs(n)
+        start = time.perf_counter()
+        index = SearchIndex.build(df)
+        build_ms = (time.perf_counter() - start) * 1000
+        full_name = df["生徒氏名"].iloc[n // 2]
+        for query in (full_name, full_name[:2], full_name[2:4]):
+            scan_ms, scan = _timed(lambda: df[df["生徒氏名"].str.contains(query, na=False)])
+            index_ms, keys = _timed(lambda: index.search(query, fields=["生徒氏名"]))
+            assert set(keys) == set(scan.index)
+            print(f"{n:>7} | {query:<10} | {len(keys):>6} | {scan_ms:>11.3f} | {index_ms:>8.3f} | {build_ms:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
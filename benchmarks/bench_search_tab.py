@@ -0,0 +1,85 @@
+"""過去ログ検索タブの再実行時間と送信量の計測
+
+実行: python benchmarks/bench_search_tab.py [行数 ...]   (既定: 1000 10000 100000)
+
+合成ログを一時的な SQLite に入れ、Streamlit の AppTest でアプリを実行する。
+初回 (スナップショット・派生データの作成を含む) と 2 回目以降の再実行時間、
+検索語を入れたときの再実行時間 (初回はインデックス作成を含む)、ブラウザに送る要素 (proto) の合計バイト数を表示する。
+ページ分割後は、2 回目以降の時間と送信量がログ全体の行数にほぼ依存しないことを確かめる。
+"""
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from storage import create_backend  # noqa: E402
+from synthetic import make_logs  # noqa: E402
+
+REPEAT = 5
+SEARCH_TAB = "🔍 過去ログ検索"
+
+
+def payload_bytes(node):
+    """AppTest の要素ツリーをたどり、各要素の proto のサイズを合計する"""
+    total = 0
+    proto = getattr(node, "proto", None)
+    if proto is not None:
+        total += proto.ByteSize()
+    for child in getattr(node, "children", {}).values():
+        total += payload_bytes(child)
+    return total
+
+
+def run_search_tab(at):
+    """検索タブを開いた状態で再実行する (AppTest はタブの選択を送り返さないため毎回指定する)"""
+    at.session_state["main_tab"] = SEARCH_TAB
+    return at.run()
+
+
+def main():
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    sizes = [int(a) for a in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    print(f"{'rows':>7} | {'first s':>8} | {'rerun ms':>9} | {'search ms':>9} | {'search2 ms':>9} | {'payload KB':>10}")
+    print("-" * 68)
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "logs.db")
+            df = make_logs(n)
+            create_backend("sqlite", path=path).append(df)
+            os.environ["ALOHA_STORAGE_BACKEND"] = "sqlite"
+            os.environ["ALOHA_STORAGE_PATH"] = path
+
+            st.cache_resource.clear()  # 前の行数のスナップショットを持ち越さない
+            at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=600)
+            start = time.perf_counter()
+            run_search_tab(at)
+            first = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for _ in range(REPEAT):
+                run_search_tab(at)
+            rerun = (time.perf_counter() - start) / REPEAT * 1000
+            payload = payload_bytes(at._tree) / 1024
+
+            search_box = [t for t in at.text_input if t.label == "検索語"][0]
+            search_box.input(df["生徒氏名"].iloc[n // 2][:2])
+            start = time.perf_counter()
+            run_search_tab(at)
+            search = (time.perf_counter() - start) * 1000
+
+            search_box = [t for t in at.text_input if t.label == "検索語"][0]
+            search_box.input(df["生徒氏名"].iloc[n // 3])
+            start = time.perf_counter()
+            run_search_tab(at)
+            search2 = (time.perf_counter() - start) * 1000
+
+            print(f"{n:>7} | {first:>8.2f} | {rerun:>9.1f} | {search:>9.1f} | {search2:>9.1f} | {payload:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
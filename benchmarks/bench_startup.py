@@ -0,0 +1,125 @@
+"""新しいセッションの最初の描画までの時間と、同時セッションでの保存先の共有のベンチマーク
+
+実行: python benchmarks/bench_startup.py [--runs 5] [--sessions 8] [--app path/to/app.py]
+
+- first_render: 新しいプロセスで AppTest を作り、最初の実行 (新規面談タブ) が終わるまでの秒数。
+  streamlit_gsheets は本物を使い (秘密情報は無いので接続はできない)、実行後に import 済みかも表示する。
+  プロセスごとの import・接続のコストが含まれるよう、1 回ごとに別プロセスで測る。
+- sessions: fake_sheets.FakeBook (API 1 回 LATENCY 秒) につないだ状態で、--sessions 個のセッションが
+  同時に過去ログ検索タブを開いたときの経過時間と、保存先 (create_backend) を作った回数。
+
+--app で別の版の app.py (git worktree で取り出したものなど) を指定すると、同じ条件で比べられる。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LATENCY = 0.05
+TAB_NEW, TAB_SEARCH = "📝 新規面談・保存", "🔍 過去ログ検索"
+
+
+def _env(workdir):
+    os.environ.update({
+        "ALOHA_STORAGE_BACKEND": "gsheets",
+        "ALOHA_WRITE_QUEUE_PATH": os.path.join(workdir, "pending.jsonl"),
+    })
+
+
+def first_render(app):
+    """(最初の実行の秒数, streamlit_gsheets を import したか) を返す (別プロセスで呼ぶ)"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(app)))
+    from streamlit.testing.v1 import AppTest
+
+    with tempfile.TemporaryDirectory() as workdir:
+        _env(workdir)
+        at = AppTest.from_file(app, default_timeout=120)
+        at.session_state["main_tab"] = TAB_NEW
+        start = time.perf_counter()
+        at.run()
+        elapsed = time.perf_counter() - start
+    return {"seconds": elapsed, "gsheets_imported": "streamlit_gsheets" in sys.modules}
+
+
+def sessions(app, n_sessions):
+    """n_sessions 個のセッションが同時に検索タブを開いたときの秒数と保存先を作った回数 (別プロセスで呼ぶ)"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(app)))
+    sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+    import storage
+    from streamlit.testing.v1 import AppTest
+
+    from fake_sheets import FakeBook, install
+    from synthetic import make_logs
+
+    created = []
+    create_backend = storage.create_backend
+
+    def counting_create_backend(*args, **kwargs):
+        created.append(1)
+        return create_backend(*args, **kwargs)
+
+    storage.create_backend = counting_create_backend
+    book = FakeBook(make_logs(2_000), latency=LATENCY)
+    install(book)
+    with tempfile.TemporaryDirectory() as workdir:
+        _env(workdir)
+        apps = [AppTest.from_file(app, default_timeout=120) for _ in range(n_sessions)]
+
+        def open_search(at):
+            at.session_state["main_tab"] = TAB_SEARCH
+            at.run()
+
+        threads = [threading.Thread(target=open_search, args=(at,)) for at in apps]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        errors = [at.exception[0].message for at in apps if at.exception]
+    return {"seconds": elapsed, "backends_created": len(created), "api_calls": book.calls, "errors": errors}
+
+
+def _child(args, *extra):
+    cmd = [sys.executable, os.path.abspath(__file__), "--app", args.app, *extra]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.exit(f"計測に失敗しました:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--app", default=os.path.join(ROOT, "app.py"))
+    parser.add_argument("--measure", choices=["first_render", "sessions"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure == "first_render":
+        print(json.dumps(first_render(args.app)))
+        return
+    if args.measure == "sessions":
+        print(json.dumps(sessions(args.app, args.sessions)))
+        return
+
+    runs = [_child(args, "--measure", "first_render") for _ in range(args.runs)]
+    times = [r["seconds"] for r in runs]
+    print(f"first_render: 中央値 {statistics.median(times):.3f} 秒 (最小 {min(times):.3f} / 最大 {max(times):.3f})"
+          f" / streamlit_gsheets を import: {'はい' if runs[0]['gsheets_imported'] else 'いいえ'}")
+
+    result = _child(args, "--measure", "sessions", "--sessions", str(args.sessions))
+    print(f"sessions ({args.sessions} 同時): {result['seconds']:.3f} 秒 / 保存先を作った回数 {result['backends_created']}"
+          f" / API 呼び出し {result['api_calls']} 回")
+    for message in result["errors"]:
+        print(f"  エラー: {message}")
+
+
+if __name__ == "__main__":
+    main()
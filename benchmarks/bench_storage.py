@@ -0,0 +1,68 @@
+"""保存先エンジンごとの読み込み・保存・検索の比較
+
+実行: python benchmarks/bench_storage.py [行数 ...]   (既定: 1000 10000 100000)
+
+gsheets はメモリ上の代用品 (fake_sheets.FakeBook) で測るため通信時間は含まない。
+代わりに 1 回の操作で転送するセル数を併記する。
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_sheets import FakeBook  # noqa: E402
+from storage import create_backend  # noqa: E402
+from synthetic import make_logs  # noqa: E402
+
+REPEAT = 5
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        fn()
+    return (time.perf_counter() - start) / REPEAT * 1000
+
+
+def _engines(df, workdir):
+    book = FakeBook(df.copy())
+    yield "gsheets", create_backend("gsheets", conn=book), book
+
+    sqlite = create_backend("sqlite", path=os.path.join(workdir, "logs.db"))
+    sqlite.append(df)
+    yield "sqlite", sqlite, None
+
+    parquet = create_backend("parquet", path=os.path.join(workdir, "parquet"))
+    parquet.append(df)
+    yield "parquet", parquet, None
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    print(f"{'rows':>7} | {'engine':<8} | {'read ms':>9} | {'save ms':>8} | {'student ms':>10} | {'mentor+date ms':>14} | {'cells/read':>10}")
+    print("-" * 86)
+    for n in sizes:
+        df = make_logs(n + REPEAT)
+        base, extra = df.iloc[:n], df.iloc[n:]
+        student = base["生徒氏名"].iloc[n // 2]
+        mentor = base["担当メンター"].iloc[0]
+        date_from = base["日付"].iloc[n // 2]
+        with tempfile.TemporaryDirectory() as workdir:
+            for name, engine, book in _engines(base, workdir):
+                read_ms = _timed(engine.read_all)
+                cells = "-"
+                if book is not None:
+                    book.cells = 0
+                    engine.read_all()
+                    cells = f"{book.cells}"
+                rows = iter(range(len(extra)))
+                save_ms = _timed(lambda: engine.append(extra.iloc[[next(rows)]]))
+                student_ms = _timed(lambda: engine.query(student=student))
+                mentor_ms = _timed(lambda: engine.query(mentor=mentor, date_from=date_from))
+                print(f"{n:>7} | {name:<8} | {read_ms:>9.2f} | {save_ms:>8.2f} | {student_ms:>10.2f} | {mentor_ms:>14.2f} | {cells:>10}")
+
+
+if __name__ == "__main__":
+    main()
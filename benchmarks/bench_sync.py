@@ -0,0 +1,61 @@
+"""ログの再取得のベンチマーク: 全件読み込み (read_all) と差分同期 (read_changes) の比較
+
+実行: python benchmarks/bench_sync.py
+
+メモリ上のシート (fake_sheets.FakeBook) に既存のログを置き、他の端末が CHANGED_ROWS 件を追記した状態で
+「全件を読み直す」と「更新日時 以降の行だけを読んでスナップショットに取り込み、チェックサムで確かめる」を比べる。
+bench_save.py と同じく、API 1 回あたりの往復時間と転送セル数から通信時間を見積もる。
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_sheets import FakeBook  # noqa: E402
+from storage import UPDATED_AT, GSheetsBackend, log_fingerprint, merge_changes, stamp_rows  # noqa: E402
+from synthetic import make_logs  # noqa: E402
+
+ROUND_TRIP_SEC = 0.25     # API 1 回あたりの往復
+SEC_PER_CELL = 20e-6      # 1 セルあたりの転送コスト
+SIZES = [1_000, 10_000, 50_000, 100_000]
+CHANGED_ROWS = 5
+
+
+def _measure(n_rows):
+    book = FakeBook(make_logs(n_rows))
+    backend = GSheetsBackend(book)
+    snapshot = backend.read_all()
+    watermark = snapshot[UPDATED_AT].max()
+    backend.append(stamp_rows(make_logs(CHANGED_ROWS, seed=1)))
+
+    results = {}
+    book.calls = book.cells = 0
+    start = time.perf_counter()
+    backend.read_all()
+    results["full"] = (time.perf_counter() - start, book.calls, book.cells)
+
+    book.calls = book.cells = 0
+    start = time.perf_counter()
+    changed, remote = backend.read_changes(watermark)
+    merged, added, _, _ = merge_changes(snapshot, changed)
+    merged = pd.concat([merged, added], ignore_index=True)
+    if log_fingerprint(merged)["checksum"] != remote["checksum"]:
+        raise RuntimeError("チェックサムが一致しません")
+    results["delta"] = (time.perf_counter() - start, book.calls, book.cells)
+    return results
+
+
+def main():
+    print(f"{'rows':>8} | {'mode':<6} | {'local ms':>9} | {'calls':>5} | {'cells':>9} | {'est. s':>7}")
+    print("-" * 58)
+    for n in SIZES:
+        for label, (local, calls, cells) in _measure(n).items():
+            modeled = local + calls * ROUND_TRIP_SEC + cells * SEC_PER_CELL
+            print(f"{n:>8} | {label:<6} | {local * 1000:>9.2f} | {calls:>5} | {cells:>9} | {modeled:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""書き込みキューの確認: 保存の応答時間と、保存先の障害時の再送
+
+実行: python benchmarks/bench_write_queue.py
+
+1. 保存先へ直接追記する場合と、WriteQueue に記録する場合の応答時間を比べる
+   (保存先は 1 回の API 呼び出しに LATENCY 秒かかる代用品)。
+2. 保存先が最初の FAILURES 回の呼び出しを失敗させる状態で保存を続け、
+   Flusher がバックオフしながら再送して全件が届くこと、途中でキューを開き直しても
+   (= アプリの再起動) 送信待ちが残っていることを確かめる。
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_sheets import FakeBook  # noqa: E402
+from storage import create_backend  # noqa: E402
+from synthetic import make_logs  # noqa: E402
+from write_queue import Flusher, WriteQueue  # noqa: E402
+
+LATENCY = 0.3
+SAVES = 20
+FAILURES = 6
+
+
+def ack_latency(workdir):
+    rows = make_logs(SAVES)
+    direct = create_backend("gsheets", conn=FakeBook(latency=LATENCY))
+    start = time.perf_counter()
+    for i in range(SAVES):
+        direct.append(rows.iloc[[i]])
+    direct_ms = (time.perf_counter() - start) / SAVES * 1000
+
+    queue = WriteQueue(os.path.join(workdir, "ack.jsonl"))
+    start = time.perf_counter()
+    for i in range(SAVES):
+        queue.enqueue(rows.iloc[[i]])
+    queued_ms = (time.perf_counter() - start) / SAVES * 1000
+    print(f"保存の応答時間: 直接追記 {direct_ms:.1f} ms / キュー {queued_ms:.2f} ms (1 件あたり)")
+
+
+def outage(workdir):
+    path = os.path.join(workdir, "outage.jsonl")
+    rows = make_logs(SAVES)
+    book = FakeBook(fail_next=FAILURES)
+    backend = create_backend("gsheets", conn=book)
+
+    queue = WriteQueue(path)
+    for i in range(SAVES // 2):
+        queue.enqueue(rows.iloc[[i]])
+    # 送信前に「再起動」しても送信待ちが残っている
+    queue = WriteQueue(path)
+    assert len(queue) == SAVES // 2, len(queue)
+
+    flusher = Flusher(queue, backend, base_delay=0.05, max_delay=0.5)
+    flusher.start()
+    for i in range(SAVES // 2, SAVES):
+        queue.enqueue(rows.iloc[[i]])
+        flusher.wake()
+
+    deadline = time.time() + 30
+    while len(queue) and time.time() < deadline:
+        time.sleep(0.05)
+    flusher.stop()
+
+    sent = len(book.sheets.get("logs", []))
+    print(f"障害時: 失敗 {book.failures} 回のあと {sent}/{SAVES} 行を送信, 送信待ち {len(queue)} 件")
+    assert sent == SAVES and len(queue) == 0
+    assert os.path.getsize(path) == 0
+
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        ack_latency(workdir)
+        outage(workdir)
+
+
+if __name__ == "__main__":
+    main()
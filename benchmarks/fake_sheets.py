@@ -0,0 +1,184 @@
+"""ベンチマーク用の Google Sheets 代用品
+
+conn.read / conn.update / conn.client._select_worksheet(...).append_rows・batch_get、
+conn.client._open_spreadsheet(...).worksheets・add_worksheet など、storage.py が使う範囲だけを
+メモリ上の DataFrame で再現し、API 呼び出し回数と転送セル数を数える。spreadsheet を指定すると
+別のスプレッドシート (アーカイブ先など) として扱う。latency で 1 回の呼び出しごとに、sec_per_cell で
+転送セル数に比例した待ち時間を入れ (並行に呼べば待ち時間も重なる)、fail_next で
+次の N 回の呼び出しを、fail_rate でその割合の呼び出しをわざと失敗させられる。
+
+install(book) は app.py が import する streamlit_gsheets.GSheetsConnection をこの book に
+つながる接続に差し替えるので、AppTest でアプリ全体を Google Sheets なしで動かせる。
+"""
+import random
+import re
+import sys
+import threading
+import time
+import types
+
+import pandas as pd
+
+
+class FakeAPIError(Exception):
+    """Sheets API のクォータ超過・通信断の代わり"""
+
+
+def _column_index(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - ord("A") + 1
+    return n - 1
+
+
+class _FakeWorksheet:
+    def __init__(self, book, name, spreadsheet=None):
+        self.book = book
+        self.name = self.title = name
+        self.sheets = book.workbook(spreadsheet)
+
+    def row_values(self, row):
+        df = self.sheets.get(self.name)
+        header = [] if df is None else list(df.columns)
+        self.book.charge(len(header))
+        return header if row == 1 else []
+
+    def append_rows(self, values, **kwargs):
+        self.book.charge(sum(len(v) for v in values))
+        df = self.sheets.get(self.name)
+        if df is None or len(df.columns) == 0:
+            header, values = values[0], values[1:]
+            df = pd.DataFrame(columns=header)
+        self.sheets[self.name] = pd.concat(
+            [df, pd.DataFrame(values, columns=df.columns)], ignore_index=True
+        )
+
+    def batch_get(self, ranges, **kwargs):
+        """A1 形式 ("J2:J", "A5:K9") の範囲を行のリストのリストで返す (末尾の空セル・空行は省く)"""
+        df = self.sheets.get(self.name, pd.DataFrame())
+        out = []
+        for a1 in ranges:
+            c1, r1, c2, r2 = re.fullmatch(r"([A-Z]+)(\d+):([A-Z]+)(\d*)", a1).groups()
+            block = df.iloc[int(r1) - 2:int(r2) - 1 if r2 else None, _column_index(c1):_column_index(c2) + 1]
+            rows = []
+            for row in block.astype(object).where(pd.notna(block), "").values.tolist():
+                while row and row[-1] == "":
+                    row.pop()
+                rows.append([str(v) for v in row])
+            while rows and not rows[-1]:
+                rows.pop()
+            out.append(rows)
+        self.book.charge(sum(len(row) for rows in out for row in rows))
+        return out
+
+    def resize(self, rows=None, cols=None):
+        self.book.charge(0)
+
+    def update_title(self, title):
+        self.book.charge(0)
+        self.sheets[title] = self.sheets.pop(self.name)
+        self.name = self.title = title
+
+
+class _FakeSpreadsheet:
+    def __init__(self, book, spreadsheet=None):
+        self.book = book
+        self.spreadsheet = spreadsheet
+        self.sheets = book.workbook(spreadsheet)
+
+    def worksheets(self):
+        self.book.charge(0)
+        return [_FakeWorksheet(self.book, name, self.spreadsheet) for name in self.sheets]
+
+    def worksheet(self, title):
+        self.book.charge(0)
+        if title not in self.sheets:
+            raise FakeAPIError(f"WorksheetNotFound: {title}")
+        return _FakeWorksheet(self.book, title, self.spreadsheet)
+
+    def add_worksheet(self, title, rows=1000, cols=26, **kwargs):
+        self.book.charge(0)
+        if title in self.sheets:
+            raise FakeAPIError(f"A sheet with the name \"{title}\" already exists")
+        self.sheets[title] = pd.DataFrame()
+        return _FakeWorksheet(self.book, title, self.spreadsheet)
+
+    def del_worksheet(self, worksheet):
+        self.book.charge(0)
+        del self.sheets[worksheet.title]
+
+
+class _FakeClient:
+    def __init__(self, book):
+        self.book = book
+
+    def _select_worksheet(self, spreadsheet=None, worksheet=None, **kwargs):
+        return _FakeWorksheet(self.book, worksheet, spreadsheet)
+
+    def _open_spreadsheet(self, spreadsheet=None, **kwargs):
+        return _FakeSpreadsheet(self.book, spreadsheet)
+
+
+class FakeBook:
+    """GSheetsConnection の代用品。sheets は既定のスプレッドシートのワークシート名 → DataFrame"""
+
+    def __init__(self, df=None, worksheet="logs", latency=0.0, fail_next=0, sec_per_cell=0.0, fail_rate=0.0, seed=0):
+        self.sheets = {} if df is None else {worksheet: df}
+        self.workbooks = {None: self.sheets}  # スプレッドシート名 → そのワークシート
+        self.cells = 0
+        self.calls = 0
+        self.failures = 0
+        self.latency = latency
+        self.sec_per_cell = sec_per_cell
+        self.fail_next = fail_next
+        self.fail_rate = fail_rate
+        self._rng = random.Random(seed)
+        self.client = _FakeClient(self)
+        self._lock = threading.Lock()  # 並行読み込みのベンチマーク用
+
+    def workbook(self, spreadsheet=None):
+        return self.workbooks.setdefault(spreadsheet, {})
+
+    def charge(self, cells):
+        if self.latency or self.sec_per_cell:
+            time.sleep(self.latency + cells * self.sec_per_cell)
+        with self._lock:
+            if self.fail_next > 0 or (self.fail_rate and self._rng.random() < self.fail_rate):
+                self.fail_next = max(0, self.fail_next - 1)
+                self.failures += 1
+                raise FakeAPIError("429: Quota exceeded (fake)")
+            self.calls += 1
+            self.cells += cells
+
+    def read(self, worksheet=None, ttl=None, spreadsheet=None, **kwargs):
+        df = self.workbook(spreadsheet).get(worksheet, pd.DataFrame())
+        self.charge(df.size)
+        return df.copy()
+
+    def update(self, worksheet=None, data=None, spreadsheet=None, **kwargs):
+        self.charge(data.size)
+        self.workbook(spreadsheet)[worksheet] = data.copy()
+
+
+def install(book):
+    """import streamlit_gsheets が book につながる GSheetsConnection を返すようにする (AppTest 用)"""
+    from streamlit.connections import BaseConnection
+
+    class GSheetsConnection(BaseConnection):
+        def _connect(self, **kwargs):
+            return book
+
+        @property
+        def client(self):
+            return book.client
+
+        def read(self, *args, **kwargs):
+            return book.read(*args, **kwargs)
+
+        def update(self, *args, **kwargs):
+            return book.update(*args, **kwargs)
+
+    module = types.ModuleType("streamlit_gsheets")
+    module.GSheetsConnection = GSheetsConnection
+    sys.modules["streamlit_gsheets"] = module
+    return module
@@ -0,0 +1,131 @@
+"""ベンチマーク用の合成面談ログ
+
+生徒ごとに文理・学年・志望科類・担当メンター・学力を固定し、面談ごとに模試 (二次 / 共通テスト) の
+点数とネクストアクションを作る。データJSON は既定では既存のシートと同じ旧形式 (版 1:
+{"mentor", "scores", "exam_type", "actions", "stream"}) で、scores のキーは
+SCORE_LABELS_NIJI / SCORE_LABELS_KYOTSU の科目コード、値は入力欄と同じ文字列 (未入力は "")。
+payload_version=2 にすると今の保存処理と同じ records.encode_payload の形式で作る。
+"""
+import json
+import random
+
+import numpy as np
+import pandas as pd
+
+from master_data import EXAM_KYOTSU, EXAM_NIJI, SCORE_MAX_BY_STREAM, SUBJECTS
+from records import encode_payload
+from storage import COLUMNS
+
+_FAMILY = [
+    "佐藤", "鈴木", "高橋", "田中", "伊藤", "渡辺", "山本", "中村", "小林", "加藤",
+    "吉田", "山田", "佐々木", "山口", "松本", "井上", "木村", "林", "斎藤", "清水",
+]
+_GIVEN = [
+    "太郎", "花子", "翔太", "美咲", "健", "さくら", "大輔", "ゆい", "蓮", "ひなた",
+    "悠真", "陽菜", "湊", "結衣", "大和", "葵", "颯太", "凛", "陸", "芽衣",
+]
+_TARGETS = {"理系": ["理科一類", "理科二類", "理科三類"], "文系": ["文科一類", "文科二類", "文科三類"]}
+_GRADES = ["高3"] * 6 + ["高2"] * 3 + ["既卒"]
+_EXAMS = {
+    EXAM_NIJI: ["第1回東大実戦", "第1回東大本番レベル模試", "第2回東大実戦", "東大入試オープン"],
+    EXAM_KYOTSU: ["第1回共通テスト模試", "第2回共通テスト模試", "共通テストプレ"],
+}
+_ISSUES = [
+    "記述の部分点", "数学の完答数が少ない", "英作文の時間配分", "古文単語の定着", "理科の計算ミス",
+    "世界史の論述の構成", "共通テストの時間不足", "リスニングの集中力", "漢文の句法", "過去問演習の不足",
+]
+_TASKS = [
+    "鉄壁 Section 1-5", "過去問 5 年分", "青チャート 例題 30 題", "古文単語 315 の 1 周", "重要問題集 A 問題",
+    "リスニング毎日 15 分", "論述の添削 2 本", "共通テスト予想問題 1 回分", "漢文句法の暗記", "英作文 10 題",
+]
+_POLICIES = ["", "", "完答できる大問を増やす", "毎日少しずつ", "解き直しを優先", "時間を計って解く"]
+_DEADLINES = ["次回まで", "1週間後", "2週間後", "今月中", "3日後", "夏休み中"]
+
+# 日付はこの日で終わるよう並べる (更新日時 が将来にならないようにする)
+END_DATE = pd.Timestamp("2026-03-31")
+ROWS_PER_DAY = 20
+
+
+def make_students(n_students=800, n_mentors=12, seed=0):
+    """生徒の名簿 (氏名・文理・学年・志望科類・担当メンター・学力 0〜1) のリスト"""
+    rng = random.Random(seed)
+    students = []
+    for i in range(n_students):
+        stream = rng.choice(["理系", "文系"])
+        suffix = i // (len(_FAMILY) * len(_GIVEN))
+        students.append({
+            "name": f"{_FAMILY[i % len(_FAMILY)]}{_GIVEN[(i // len(_FAMILY)) % len(_GIVEN)]}{suffix or ''}",
+            "stream": stream,
+            "grade": rng.choice(_GRADES),
+            "target": rng.choice(_TARGETS[stream]),
+            "mentor": f"メンター{rng.randrange(n_mentors)}",
+            "ability": min(0.95, max(0.2, rng.gauss(0.6, 0.12))),
+        })
+    return students
+
+
+def make_scores(rng, exam_type, stream, ability):
+    """入力欄と同じ形の点数 (科目コード → 文字列)。ときどき未入力の科目が混じる"""
+    maxima = SCORE_MAX_BY_STREAM[exam_type][stream]
+    scores = {}
+    for code, full in maxima.items():
+        if rng.random() < 0.05:
+            scores[code] = ""
+        else:
+            scores[code] = str(round(full * min(1.0, max(0.0, rng.gauss(ability, 0.1)))))
+    return scores
+
+
+def make_actions(rng, stream):
+    """0〜4 件のネクストアクション"""
+    return [
+        {
+            "subject": rng.choice(SUBJECTS[stream]),
+            "priority": rng.choice(["高", "中", "低"]),
+            "policy": rng.choice(_POLICIES),
+            "specificTask": rng.choice(_TASKS),
+            "deadline": rng.choice(_DEADLINES),
+        }
+        for _ in range(rng.choice([0, 1, 1, 2, 2, 2, 3, 4]))
+    ]
+
+
+def make_logs(n_rows, n_students=800, n_mentors=12, seed=0, payload_version=1):
+    """古い順に並んだ n_rows 件のログを返す (1 日あたり ROWS_PER_DAY 件、END_DATE まで)"""
+    rng = random.Random(seed)
+    students = make_students(n_students, n_mentors, seed)
+    rows = []
+    for i in range(n_rows):
+        s = rng.choice(students)
+        exam_type = EXAM_NIJI if rng.random() < 0.6 else EXAM_KYOTSU
+        # 担当以外のメンターが面談することもある
+        mentor = s["mentor"] if rng.random() < 0.9 else f"メンター{rng.randrange(n_mentors)}"
+        data = {
+            "mentor": mentor,
+            "scores": make_scores(rng, exam_type, s["stream"], s["ability"]),
+            "exam_type": exam_type,
+            "actions": make_actions(rng, s["stream"]),
+            "stream": s["stream"],
+        }
+        rows.append({
+            "担当メンター": mentor,
+            "生徒氏名": s["name"],
+            "学年": s["grade"],
+            "文理": s["stream"],
+            "志望科類": s["target"],
+            "模試名": rng.choice(_EXAMS[exam_type]),
+            "課題": rng.choice(_ISSUES),
+            "データJSON": (
+                json.dumps(data, ensure_ascii=False) if payload_version == 1
+                else encode_payload(data["scores"], exam_type, data["actions"])
+            ),
+            "記録ID": f"r{seed:04x}{i:012x}",
+        })
+    df = pd.DataFrame(rows)
+    pos = np.arange(n_rows)
+    days = END_DATE - pd.to_timedelta((n_rows - 1) // ROWS_PER_DAY - pos // ROWS_PER_DAY, unit="D")
+    df["日付"] = days.strftime("%Y-%m-%d")
+    # 面談当日の 10 時 (UTC) から 15 分おきに保存した扱い
+    saved = days + pd.Timedelta(hours=10) + pd.to_timedelta(15 * (pos % ROWS_PER_DAY), unit="min")
+    df["更新日時"] = saved.strftime("%Y%m%dT%H%M%S.000Z")
+    return df.reindex(columns=COLUMNS)
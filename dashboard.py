@@ -0,0 +1,156 @@
+"""ダッシュボード用の集計 (保存のたびに追加分だけ更新する)
+
+ログ全体から毎回集計し直さず、DashboardAggregates に次の集計表を持たせ、保存した行は add_rows() で足し込む。
+表示はこの集計表だけから作るので、時間はログの件数ではなくメンター数・生徒数・週数などで決まる。
+
+- weekly:    週 (月曜始まり) → {担当メンター: 面談数}
+- last_seen: 生徒氏名 → (最後の面談日, 担当メンター, 志望科類)
+- latest:    (生徒氏名, 模試種別) → (日付, 志望科類, 得点率のビン)。生徒ごとの最新の成績
+- cohort:    (志望科類, 模試種別) → 得点率のビンごとの人数 (latest を数えたもの)
+- actions:   教科 → {優先度: アクション数}
+
+得点率は入力された科目の点数の合計 ÷ その科目の満点の合計 × 100。満点は記録の 文理 に合わせて
+master_data.SCORE_MAX_BY_STREAM から取る (文理が空欄の記録は文理の大きい方の SCORE_MAX)。
+"""
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from master_data import EXAM_NIJI, SCORE_MAX, SCORE_MAX_BY_STREAM
+from records import SCORE_CODES
+
+RATE_BIN = 5  # 得点率のビンの幅 (%)
+N_BINS = 100 // RATE_BIN
+BIN_LABELS = [f"{i * RATE_BIN}-{(i + 1) * RATE_BIN}%" for i in range(N_BINS)]
+# 担当メンター・志望科類・教科が空欄の記録は、表やグラフの列名が空にならないようこの名前で数える
+BLANK = "(未入力)"
+
+
+def _labels(series):
+    values = series.fillna("").astype(str).str.strip()
+    return values.where(values != "", BLANK)
+
+
+def _score_max(exam_type, stream):
+    by_stream = SCORE_MAX_BY_STREAM.get(exam_type, SCORE_MAX_BY_STREAM[EXAM_NIJI])
+    return by_stream.get(stream) or SCORE_MAX.get(exam_type, SCORE_MAX[EXAM_NIJI])
+
+
+def score_rates(scores, streams):
+    """decode_logs() の scores 表と 行キー → 文理 の Series から、行キー → 得点率 (%) の Series。
+    点数の無い行は含めない"""
+    rates = []
+    streams = streams.reindex(scores.index).fillna("").astype(str).str.strip()
+    for (exam_type, stream), group in scores.groupby([scores["exam_type"], streams], sort=False):
+        maxima = pd.Series(_score_max(exam_type, stream), dtype="float64").reindex(SCORE_CODES)
+        values = group[SCORE_CODES]
+        entered = values.notna() & maxima.notna().to_numpy()
+        full = entered.to_numpy() @ maxima.fillna(0).to_numpy()
+        got = values.where(entered).sum(axis=1, min_count=1)
+        rate = got / np.where(full > 0, full, np.nan) * 100
+        rates.append(rate.dropna())
+    if not rates:
+        return pd.Series(dtype="float64")
+    return pd.concat(rates).clip(0, 100)
+
+
+class DashboardAggregates:
+    """ダッシュボードの集計表。build() でログ全体から作り、保存した行は add_rows() で足す"""
+
+    def __init__(self):
+        self.weekly = defaultdict(Counter)
+        self.last_seen = {}
+        self.latest = {}
+        self.cohort = defaultdict(lambda: np.zeros(N_BINS, dtype=np.int64))
+        self.actions = defaultdict(Counter)
+        self.rows = 0
+
+    @classmethod
+    def build(cls, df, decoded):
+        return cls().add_rows(df, decoded)
+
+    def add_rows(self, df, decoded):
+        """ログの行 (df) と、その行の decode_logs() の結果を集計に足し込む"""
+        if df.empty:
+            return self
+        self.rows += len(df)
+        dates = pd.to_datetime(df["日付"], errors="coerce").dt.normalize()
+        mentors = _labels(df["担当メンター"])
+        targets = _labels(df["志望科類"])
+
+        # 週ごとの面談数
+        weeks = dates - pd.to_timedelta(dates.dt.weekday, unit="D")
+        for (week, mentor), n in pd.Series(1, index=df.index).groupby([weeks, mentors]).sum().items():
+            self.weekly[week][mentor] += int(n)
+
+        # 生徒ごとの最後の面談 (日付順に並べた各生徒の最後の行)
+        meta = pd.DataFrame({"日付": dates, "生徒氏名": df["生徒氏名"].astype(str), "担当メンター": mentors, "志望科類": targets})
+        last = meta.dropna(subset=["日付"]).sort_values("日付", kind="mergesort").drop_duplicates("生徒氏名", keep="last")
+        for name, date, mentor, target in zip(last["生徒氏名"], last["日付"], last["担当メンター"], last["志望科類"]):
+            current = self.last_seen.get(name)
+            if current is None or date >= current[0]:
+                self.last_seen[name] = (date, mentor, target)
+
+        # 生徒・模試種別ごとの最新の得点率 (前の成績のビンを引いてから足す)
+        scores = decoded["scores"]
+        rates = score_rates(scores, df["文理"])
+        if len(rates):
+            t = meta.loc[rates.index].assign(exam_type=scores.loc[rates.index, "exam_type"], rate=rates)
+            t = t.dropna(subset=["日付"]).sort_values("日付", kind="mergesort")
+            t = t.drop_duplicates(["生徒氏名", "exam_type"], keep="last")
+            bins = np.minimum((t["rate"].to_numpy() // RATE_BIN).astype(int), N_BINS - 1)
+            for name, exam_type, date, target, b in zip(t["生徒氏名"], t["exam_type"], t["日付"], t["志望科類"], bins):
+                key = (name, exam_type)
+                current = self.latest.get(key)
+                if current is not None:
+                    if date < current[0]:
+                        continue
+                    self.cohort[(current[1], exam_type)][current[2]] -= 1
+                self.latest[key] = (date, target, b)
+                self.cohort[(target, exam_type)][b] += 1
+
+        # 教科別のアクション数
+        actions = decoded["actions"]
+        if not actions.empty:
+            counts = actions.groupby([_labels(actions["subject"]), _labels(actions["priority"])]).size()
+            for (subject, priority), n in counts.items():
+                self.actions[subject][priority] += int(n)
+        return self
+
+    # --- 表示用の表 ---
+    def weekly_table(self, n_weeks=12, today=None):
+        """直近 n_weeks 週の 週 × 担当メンター の面談数"""
+        today = pd.Timestamp(today or pd.Timestamp.now()).normalize()
+        this_week = today - pd.Timedelta(days=today.weekday())
+        weeks = [this_week - pd.Timedelta(weeks=i) for i in range(n_weeks - 1, -1, -1)]
+        table = pd.DataFrame([self.weekly.get(w, {}) for w in weeks], index=[w.date() for w in weeks])
+        table.index.name = "週"
+        return table.fillna(0).astype(int).reindex(sorted(table.columns), axis=1)
+
+    def not_seen(self, days=30, today=None):
+        """最後の面談から days 日以上経った生徒 (古い順)"""
+        today = pd.Timestamp(today or pd.Timestamp.now()).normalize()
+        rows = [
+            {"生徒氏名": name, "最後の面談日": date.date(), "経過日数": (today - date).days,
+             "担当メンター": mentor, "志望科類": target}
+            for name, (date, mentor, target) in self.last_seen.items()
+            if (today - date).days >= days
+        ]
+        table = pd.DataFrame(rows, columns=["生徒氏名", "最後の面談日", "経過日数", "担当メンター", "志望科類"])
+        return table.sort_values(["経過日数", "生徒氏名"], ascending=[False, True]).reset_index(drop=True)
+
+    def cohort_table(self, exam_type):
+        """得点率のビン × 志望科類 の人数 (各生徒の最新の成績)"""
+        columns = {target: counts for (target, et), counts in self.cohort.items() if et == exam_type and counts.any()}
+        table = pd.DataFrame(columns, index=BIN_LABELS, dtype="int64")
+        table.index.name = "得点率"
+        return table.reindex(sorted(table.columns), axis=1)
+
+    def action_table(self):
+        """教科 × 優先度 のアクション数"""
+        table = pd.DataFrame.from_dict(self.actions, orient="index").fillna(0).astype(int)
+        order = [p for p in ("高", "中", "低") if p in table.columns]
+        table = table.reindex(columns=order + sorted(set(table.columns) - set(order)))
+        table.index.name = "教科"
+        return table.sort_index()
@@ -0,0 +1,70 @@
+"""マスタデータ（定数）: 教科・模試の科目コード"""
+
+SUBJECTS = {
+    '理系': ['英語', '数学(理系)', '現代文', '古文', '漢文', '物理', '化学', '生物'],
+    '文系': ['英語', '数学(文系)', '現代文', '古文', '漢文', '世界史', '日本史', '地理']
+}
+
+# 表示用のラベル変換マップ（二次試験用）
+SCORE_LABELS_NIJI = {
+    'eng': '英語', 'math': '数学',
+    'jp_mod': '現代文', 'jp_anc': '古文', 'jp_chi': '漢文',
+    'sci1': '理科①', 'sci2': '理科②',
+    'soc1': '社会①', 'soc2': '社会②'
+}
+
+# 表示用のラベル変換マップ（共通テスト用）
+SCORE_LABELS_KYOTSU = {
+    'eng_r': '英語R', 'eng_l': '英語L',
+    'math_1': '数IA', 'math_2': '数IIBC',
+    'jp_mod': '現代文', 'jp_anc': '古文', 'jp_chi': '漢文',
+    'info': '情報',
+    # 文系用
+    'k_soc1': '社会①', 'k_soc2': '社会②',
+    'k_sci_base1': '理科基礎①', 'k_sci_base2': '理科基礎②',
+    # 理系用
+    'k_soc_r': '社会', 
+    'k_sci1': '理科①', 'k_sci2': '理科②'
+}
+
+EXAM_NIJI = "東大二次(本番レベル)"
+EXAM_KYOTSU = "共通テスト"
+
+# 模試種別 → 科目コードの表示ラベル
+SCORE_LABELS = {EXAM_NIJI: SCORE_LABELS_NIJI, EXAM_KYOTSU: SCORE_LABELS_KYOTSU}
+
+# 科目コードの満点（取り込み時の検証用）。文理で配点が違う科目は大きい方
+SCORE_MAX_NIJI = {
+    'eng': 120, 'math': 120,
+    'jp_mod': 60, 'jp_anc': 30, 'jp_chi': 30,
+    'sci1': 60, 'sci2': 60,
+    'soc1': 60, 'soc2': 60
+}
+
+SCORE_MAX_KYOTSU = {
+    'eng_r': 100, 'eng_l': 100,
+    'math_1': 100, 'math_2': 100,
+    'jp_mod': 110, 'jp_anc': 45, 'jp_chi': 45,
+    'info': 100,
+    'k_soc1': 100, 'k_soc2': 100,
+    'k_sci_base1': 50, 'k_sci_base2': 50,
+    'k_soc_r': 100,
+    'k_sci1': 100, 'k_sci2': 100
+}
+
+SCORE_MAX = {EXAM_NIJI: SCORE_MAX_NIJI, EXAM_KYOTSU: SCORE_MAX_KYOTSU}
+
+# 文理ごとの満点 (得点率の計算用)。模試種別 → 文理 → 科目コード → 満点。
+# SCORE_MAX は文理の大きい方なので、理系の国語・文系の数学などはこちらで割る
+SCORE_MAX_BY_STREAM = {
+    EXAM_NIJI: {
+        '理系': {'eng': 120, 'math': 120, 'jp_mod': 40, 'jp_anc': 20, 'jp_chi': 20, 'sci1': 60, 'sci2': 60},
+        '文系': {'eng': 120, 'math': 80, 'jp_mod': 60, 'jp_anc': 30, 'jp_chi': 30, 'soc1': 60, 'soc2': 60},
+    },
+    EXAM_KYOTSU: {
+        '理系': {'eng_r': 100, 'eng_l': 100, 'math_1': 100, 'math_2': 100, 'jp_mod': 110, 'jp_anc': 45, 'jp_chi': 45,
+                 'info': 100, 'k_soc_r': 100, 'k_sci1': 100, 'k_sci2': 100},
+        '文系': {'eng_r': 100, 'eng_l': 100, 'math_1': 100, 'math_2': 100, 'jp_mod': 110, 'jp_anc': 45, 'jp_chi': 45,
+                 'info': 100, 'k_soc1': 100, 'k_soc2': 100, 'k_sci_base1': 50, 'k_sci_base2': 50},
+    },
+}
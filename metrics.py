@@ -0,0 +1,124 @@
+"""処理時間の計測 (診断用)
+
+load_data・save_data・検索・JSON の解析・レポート生成などの所要時間と転送量 (frame_bytes) を、
+名前ごとに直近 WINDOW 件だけ保持して p50/p95/p99 を出す。計測値はプロセス内で共有する。
+
+無効時 (既定) は timer() が何もしないコンテキストを返し、record() もすぐに戻るので、
+呼び出し側に計測コードを残したままでもほぼコストはかからない。
+有効にするとイベントごとに JSON 1 行を logger "aloha.metrics" (DEBUG) にも出す。
+"""
+import contextlib
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+WINDOW = 1000
+
+logger = logging.getLogger("aloha.metrics")
+
+_enabled = False
+_lock = threading.Lock()
+_series = {}  # 名前 → {"seconds": deque, "bytes": deque, "count": int, "bytes_total": int}
+_NOOP = contextlib.nullcontext()
+
+
+def configure(enabled):
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def is_enabled():
+    return _enabled
+
+
+def record(name, seconds, nbytes=None):
+    if not _enabled:
+        return
+    with _lock:
+        s = _series.get(name)
+        if s is None:
+            s = _series[name] = {
+                "seconds": deque(maxlen=WINDOW), "bytes": deque(maxlen=WINDOW), "count": 0, "bytes_total": 0,
+            }
+        s["seconds"].append(seconds)
+        s["count"] += 1
+        if nbytes is not None:
+            s["bytes"].append(nbytes)
+            s["bytes_total"] += nbytes
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(json.dumps({"metric": name, "ms": round(seconds * 1000, 3), "bytes": nbytes, "ts": time.time()}))
+
+
+class _Timer:
+    __slots__ = ("name", "nbytes", "start")
+
+    def __init__(self, name):
+        self.name = name
+        self.nbytes = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start, self.nbytes)
+        return False
+
+
+def timer(name):
+    """with timer("load_data") as t: ...  (転送量は t.nbytes に入れる)。無効時は何もしない"""
+    return _Timer(name) if _enabled else _NOOP
+
+
+def frame_bytes(*frames):
+    """DataFrame のセルを文字列にしたときの UTF-8 のバイト数の合計 (保存先とやり取りした量の目安)。
+
+    メモリ上の大きさではなく、シートから読んだ・書いたセルの中身の量を数える。計測が無効なら計算しない。
+    """
+    if not _enabled:
+        return None
+    total = 0
+    for df in frames:
+        if df is None or df.empty:
+            continue
+        values = df.astype(object).where(df.notna(), "")
+        total += sum(len("".join(map(str, values[col])).encode("utf-8")) for col in values.columns)
+    return total
+
+
+def last(name):
+    """name の直近の計測値 (秒)。まだ無ければ None"""
+    with _lock:
+        s = _series.get(name)
+        return s["seconds"][-1] if s and s["seconds"] else None
+
+
+def summary():
+    """名前ごとの集計 (ミリ秒) を返す"""
+    with _lock:
+        items = [(name, list(s["seconds"]), list(s["bytes"]), s["count"], s["bytes_total"]) for name, s in _series.items()]
+    rows = []
+    for name, seconds, nbytes, count, bytes_total in sorted(items):
+        ms = np.asarray(seconds) * 1000
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        rows.append({
+            "name": name, "count": count,
+            "p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3),
+            "max_ms": round(float(ms.max()), 3),
+            "avg_bytes": int(np.mean(nbytes)) if nbytes else None, "bytes_total": bytes_total,
+        })
+    return rows
+
+
+def export_json(extra=None):
+    return json.dumps({"generated_at": time.time(), "window": WINDOW, "metrics": summary(), **(extra or {})},
+                      ensure_ascii=False, indent=2)
+
+
+def reset():
+    with _lock:
+        _series.clear()
@@ -0,0 +1,252 @@
+"""データJSON の読み書き (正規化)
+
+各行の データJSON を一度だけ解析して、集計しやすい表に展開する。
+
+- scores:  ログの行キーを index とし、exam_type 列と科目コードごとの数値列 (float, 未入力は NaN)
+- actions: ネクストアクションの縦持ち表。index はログの行キー、seq は行内の順番
+- errors:  解析できなかった行 (JSON の破損・数値でない点数など) の一覧
+
+表示側は json.loads を呼ばず、row_scores() / row_actions() でこれらの表から取り出す。
+
+保存形式は 2 通りあり、decode_payload() がどちらも同じ dict にして返す。
+
+- 版 1 (旧形式): {"mentor", "scores", "exam_type", "actions", "stream"}。scores は全科目の入力欄の文字列
+  (未入力は "")、mentor / stream は 担当メンター / 文理 の列と重複する
+- 版 2 (encode_payload): {"v": 2, "t", "s", "a"}。s は入力のある科目だけの数値、t は共通テストのときだけ
+  "k"、a はアクションを ACTION_FIELDS の順のリスト (末尾の空欄は省く) にしたもの。a が PACK_MIN_CHARS
+  文字を超え、zlib + base64 の方が短くなるときは "az" に詰めて持つ
+
+旧形式の行は書き換えず、保存先が行を書き直すとき (閉じたパーティションや Parquet のまとめ直し) に
+upgrade_logs() で版 2 にする。
+"""
+import base64
+import binascii
+import json
+import re
+import unicodedata
+import zlib
+
+import pandas as pd
+
+from master_data import EXAM_KYOTSU, EXAM_NIJI, SCORE_LABELS_KYOTSU, SCORE_LABELS_NIJI
+
+# 科目コード (二次 → 共通テストの順、重複は 1 列にまとめる)
+SCORE_CODES = list(dict.fromkeys([*SCORE_LABELS_NIJI, *SCORE_LABELS_KYOTSU]))
+ACTION_FIELDS = ["subject", "priority", "policy", "specificTask", "deadline"]
+
+_SCORE_PATTERN = re.compile(r"^(-?\d+(?:\.\d+)?)\s*点?$")
+
+PAYLOAD_VERSION = 2
+# アクションの JSON がこの文字数を超えたら圧縮を試す
+PACK_MIN_CHARS = 512
+_EXAM_CODES = {EXAM_KYOTSU: "k"}
+_EXAM_TYPES = {code: exam for exam, code in _EXAM_CODES.items()}
+# 版 1 の データJSON で列と重複していたキー (版 2 では持たない)
+_LEGACY_KEYS = ("mentor", "scores", "exam_type", "actions", "stream")
+
+
+def parse_score(value):
+    """点数の文字列を数値にする。空欄は None、数値として読めなければ ValueError"""
+    if value is None or value != value:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = unicodedata.normalize("NFKC", str(value)).strip()
+    if not text:
+        return None
+    m = _SCORE_PATTERN.match(text)
+    if not m:
+        raise ValueError(f"点数を数値として読めません: {value!r}")
+    return float(m.group(1))
+
+
+# ==========================================
+# 保存形式
+# ==========================================
+def _compact_score(value):
+    """入力欄の点数を保存用の値にする。空欄は None、読めない値は (エラーとして残すため) 文字列のまま"""
+    try:
+        parsed = parse_score(value)
+    except ValueError:
+        return str(value)
+    if parsed is None:
+        return None
+    return int(parsed) if parsed.is_integer() else parsed
+
+
+def _pack(obj):
+    return base64.b64encode(zlib.compress(json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 9)).decode("ascii")
+
+
+def _unpack(text):
+    try:
+        return json.loads(zlib.decompress(base64.b64decode(text)).decode("utf-8"))
+    except (binascii.Error, zlib.error, UnicodeDecodeError) as e:
+        raise ValueError(f"圧縮されたアクションを展開できません: {e}") from e
+
+
+def encode_payload(scores, exam_type, actions, **extra):
+    """データJSON を版 2 の形式で作る。extra (取り込み元 source など) はそのまま持つ"""
+    payload = {"v": PAYLOAD_VERSION}
+    if exam_type in _EXAM_CODES:
+        payload["t"] = _EXAM_CODES[exam_type]
+    compact = {code: _compact_score(value) for code, value in (scores or {}).items()}
+    payload["s"] = {code: value for code, value in compact.items() if value is not None}
+    rows = []
+    for act in actions or []:
+        row = [str(act.get(f, "") or "") for f in ACTION_FIELDS]
+        while row and row[-1] == "":
+            row.pop()
+        rows.append(row)
+    if rows:
+        text = json.dumps(rows, ensure_ascii=False, separators=(",", ":"))
+        packed = _pack(rows) if len(text) > PACK_MIN_CHARS else None
+        if packed is not None and len(packed) < len(text.encode("utf-8")):
+            payload["az"] = packed
+        else:
+            payload["a"] = rows
+    payload.update(extra)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+def decode_payload(raw):
+    """データJSON (版 1 / 版 2) を {"exam_type", "scores", "actions", ...} の dict にする。
+
+    actions は ACTION_FIELDS をキーに持つ dict のリスト。解析できなければ ValueError。
+    """
+    detail = json.loads(raw)
+    if not isinstance(detail, dict):
+        raise ValueError("JSON の最上位がオブジェクトではありません")
+    if "v" not in detail:
+        return detail
+    if detail["v"] != PAYLOAD_VERSION:
+        raise ValueError(f"未対応の データJSON の版です: {detail['v']}")
+    rows = _unpack(detail.pop("az")) if "az" in detail else detail.pop("a", [])
+    actions = [
+        dict(zip(ACTION_FIELDS, [*row, *[""] * (len(ACTION_FIELDS) - len(row))])) if isinstance(row, list) else row
+        for row in rows
+    ]
+    exam_code = detail.pop("t", None)
+    scores = detail.pop("s", {})
+    del detail["v"]
+    return {"exam_type": _EXAM_TYPES.get(exam_code, EXAM_NIJI), "scores": scores, "actions": actions, **detail}
+
+
+def upgrade_payload(raw):
+    """旧形式の データJSON を版 2 にした文字列を返す。版 2 の行・空欄・解析できない行は None"""
+    if raw is None or raw != raw or not str(raw).strip() or str(raw).startswith('{"v":'):
+        return None
+    try:
+        detail = decode_payload(raw)
+    except ValueError:
+        return None
+    if "v" in detail or not all(isinstance(act, dict) for act in detail.get("actions") or []):
+        return None
+    extra = {k: v for k, v in detail.items() if k not in _LEGACY_KEYS}
+    return encode_payload(detail.get("scores"), detail.get("exam_type", EXAM_NIJI), detail.get("actions"), **extra)
+
+
+def upgrade_logs(df):
+    """ログの データJSON を版 2 にした写しと、書き換えた行数を返す (保存先が行を書き直すときに使う)"""
+    upgraded = df["データJSON"].map(upgrade_payload)
+    changed = upgraded.notna()
+    if not changed.any():
+        return df, 0
+    df = df.copy()
+    df.loc[changed, "データJSON"] = upgraded[changed]
+    return df, int(changed.sum())
+
+
+def _empty_tables():
+    scores = pd.DataFrame(columns=["exam_type", *SCORE_CODES])
+    scores = scores.astype({c: "float64" for c in SCORE_CODES})
+    actions = pd.DataFrame(columns=["seq", *ACTION_FIELDS])
+    errors = pd.DataFrame(columns=["日付", "生徒氏名", "error"])
+    return scores, actions, errors
+
+
+def decode_logs(df):
+    """ログ全体 (または追加分) の データJSON を解析して 3 つの表を返す"""
+    score_rows, score_keys = [], []
+    action_rows, action_keys = [], []
+    error_rows, error_keys = [], []
+
+    def report(key, row_date, student, message):
+        error_keys.append(key)
+        error_rows.append({"日付": row_date, "生徒氏名": student, "error": message})
+
+    for key, raw, row_date, student in zip(df.index, df["データJSON"], df["日付"], df["生徒氏名"]):
+        if raw is None or raw != raw or str(raw).strip() == "":
+            continue  # 詳細データなし (エラーではない)
+        try:
+            detail = decode_payload(raw)
+        except ValueError as e:
+            report(key, row_date, student, f"データJSON を解析できません: {e}")
+            continue
+
+        scores = {"exam_type": detail.get("exam_type", EXAM_NIJI)}
+        for code, value in (detail.get("scores") or {}).items():
+            try:
+                parsed = parse_score(value)
+            except ValueError as e:
+                report(key, row_date, student, f"{code}: {e}")
+                continue
+            if parsed is not None:
+                scores[code] = parsed
+        score_keys.append(key)
+        score_rows.append(scores)
+
+        for seq, act in enumerate(detail.get("actions") or []):
+            if not isinstance(act, dict):
+                report(key, row_date, student, f"アクション {seq + 1} の形式が正しくありません")
+                continue
+            action_keys.append(key)
+            action_rows.append({"seq": seq, **{f: act.get(f, "") for f in ACTION_FIELDS}})
+
+    scores_df, actions_df, errors_df = _empty_tables()
+    if score_rows:
+        scores_df = pd.DataFrame(score_rows, index=score_keys).reindex(columns=scores_df.columns)
+        scores_df[SCORE_CODES] = scores_df[SCORE_CODES].astype("float64")
+    if action_rows:
+        actions_df = pd.DataFrame(action_rows, index=action_keys, columns=actions_df.columns)
+    if error_rows:
+        errors_df = pd.DataFrame(error_rows, index=error_keys, columns=errors_df.columns)
+    return {"scores": scores_df, "actions": actions_df, "errors": errors_df}
+
+
+def extend_decoded(decoded, new_rows, added=None):
+    """追加された行の解析結果を既存の表につなげる。
+
+    added は new_rows の decode_logs() の結果 (他の派生データと共有するため呼び出し側で一度だけ作る)。
+    省略したときはここで new_rows を解析する。
+    """
+    if added is None:
+        added = decode_logs(new_rows)
+    return {
+        name: table if added[name].empty else pd.concat([table, added[name]])
+        for name, table in decoded.items()
+    }
+
+
+def row_scores(decoded, key):
+    """(exam_type, {科目コード: 点数}) を返す。詳細データのない行は (None, {})"""
+    scores = decoded["scores"]
+    if key not in scores.index:
+        return None, {}
+    row = scores.loc[key]
+    return row["exam_type"], {code: row[code] for code in SCORE_CODES if pd.notna(row[code])}
+
+
+def row_actions(decoded, key):
+    """行のアクションを保存時と同じ dict のリストで返す"""
+    actions = decoded["actions"]
+    if key not in actions.index:
+        return []
+    return actions.loc[[key]].sort_values("seq")[ACTION_FIELDS].to_dict("records")
+
+
+def row_errors(decoded, key):
+    errors = decoded["errors"]
+    if key not in errors.index:
+        return []
+    return errors.loc[[key], "error"].tolist()
@@ -0,0 +1,130 @@
+"""面談シート (レポート) の生成
+
+単票のレポートも一括出力も render_report() の同じテンプレートで作る。
+一括出力は 1 件ずつ生成して ZIP に書き足していくので、件数が多くても途中経過を表示できる。
+"""
+import io
+import re
+import zipfile
+
+import pandas as pd
+
+from records import decode_logs, row_actions
+
+REPORT_FORMATS = {"text": "txt", "markdown": "md"}
+
+
+def report_data_from_row(row, actions):
+    """ログの 1 行とそのアクションから、render_report() に渡す dict を作る"""
+    return {
+        "date": row.get('日付'),
+        "mentor": row.get('担当メンター'),
+        "student": row.get('生徒氏名'),
+        "grade": row.get('学年'),
+        "stream": row.get('文理'),
+        "target": row.get('志望科類'),
+        "issue": row.get('課題'),
+        "actions": actions,
+    }
+
+
+def render_report(data, fmt="text"):
+    """面談シートを文字列で返す。fmt は "text" (コピー用) か "markdown" """
+    lines = []
+    if fmt == "markdown":
+        lines.append(f"# 東大志望者面談シート: {data['student']}")
+        lines.append("")
+        lines.append(f"- 日付: {data['date']} / 担当: {data['mentor']}")
+        lines.append(f"- 生徒: {data['student']} ({data['grade']})")
+        lines.append(f"- 文理: {data['stream']} / 志望: {data['target']}")
+        lines.append(f"- 課題: {data['issue']}")
+        lines.append("")
+        lines.append("## ネクストアクション")
+        for idx, act in enumerate(data['actions']):
+            p_text = act.get('policy', '')
+            p_str = f"方針: {p_text} / " if p_text else ""
+            lines.append(f"{idx+1}. **【{act['subject']}】 {act['specificTask']}**  ")
+            lines.append(f"   {p_str}優先度: {act.get('priority', '-')} / 期限: {act['deadline']}")
+        return "\n".join(lines) + "\n"
+
+    lines.append("【東大志望者面談シート】")
+    lines.append(f"日付: {data['date']} / 担当: {data['mentor']}")
+    lines.append(f"生徒: {data['student']} ({data['grade']})")
+    lines.append(f"文理: {data['stream']} / 志望: {data['target']}")
+    lines.append(f"課題: {data['issue']}")
+    lines.append("")
+    lines.append("■ ネクストアクション")
+    for idx, act in enumerate(data['actions']):
+        p_text = act.get('policy', '')
+        p_str = f"方針: {p_text} / " if p_text else ""
+        lines.append(f"{idx+1}. 【{act['subject']}】 {act['specificTask']}")
+        lines.append(f"   ({p_str}期限: {act['deadline']})")
+    return "\n".join(lines) + "\n"
+
+
+def latest_per_student(df):
+    """生徒ごとに最新の記録だけを残す (df は古い順)"""
+    return df.drop_duplicates("生徒氏名", keep="last")
+
+
+def _safe_name(text):
+    return re.sub(r'[\\/:*?"<>|\s]+', "_", str(text)).strip("_") or "noname"
+
+
+def _summary_row(data):
+    actions = " / ".join(
+        f"【{a['subject']}】{a['specificTask']} (期限: {a['deadline']})" for a in data['actions']
+    )
+    return {
+        "日付": data['date'], "担当メンター": data['mentor'], "生徒氏名": data['student'],
+        "学年": data['grade'], "文理": data['stream'], "志望科類": data['target'],
+        "課題": data['issue'], "ネクストアクション": actions,
+    }
+
+
+def iter_report_archive(rows_df, formats=("text", "markdown"), excel=True, decoded=None):
+    """rows_df の各行のレポートを ZIP に書き足しながら進捗を返すジェネレータ。
+
+    decoded は rows_df と同じ行キーの decode_logs() の結果 (アプリでは load_derived("decoded") の表)。
+    省略したときだけ rows_df の データJSON をここで解析する。
+
+    (完了件数, 全件数) を 1 件ごとに yield し、最後に ZIP のバイト列を return する
+    (呼び出し側は StopIteration.value で受け取るか、build_report_archive() を使う)。
+    一覧表は CSV (Excel で開けるよう BOM 付き) と、openpyxl があれば xlsx も入れる。
+    """
+    if decoded is None:
+        decoded = decode_logs(rows_df)
+    buf = io.BytesIO()
+    summary = []
+    total = len(rows_df)
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for done, (key, row) in enumerate(rows_df.iterrows(), start=1):
+            data = report_data_from_row(row, row_actions(decoded, key))
+            stem = f"{_safe_name(data['date'])}_{_safe_name(data['student'])}_{done:04d}"
+            for fmt in formats:
+                zf.writestr(f"{fmt}/{stem}.{REPORT_FORMATS[fmt]}", render_report(data, fmt))
+            summary.append(_summary_row(data))
+            yield done, total
+
+        summary_df = pd.DataFrame(summary)
+        zf.writestr("summary.csv", summary_df.to_csv(index=False).encode("utf-8-sig"))
+        if excel:
+            try:
+                xlsx = io.BytesIO()
+                summary_df.to_excel(xlsx, index=False, sheet_name="面談シート")
+                zf.writestr("summary.xlsx", xlsx.getvalue())
+            except ImportError:
+                pass
+    return buf.getvalue()
+
+
+def build_report_archive(rows_df, formats=("text", "markdown"), excel=True, progress=None, decoded=None):
+    """iter_report_archive() を最後まで回して ZIP を返す。progress(done, total) で進捗を受け取れる"""
+    gen = iter_report_archive(rows_df, formats, excel, decoded=decoded)
+    while True:
+        try:
+            done, total = next(gen)
+        except StopIteration as stop:
+            return stop.value
+        if progress is not None:
+            progress(done, total)
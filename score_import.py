@@ -0,0 +1,211 @@
+"""模試の成績表 (CSV / Excel) の一括取り込み
+
+予備校から届く成績表 (1 行 1 生徒) を CHUNK_ROWS 行ずつ読み、列の対応表 (列名 → 取り込み先) で
+氏名・点数を取り出す。ファイル全体はメモリに載せない。
+
+- 生徒は検索インデックスの氏名 (正規化済み) で既存のログと突き合わせ、文理・学年・志望科類・
+  担当メンターはその生徒の最新の記録から引き継ぐ。突き合わせは呼び出し側が渡す find_student で行う。
+- 点数は records.parse_score で読み、master_data.SCORE_MAX の満点を超えないか確かめる。
+- 取り込める行は面談ログと同じ列の DataFrame にまとめて返すので、呼び出し側が 1 回の save_data() で保存する。
+"""
+import csv
+import datetime
+import os
+import unicodedata
+
+import pandas as pd
+
+from master_data import EXAM_NIJI, SCORE_LABELS, SCORE_MAX
+from records import encode_payload, parse_score
+
+CHUNK_ROWS = 2_000
+
+# 点数以外の取り込み先
+FIELD_NAME = "name"
+FIELD_DATE = "date"
+FIELD_EXAM = "exam"
+FIELD_LABELS = {FIELD_NAME: "生徒氏名", FIELD_DATE: "日付", FIELD_EXAM: "模試名"}
+_FIELD_ALIASES = {
+    "氏名": FIELD_NAME, "生徒氏名": FIELD_NAME, "名前": FIELD_NAME, "生徒名": FIELD_NAME,
+    "日付": FIELD_DATE, "実施日": FIELD_DATE, "受験日": FIELD_DATE,
+    "模試名": FIELD_EXAM, "模試": FIELD_EXAM,
+}
+
+
+def normalize_header(text):
+    """列名の表記ゆれ (全角・半角、空白) を吸収する"""
+    return "".join(unicodedata.normalize("NFKC", str(text)).split())
+
+
+def default_column_map(exam_type, overrides=None):
+    """列名 → 取り込み先 (科目コード または name / date / exam) の既定の対応表。
+
+    科目は SCORE_LABELS の表示名 (英語・数IA など) と科目コードそのものを列名として受け付ける。
+    overrides (設定値 score_import_columns) の対応で上書きする。
+    """
+    mapping = {normalize_header(k): v for k, v in _FIELD_ALIASES.items()}
+    for code, label in SCORE_LABELS[exam_type].items():
+        mapping[normalize_header(label)] = code
+        mapping[normalize_header(code)] = code
+    for header, target in (overrides or {}).items():
+        mapping[normalize_header(header)] = target
+    return mapping
+
+
+def map_columns(headers, column_map):
+    """ファイルの列名 → 取り込み先 (対応が無い列は含めない)"""
+    return {h: column_map[normalize_header(h)] for h in headers if normalize_header(h) in column_map}
+
+
+# ==========================================
+# ファイルの読み込み (チャンクごと)
+# ==========================================
+def _detect_encoding(head):
+    """先頭のバイト列から UTF-8 (BOM 付きを含む) か Shift_JIS (cp932) かを決める"""
+    try:
+        head.decode("utf-8")
+        return "utf-8-sig"
+    except UnicodeDecodeError as e:
+        # 途中で切れた末尾の 1 文字だけが読めないなら UTF-8
+        return "utf-8-sig" if e.start >= len(head) - 3 else "cp932"
+
+
+def _cell_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def iter_chunks(file, filename, chunk_rows=CHUNK_ROWS):
+    """成績表を chunk_rows 行ずつの DataFrame (すべて文字列、空欄は "") で返すジェネレーター。
+
+    file はバイナリのファイルオブジェクト (st.file_uploader の戻り値など)。
+    CSV は pandas の chunksize で、Excel (.xlsx) は openpyxl の read_only モードで 1 行ずつ読む。
+    各チャンクの index はファイル上の行番号 (ヘッダーが 1 行目)。
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext in (".xlsx", ".xlsm"):
+        yield from _iter_excel(file, chunk_rows)
+        return
+    head = file.read(64 * 1024)
+    file.seek(0)
+    encoding = _detect_encoding(head)
+    try:
+        sep = csv.Sniffer().sniff(head.decode(encoding, errors="ignore")[:8192], delimiters=",\t;").delimiter
+    except csv.Error:
+        sep = ","
+    start = 2
+    with pd.read_csv(file, sep=sep, dtype=str, encoding=encoding, keep_default_na=False, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            chunk.index = range(start, start + len(chunk))
+            start += len(chunk)
+            yield chunk.apply(lambda col: col.str.strip())
+
+
+def _iter_excel(file, chunk_rows):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = [_cell_text(v) for v in next(rows, ())]
+        buffer, start = [], 2
+        for row in rows:
+            values = [_cell_text(v) for v in row[:len(header)]]
+            buffer.append(values + [""] * (len(header) - len(values)))
+            if len(buffer) >= chunk_rows:
+                yield pd.DataFrame(buffer, columns=header, index=range(start, start + len(buffer)))
+                start += len(buffer)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=header, index=range(start, start + len(buffer)))
+    finally:
+        wb.close()
+
+
+def read_headers(file, filename):
+    """列名の一覧 (対応表の編集用)。読み終えたら file を先頭に戻す"""
+    chunk = next(iter_chunks(file, filename, chunk_rows=1), None)
+    file.seek(0)
+    return [] if chunk is None else list(chunk.columns)
+
+
+# ==========================================
+# 検証と変換
+# ==========================================
+def build_records(chunks, column_map, exam_type, find_student, exam_name="", date=None):
+    """成績表のチャンクを検証し、(取り込む行, エラー一覧) の DataFrame を返す。
+
+    column_map はファイルの列名 → 取り込み先。find_student(氏名) は既存のログでのその生徒の最新の記録
+    (生徒氏名・学年・文理・志望科類・担当メンター の dict) か、見つからなければ None を返す関数。
+    日付・模試名の列が無い (空欄の) 行は date / exam_name を使う。
+    """
+    maxima = SCORE_MAX.get(exam_type, SCORE_MAX[EXAM_NIJI])
+    default_date = (date or datetime.date.today()).strftime("%Y-%m-%d")
+    profiles = {}  # 氏名 → find_student の結果 (同じ生徒が何度も出ても 1 回だけ引く)
+    dates = {}     # 日付の表記 → YYYY-MM-DD (読めなければ None)
+    records, errors = [], []
+
+    for chunk in chunks:
+        fields = map_columns(chunk.columns, column_map)
+        by_field = {target: col for col, target in fields.items()}
+        if FIELD_NAME not in by_field:
+            raise ValueError("生徒氏名の列が見つかりません。列の対応表で氏名の列を指定してください")
+        score_cols = {col: code for col, code in fields.items() if code in maxima}
+
+        for line, row in zip(chunk.index, chunk.to_dict("records")):
+            name = row[by_field[FIELD_NAME]]
+            if not name:
+                if any(row[c] for c in score_cols):
+                    errors.append({"行": line, "生徒氏名": "", "エラー": "氏名が空欄です"})
+                continue
+            if name not in profiles:
+                profiles[name] = find_student(name)
+            profile = profiles[name]
+            if profile is None:
+                errors.append({"行": line, "生徒氏名": name, "エラー": "既存の記録に無い生徒です"})
+                continue
+
+            scores, problems = {}, []
+            for col, code in score_cols.items():
+                try:
+                    value = parse_score(row[col])
+                except ValueError as e:
+                    problems.append(f"{col}: {e}")
+                    continue
+                if value is None:
+                    continue
+                if not 0 <= value <= maxima[code]:
+                    problems.append(f"{col}: {value:g} 点は 0〜{maxima[code]} 点の範囲外です")
+                    continue
+                scores[code] = f"{value:g}"
+            if not problems and not scores:
+                problems.append("点数がありません")
+            if problems:
+                errors.append({"行": line, "生徒氏名": name, "エラー": " / ".join(problems)})
+                continue
+
+            row_date = row.get(by_field.get(FIELD_DATE), "") or default_date
+            if row_date not in dates:
+                parsed = pd.to_datetime(row_date, errors="coerce")
+                dates[row_date] = None if pd.isna(parsed) else parsed.strftime("%Y-%m-%d")
+            if dates[row_date] is None:
+                errors.append({"行": line, "生徒氏名": name, "エラー": f"日付を読めません: {row_date}"})
+                continue
+            records.append({
+                "日付": dates[row_date],
+                "担当メンター": profile["担当メンター"],
+                "生徒氏名": profile["生徒氏名"],
+                "学年": profile["学年"],
+                "文理": profile["文理"],
+                "志望科類": profile["志望科類"],
+                "模試名": row.get(by_field.get(FIELD_EXAM), "") or exam_name,
+                "課題": "",
+                "データJSON": encode_payload(scores, exam_type, [], source="import"),
+            })
+
+    return pd.DataFrame(records), pd.DataFrame(errors, columns=["行", "生徒氏名", "エラー"])
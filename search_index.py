@@ -0,0 +1,130 @@
+"""面談ログの検索インデックス (文字 n-gram)
+
+生徒名・メンター名などを正規化して 2-gram (1 文字の検索語は 1-gram) の転置インデックスを作り、
+候補を絞ってから部分一致を確かめる。行を保存するたびに add_rows() で追加できる。
+
+正規化: NFKC (全角英数・半角カナの統一) → カタカナをひらがなに → 小文字化 → 空白除去。
+漢字と読みの対応は取らないため「さとう」で「佐藤」は引けない。
+"""
+import threading
+import unicodedata
+from collections import defaultdict
+
+# 検索対象の列と、ランキング時の重み
+SEARCH_FIELDS = {
+    "生徒氏名": 4.0,
+    "担当メンター": 2.0,
+    "志望科類": 1.5,
+    "模試名": 1.5,
+    "課題": 1.0,
+}
+
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(ord("ァ"), ord("ヶ") + 1)}
+
+
+def normalize_text(text):
+    if text is None:
+        return ""
+    text = unicodedata.normalize("NFKC", str(text))
+    text = text.translate(_KATAKANA_TO_HIRAGANA).lower()
+    return "".join(text.split())
+
+
+def _grams(text, n):
+    if len(text) < n:
+        return set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class SearchIndex:
+    """行キー (DataFrame の index) を返す n-gram インデックス。
+
+    同じ生徒名・メンター名は何度も現れるため、n-gram は列ごとの「異なる値」に対して張り、
+    値 → 行キーの対応を別に持つ。
+    """
+
+    def __init__(self, fields=None):
+        self.fields = list(fields or SEARCH_FIELDS)
+        self._rows = {f: defaultdict(list) for f in self.fields}  # 列 → {正規化済みの値: [行キー]}
+        self._uni = {f: defaultdict(set) for f in self.fields}    # 列 → {1文字: {値}}
+        self._bi = {f: defaultdict(set) for f in self.fields}     # 列 → {2文字: {値}}
+        self._n_rows = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, df, fields=None):
+        index = cls(fields)
+        index.add_rows(df)
+        return index
+
+    def __len__(self):
+        return self._n_rows
+
+    def add_rows(self, df):
+        """df の各行をインデックスに加える (行キーは df.index)"""
+        with self._lock:
+            self._n_rows += len(df)
+            for field in self.fields:
+                if field not in df.columns:
+                    continue
+                rows, uni, bi = self._rows[field], self._uni[field], self._bi[field]
+                normalized = {}
+                for key, value in zip(df.index, df[field]):
+                    if value is None or value != value:  # NaN
+                        continue
+                    norm = normalized.get(value)
+                    if norm is None:
+                        norm = normalized[value] = normalize_text(value)
+                    if not norm:
+                        continue
+                    if norm not in rows:
+                        for g in set(norm):
+                            uni[g].add(norm)
+                        for g in _grams(norm, 2):
+                            bi[g].add(norm)
+                    rows[norm].append(key)
+
+    def lookup(self, value, field="生徒氏名"):
+        """正規化した値が完全に一致する行キーを古い順に返す (成績表の取り込みでの生徒の突き合わせ用)"""
+        with self._lock:
+            return list(self._rows[field].get(normalize_text(value), ())) if field in self._rows else []
+
+    def _matching_values(self, field, q):
+        postings = self._uni[field] if len(q) == 1 else self._bi[field]
+        grams = set(q) if len(q) == 1 else _grams(q, 2)
+        sets = [postings.get(g) for g in grams]
+        if not sets or any(s is None for s in sets):
+            return []
+        sets.sort(key=len)
+        result = set(sets[0])
+        for s in sets[1:]:
+            result &= s
+            if not result:
+                break
+        return [v for v in result if q in v]
+
+    def search(self, query, fields=None, limit=None):
+        """一致した行キーをスコアの高い順 (同点は新しい行 = キーの大きい順) で返す。
+
+        完全一致 > 前方一致 > 部分一致 の順に点を付け、列ごとの重みを掛けて合計する。
+        """
+        q = normalize_text(query)
+        if not q:
+            return []
+        scores = defaultdict(float)
+        with self._lock:
+            for field in fields or self.fields:
+                if field not in self._rows:
+                    continue
+                weight = SEARCH_FIELDS.get(field, 1.0)
+                for value in self._matching_values(field, q):
+                    if value == q:
+                        score = 3 * weight
+                    elif value.startswith(q):
+                        score = 2 * weight
+                    else:
+                        score = weight
+                    for key in self._rows[field][value]:
+                        scores[key] += score
+        ranked = sorted(scores, key=lambda k: (scores[k], k), reverse=True)
+        return ranked[:limit] if limit else ranked
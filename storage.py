@@ -0,0 +1,826 @@
+"""面談ログの保存先とのやり取り
+
+app.py の UI から切り離しておき、ベンチマークやツールからも同じ処理を使えるようにする。
+保存先は LogBackend を実装したエンジンで差し替えられる。
+
+- gsheets: Google Sheets の logs シート (既定)。log_partition を指定すると年度・月ごとのワークシートに分ける
+- sqlite:  生徒・メンター・日付にインデックスを張ったローカル DB
+- parquet: 追記ごとに部品ファイルを足していく列指向のローカル保存
+
+アプリの検索・レポートは read_all() / read_changes() で持つ全件のスナップショットと、そこから作る
+検索インデックス・解析済みの表を使う (部分一致の検索や行キーでの参照があるため)。query() は
+生徒 (完全一致・前方一致)・メンター・日付で必要な行だけを読むためのもので、ローカルエンジンでは
+インデックス (sqlite) や行グループの読み飛ばし (parquet) が効く。ツールやベンチマークから使う。
+
+ネクストアクションの完了状態はログの行を書き換えずに済むよう、別の表 (read_action_status /
+append_action_status) に追記する。
+
+各行は 記録ID (保存時に振る一意の ID) と 更新日時 (保存先に書いた時刻) を持つ。
+read_changes() は 更新日時 が指定の時刻より新しい行だけを返し、手元の写しとの突き合わせには
+(記録ID, 更新日時) の組から作る log_fingerprint() を使う。
+"""
+import calendar
+import glob
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import metrics
+from records import upgrade_logs
+
+ROW_ID = "記録ID"
+UPDATED_AT = "更新日時"
+COLUMNS = ["日付", "担当メンター", "生徒氏名", "学年", "文理", "志望科類", "模試名", "課題", "データJSON", ROW_ID, UPDATED_AT]
+
+LOG_WORKSHEET = "logs"
+
+# ネクストアクションの完了状態 (action_tracker)。ログとは別に追記していき、同じアクションは最後の行を使う
+ACTION_STATUS_WORKSHEET = "action_status"
+ACTION_STATUS_COLUMNS = [ROW_ID, "番号", "状態", UPDATED_AT]
+
+# 全体を書き戻す経路 (ヘッダー不足時など) は同一プロセス内で直列化する
+_rewrite_lock = threading.Lock()
+
+
+def normalize_logs(df):
+    """列を揃え、古い順 (index 昇順) に並べ直す。
+
+    シートには追記順 (古い→新しい) で保存されるが、以前の保存処理は先頭に挿入していたため
+    古いシートでは逆順の行が混在する。日付で安定ソートして index を振り直すので、
+    表示側は index の降順で「新しい順」を得られる。
+    """
+    for col in COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+    if df.empty:
+        return df
+    dates = pd.to_datetime(df["日付"], errors="coerce")
+    order = dates.sort_values(kind="mergesort", na_position="first").index
+    return df.loc[order].reset_index(drop=True)
+
+
+def format_stamp(t):
+    """更新日時の表記 (UTC。例: 20261017T021548.123Z)。
+
+    シートに USER_ENTERED で書いても日付や数値に変換されず、文字列のまま大小を比べられる形にする。
+    """
+    return time.strftime("%Y%m%dT%H%M%S", time.gmtime(t)) + f".{int(t * 1000) % 1000:03d}Z"
+
+
+def parse_stamp(stamp):
+    """format_stamp() の逆 (UNIX 時刻)"""
+    return calendar.timegm(time.strptime(stamp[:15], "%Y%m%dT%H%M%S")) + int(stamp[16:19]) / 1000
+
+
+def fill_row_ids(rows_df):
+    """記録ID の無い行に ID を振った写しを返す (更新日時 はそのまま)"""
+    df = rows_df.copy()
+    if ROW_ID not in df.columns:
+        df[ROW_ID] = None
+    missing = df[ROW_ID].isna() | (df[ROW_ID].astype(str) == "")
+    df[ROW_ID] = df[ROW_ID].astype(object)
+    df.loc[missing, ROW_ID] = [f"r{uuid.uuid4().hex[:16]}" for _ in range(int(missing.sum()))]
+    return df
+
+
+def stamp_rows(rows_df):
+    """記録ID の無い行に ID を振り、更新日時を今の時刻にした写しを返す"""
+    df = fill_row_ids(rows_df)
+    df[UPDATED_AT] = format_stamp(time.time())
+    return df
+
+
+def _as_text(df):
+    df = df.astype(object)
+    return df.where(pd.notna(df), "").astype(str)
+
+
+def log_fingerprint(df):
+    """(記録ID, 更新日時) の組から作る、行の並びによらないチェックサム。
+
+    保存先と手元の写しで行数とチェックサムが一致すれば、同じ行・同じ版を持っているとみなす。
+    """
+    if df.empty:
+        return {"rows": 0, "checksum": 0}
+    hashes = pd.util.hash_pandas_object(_as_text(df[[ROW_ID, UPDATED_AT]]), index=False)
+    return {"rows": len(df), "checksum": int(hashes.to_numpy().sum())}
+
+
+def merge_changes(df, changed):
+    """read_changes() で得た行を 記録ID で df に突き合わせる。
+
+    df 自体は書き換えない (共有のスナップショットを他のスレッドが読んでいるため)。df に既にある行を
+    差し替えた新しい表と、無い行 (added。呼び出し側で末尾に足す) を返す。
+    戻り値は (新しい表 (差し替えが無ければ df そのもの), added, 差し替えた行数, 更新日時以外の値が変わったか)。
+    """
+    changed = changed.reindex(columns=COLUMNS)
+    changed_ids = changed[ROW_ID]
+    hit = df[ROW_ID].isin(set(changed_ids[changed_ids.notna() & (changed_ids != "")]))
+    key_of = pd.Series(df.index[hit], index=df.loc[hit, ROW_ID].to_numpy())  # 記録ID → 行キー
+    key_of = key_of[~key_of.index.duplicated(keep="last")]
+    known = changed_ids.isin(key_of.index)
+    updates = changed[known]
+    if updates.empty:
+        return df, changed, 0, False
+
+    keys = key_of.loc[updates[ROW_ID]].to_numpy()
+    content = [c for c in COLUMNS if c != UPDATED_AT]
+    before = _as_text(df.loc[keys, content]).to_numpy()
+    after = _as_text(updates[content]).to_numpy()
+    merged = df.copy()
+    merged.loc[keys, COLUMNS] = updates[COLUMNS].to_numpy()
+    return merged, changed[~known], len(updates), bool((before != after).any())
+
+
+def _to_sheet_values(rows_df, header):
+    """DataFrame をシートのヘッダー順の 2 次元リストに変換する"""
+    values = rows_df.reindex(columns=header).astype(object)
+    values = values.where(pd.notna(values), "")
+    return values.values.tolist()
+
+
+def append_logs(conn, new_rows_df, worksheet=LOG_WORKSHEET):
+    """新しい行だけをシート末尾に追記する。
+
+    Sheets API の values.append はサーバー側で末尾に挿入するため、
+    複数のメンターが同時に保存しても互いの行を上書きしない。
+    シートのヘッダーに足りない列がある場合のみ、全体を読み直して書き戻す。
+    """
+    ws = conn.client._select_worksheet(worksheet=worksheet)
+    header = ws.row_values(1)
+
+    if not header:
+        ws.append_rows(
+            [COLUMNS] + _to_sheet_values(new_rows_df, COLUMNS),
+            value_input_option="USER_ENTERED",
+            insert_data_option="INSERT_ROWS",
+        )
+        return
+
+    if any(col not in header for col in COLUMNS):
+        _rewrite_logs(conn, new_rows_df, worksheet)
+        return
+
+    ws.append_rows(
+        _to_sheet_values(new_rows_df, header),
+        value_input_option="USER_ENTERED",
+        insert_data_option="INSERT_ROWS",
+    )
+
+
+def _rewrite_logs(conn, new_rows_df, worksheet):
+    """旧形式のシート向け: 全体を読み直して列を補い、末尾に追加して書き戻す。
+
+    記録ID の無い古い行にはここで ID を振る (アクションの完了状態などは 記録ID で行を指すため)。
+    """
+    with _rewrite_lock:
+        current_df = fill_row_ids(normalize_logs(conn.read(worksheet=worksheet, ttl=0)))
+        updated_df = pd.concat([current_df, new_rows_df], ignore_index=True)
+        conn.update(worksheet=worksheet, data=updated_df)
+
+
+def read_status_sheet(conn):
+    """action_status ワークシートを読む。まだ無ければ空の表"""
+    book = conn.client._open_spreadsheet()
+    if ACTION_STATUS_WORKSHEET not in {ws.title for ws in book.worksheets()}:
+        return pd.DataFrame(columns=ACTION_STATUS_COLUMNS)
+    df = conn.read(worksheet=ACTION_STATUS_WORKSHEET, ttl=0)
+    return df.dropna(how="all").reindex(columns=ACTION_STATUS_COLUMNS).astype(str).reset_index(drop=True)
+
+
+def append_status_sheet(conn, rows_df):
+    """action_status ワークシートの末尾に追記する (無ければ作ってヘッダーを書く)"""
+    book = conn.client._open_spreadsheet()
+    if ACTION_STATUS_WORKSHEET not in {ws.title for ws in book.worksheets()}:
+        book.add_worksheet(title=ACTION_STATUS_WORKSHEET, rows=1, cols=len(ACTION_STATUS_COLUMNS))
+    ws = conn.client._select_worksheet(worksheet=ACTION_STATUS_WORKSHEET)
+    values = _to_sheet_values(rows_df, ACTION_STATUS_COLUMNS)
+    if not ws.row_values(1):
+        values = [ACTION_STATUS_COLUMNS] + values
+    ws.append_rows(values, value_input_option="RAW", insert_data_option="INSERT_ROWS")
+
+
+def filter_logs(df, student=None, mentor=None, date_from=None, date_to=None, exact=False):
+    """pandas での絞り込み。student は exact=False なら前方一致、日付は 'YYYY-MM-DD' 文字列で比較"""
+    mask = pd.Series(True, index=df.index)
+    if student:
+        names = df["生徒氏名"].astype(str)
+        mask &= (names == student) if exact else names.str.startswith(student, na=False)
+    if mentor:
+        mask &= df["担当メンター"] == mentor
+    if date_from or date_to:
+        dates = pd.to_datetime(df["日付"], errors="coerce").dt.strftime("%Y-%m-%d")
+        if date_from:
+            mask &= dates >= str(date_from)
+        if date_to:
+            mask &= dates <= str(date_to)
+    return df[mask]
+
+
+# ==========================================
+# 保存先エンジン
+# ==========================================
+class LogBackend:
+    """保存先の共通インターフェース。
+
+    read_all() は normalize_logs 済み (古い順・index 振り直し済み) の DataFrame を返す。
+    query() の既定実装は全件を読んでから絞り込むので、ローカルエンジンは上書きして
+    必要な行だけを読む。student は exact=False なら前方一致 (インデックスを使えるよう部分一致にはしない)。
+    """
+
+    name = ""
+
+    def read_all(self):
+        raise NotImplementedError
+
+    def append(self, rows_df):
+        raise NotImplementedError
+
+    def query(self, student=None, mentor=None, date_from=None, date_to=None, exact=False):
+        df = self.read_all()
+        return filter_logs(df, student, mentor, date_from, date_to, exact).reset_index(drop=True)
+
+    def is_empty(self):
+        return self.read_all().empty
+
+    def read_changes(self, since):
+        """更新日時 が since より新しい行と、保存先全体の指紋を (changed, fingerprint) で返す。
+
+        fingerprint は log_fingerprint() に列名 (columns) と、読んだセルの量 (bytes、metrics.frame_bytes。
+        計測が無効なら None) を加えた dict。差分を取れない状態 (新しい列が無い旧形式のシートなど) では None を返すので、全件を読み直すこと。
+        既定の実装は全件を読んで絞り込むだけなので、エンジンごとに上書きする。
+        """
+        df = self.read_all()
+        changed = df[df[UPDATED_AT].fillna("").astype(str) > since]
+        return changed, {"columns": tuple(df.columns), "bytes": metrics.frame_bytes(df), **log_fingerprint(df)}
+
+    def ping(self):
+        """保存先に届くかを軽い操作で確かめる (届かなければ例外)。既定の実装は is_empty()"""
+        self.is_empty()
+
+    def read_action_status(self):
+        """アクションの完了状態の記録 (ACTION_STATUS_COLUMNS、追記順) を返す"""
+        raise NotImplementedError
+
+    def append_action_status(self, rows_df):
+        raise NotImplementedError
+
+
+def _column_letter(n):
+    """1 始まりの列番号を A, B, ..., AA の表記にする"""
+    letters = ""
+    while n:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+class GSheetsBackend(LogBackend):
+    name = "gsheets"
+
+    def __init__(self, conn, worksheet=LOG_WORKSHEET, spreadsheet=None):
+        self.conn = conn
+        self.worksheet = worksheet
+        # None なら接続設定の既定のスプレッドシート。アーカイブ先を読むときだけ指定する
+        self.spreadsheet = spreadsheet
+
+    def _where(self):
+        where = {"worksheet": self.worksheet}
+        if self.spreadsheet:
+            where["spreadsheet"] = self.spreadsheet
+        return where
+
+    def read_all(self):
+        return normalize_logs(self.conn.read(**self._where(), ttl=0))
+
+    def append(self, rows_df):
+        append_logs(self.conn, rows_df, self.worksheet)
+
+    def ping(self):
+        # ヘッダー行だけを読む (全件を読む is_empty() は重い)
+        self.conn.client._select_worksheet(**self._where()).row_values(1)
+
+    def read_action_status(self):
+        return read_status_sheet(self.conn)
+
+    def append_action_status(self, rows_df):
+        append_status_sheet(self.conn, rows_df)
+
+    # 変更のあった行が多いときは個別に取るより全件を読み直す
+    MAX_CHANGED_RANGES = 200
+
+    def read_changes(self, since):
+        """記録ID・更新日時の 2 列だけを読み、更新日時 が since より新しい行を範囲指定で取る。
+
+        API 呼び出しはヘッダー、2 列、変更行 (あれば) の最大 3 回で、データJSON などの大きい列は
+        変更行の分しか転送しない。行数は 2 列の長さから数える (末尾の行は必ず記録ID を持つため、
+        記録ID の無い旧形式の行も数に入る)。
+        """
+        ws = self.conn.client._select_worksheet(**self._where())
+        header = ws.row_values(1)
+        if any(col not in header for col in COLUMNS):
+            return None
+        letters = [_column_letter(header.index(col) + 1) for col in (ROW_ID, UPDATED_AT)]
+        columns = ws.batch_get([f"{c}2:{c}" for c in letters])
+        n_rows = max(len(col) for col in columns)
+        cells = [[(row[0] if row else "") for row in col] + [""] * (n_rows - len(col)) for col in columns]
+        keys = pd.DataFrame({ROW_ID: cells[0], UPDATED_AT: cells[1]})
+
+        positions = keys.index[keys[UPDATED_AT].astype(str) > since].tolist()
+        ranges = []
+        for pos in positions:
+            if ranges and ranges[-1][1] == pos - 1:
+                ranges[-1][1] = pos
+            else:
+                ranges.append([pos, pos])
+        if len(ranges) > self.MAX_CHANGED_RANGES:
+            return None
+
+        last = _column_letter(len(header))
+        values = []
+        if ranges:
+            for block in ws.batch_get([f"A{a + 2}:{last}{b + 2}" for a, b in ranges]):
+                values.extend(list(row) + [""] * (len(header) - len(row)) for row in block)
+        changed = pd.DataFrame(values, columns=header).reindex(columns=COLUMNS)
+        return changed, {"columns": tuple(header), "bytes": metrics.frame_bytes(keys, changed), **log_fingerprint(keys)}
+
+
+# ==========================================
+# 期間ごとのワークシート (パーティション)
+# ==========================================
+PARTITION_SCHEMES = ("year", "month")
+_PARTITION_RE = re.compile(r"^logs_(\d{4})(?:_(\d{2}))?$")
+# 年度・月の区切りは利用者の地域の時刻で決める (UTC のままだと 4/1 の 9:00 に年度が替わる)
+PARTITION_TZ = "Asia/Tokyo"
+
+
+def _local_time(t):
+    """UNIX 時刻 t を PARTITION_TZ の (タイムゾーンなしの) 時刻にする"""
+    return pd.Timestamp(t, unit="s", tz="UTC").tz_convert(PARTITION_TZ).tz_localize(None)
+
+
+def partition_name(t, scheme="year"):
+    """時刻 t (PARTITION_TZ) の行を入れるワークシート名。year は 4 月始まりの年度 (logs_2026)、month は月 (logs_2026_10)"""
+    t = pd.Timestamp(t)
+    if scheme == "month":
+        return f"logs_{t.year}_{t.month:02d}"
+    return f"logs_{t.year if t.month >= 4 else t.year - 1}"
+
+
+def partition_period(name):
+    """partition_name() の逆。(開始, 終了) を返す (終了の時刻は含まない)"""
+    year, month = _PARTITION_RE.match(name).groups()
+    if month:
+        start = pd.Timestamp(int(year), int(month), 1)
+        return start, start + pd.DateOffset(months=1)
+    return pd.Timestamp(int(year), 4, 1), pd.Timestamp(int(year) + 1, 4, 1)
+
+
+def _stamp_time(stamp):
+    """更新日時 (UTC の表記) を PARTITION_TZ の時刻にする"""
+    return _local_time(parse_stamp(stamp))
+
+
+class PartitionedSheetsBackend(LogBackend):
+    """年度 (または月) ごとのワークシート logs_2026 / logs_2026_10 に分けた Google Sheets。
+
+    行は保存先に書いた時刻 (更新日時) の期間のワークシートに追記する。期間が終わったワークシートには
+    もう書き込まれない (閉じたパーティション) ので、compact() で日付順に並べ直して余分なセルを削り、
+    archive() で別のスプレッドシート (archive_spreadsheet) に移せる。移した後も読み込みの対象に含める。
+
+    読み込みは各パーティションをスレッドプールで並行に読む。差分同期 (read_changes) で読むのは
+    since より後に書き込まれうるパーティションだけで、閉じたパーティションは前回読んだときの指紋を使う。
+    行の振り分けは保存した時刻で決まり、面談の日付とは限らない (先の日付も入力・取り込みできる) ため、
+    query() が読まずに済ませるのは、read_all() で読んだときの日付の最大値が date_from より前の
+    閉じたパーティションだけにする。
+    """
+
+    name = "gsheets"
+    # 端末間の時計のずれを見込み、期間の終わりからこれだけ経ってから閉じたとみなす
+    CLOSE_GRACE = pd.Timedelta(hours=1)
+
+    def __init__(self, conn, scheme="year", archive_spreadsheet=None, max_workers=4):
+        if scheme not in PARTITION_SCHEMES:
+            raise ValueError(f"未対応のパーティション単位です: {scheme}")
+        self.conn = conn
+        self.scheme = scheme
+        self.archive_spreadsheet = archive_spreadsheet or None
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._known = set()                # 既定のスプレッドシートにあると確認したパーティション
+        self._closed_fingerprints = {}     # 閉じたパーティション → log_fingerprint()
+        self._closed_max_dates = {}        # 閉じたパーティション → 日付 の最大値 (read_all で読んだもの)
+
+    # --- パーティションの一覧 ---
+    def partitions(self):
+        """パーティション名 → 置き場所 (None は既定のスプレッドシート、それ以外はアーカイブ先)。古い順"""
+        found = {}
+        for source in [None] + ([self.archive_spreadsheet] if self.archive_spreadsheet else []):
+            for ws in self.conn.client._open_spreadsheet(spreadsheet=source).worksheets():
+                m = _PARTITION_RE.match(ws.title)
+                if m and bool(m.group(2)) == (self.scheme == "month"):
+                    found.setdefault(ws.title, source)
+        with self._lock:
+            self._known = {name for name, source in found.items() if source is None}
+        return dict(sorted(found.items()))
+
+    def is_closed(self, name, now=None):
+        now = _local_time(time.time()) if now is None else now
+        return partition_period(name)[1] + self.CLOSE_GRACE <= now
+
+    def _part(self, name, source=None):
+        return GSheetsBackend(self.conn, worksheet=name, spreadsheet=source)
+
+    def _fan_out(self, fn, parts):
+        """parts の (名前, 置き場所) ごとに fn(GSheetsBackend) を並行に呼び、結果を同じ順で返す"""
+        parts = list(parts)
+        if len(parts) <= 1:
+            return [fn(self._part(*p)) for p in parts]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(lambda p: fn(self._part(*p)), parts))
+
+    @staticmethod
+    def _concat(frames):
+        frames = [f for f in frames if not f.empty]
+        if not frames:
+            return normalize_logs(pd.DataFrame(columns=COLUMNS))
+        return normalize_logs(pd.concat(frames, ignore_index=True))
+
+    # --- 読み込み ---
+    def read_all(self):
+        parts = self.partitions()
+        frames = self._fan_out(lambda p: p.read_all(), parts.items())
+        now = _local_time(time.time())
+        with self._lock:
+            for name, df in zip(parts, frames):
+                if self.is_closed(name, now):
+                    self._closed_fingerprints[name] = log_fingerprint(df)
+                    self._closed_max_dates[name] = pd.to_datetime(df["日付"], errors="coerce").max()
+        return self._concat(frames)
+
+    def query(self, student=None, mentor=None, date_from=None, date_to=None, exact=False):
+        parts = self.partitions().items()
+        if date_from:
+            start = pd.Timestamp(str(date_from))
+            with self._lock:
+                max_dates = dict(self._closed_max_dates)
+            # 日付の最大値が分からない (まだ読んでいない・日付が空) パーティションは読む
+            parts = [(n, s) for n, s in parts if not (pd.notna(max_dates.get(n)) and max_dates[n] < start)]
+        frames = self._fan_out(lambda p: p.query(student, mentor, date_from, date_to, exact), parts)
+        return self._concat(frames)
+
+    def is_empty(self):
+        parts = self.partitions()
+        return all(df.empty for df in self._fan_out(lambda p: p.read_all(), parts.items()))
+
+    def read_changes(self, since):
+        parts = self.partitions()
+        since_time = _stamp_time(since) if since else None
+        now = _local_time(time.time())
+        fingerprints, scan = [], []
+        with self._lock:
+            for name, source in parts.items():
+                cached = self._closed_fingerprints.get(name)
+                if cached and since_time is not None and partition_period(name)[1] <= since_time:
+                    fingerprints.append(cached)
+                else:
+                    scan.append((name, source))
+
+        results = self._fan_out(lambda p: p.read_changes(since), scan)
+        if any(r is None for r in results):
+            return None
+        with self._lock:
+            for (name, _), (_, fp) in zip(scan, results):
+                if self.is_closed(name, now):
+                    fp = {"rows": fp["rows"], "checksum": fp["checksum"]}
+                    if self._closed_fingerprints.get(name) != fp:
+                        # 中身が変わっていれば日付の最大値も読み直すまで使わない
+                        self._closed_max_dates.pop(name, None)
+                    self._closed_fingerprints[name] = fp
+        fingerprints += [fp for _, fp in results]
+        changed = [c for c, _ in results if not c.empty]
+        changed = pd.concat(changed, ignore_index=True) if changed else pd.DataFrame(columns=COLUMNS)
+        return changed, {
+            "columns": tuple(COLUMNS),
+            "bytes": sum(fp["bytes"] for _, fp in results) if metrics.is_enabled() else None,
+            "rows": sum(fp["rows"] for fp in fingerprints),
+            # チェックサムは行ごとのハッシュの和 (2**64 で折り返す) なので、パーティションごとの値を足せる
+            "checksum": sum(fp["checksum"] for fp in fingerprints) % 2**64,
+        }
+
+    # --- 書き込み ---
+    def append(self, rows_df):
+        if UPDATED_AT in rows_df.columns and rows_df[UPDATED_AT].notna().all():
+            names = rows_df[UPDATED_AT].map(lambda s: partition_name(_stamp_time(s), self.scheme))
+        else:
+            names = pd.Series(partition_name(_local_time(time.time()), self.scheme), index=rows_df.index)
+        for name, group in rows_df.groupby(names, sort=True):
+            self._ensure_partition(name)
+            append_logs(self.conn, group, worksheet=name)
+
+    def ping(self):
+        # ワークシートの一覧だけを取る
+        self.partitions()
+
+    def read_action_status(self):
+        # 完了状態はパーティションに分けず、既定のスプレッドシートの 1 枚に置く
+        return read_status_sheet(self.conn)
+
+    def append_action_status(self, rows_df):
+        append_status_sheet(self.conn, rows_df)
+
+    def _ensure_partition(self, name):
+        with self._lock:
+            if name in self._known:
+                return
+        book = self.conn.client._open_spreadsheet()
+        if name not in {ws.title for ws in book.worksheets()}:
+            # ヘッダーは最初の append_logs が書く
+            book.add_worksheet(title=name, rows=1, cols=len(COLUMNS))
+        with self._lock:
+            self._known.add(name)
+
+    # --- 閉じたパーティションの整理 ---
+    def compact(self, name):
+        """閉じたパーティションを日付順に書き直し、シートの行・列を中身の大きさまで縮める"""
+        if not self.is_closed(name):
+            raise ValueError(f"{name} はまだ書き込み中のパーティションです")
+        source = self.partitions().get(name)
+        part = self._part(name, source)
+        # 書き直すついでに旧形式の データJSON を版 2 にする
+        df, _ = upgrade_logs(part.read_all())
+        self.conn.update(**part._where(), data=df)
+        ws = self.conn.client._select_worksheet(**part._where())
+        ws.resize(rows=len(df) + 1, cols=len(COLUMNS))
+        return len(df)
+
+    def archive(self, name):
+        """閉じたパーティションをアーカイブ先のスプレッドシートへ移す。移した行数を返す"""
+        if not self.archive_spreadsheet:
+            raise ValueError("archive_spreadsheet が設定されていません")
+        if not self.is_closed(name):
+            raise ValueError(f"{name} はまだ書き込み中のパーティションです")
+        df = self._part(name).read_all()
+        dest = self.conn.client._open_spreadsheet(spreadsheet=self.archive_spreadsheet)
+        if name in {ws.title for ws in dest.worksheets()}:
+            raise ValueError(f"アーカイブ先に既に {name} があります")
+        ws = dest.add_worksheet(title=name, rows=len(df) + 1, cols=len(COLUMNS))
+        ws.append_rows(
+            [COLUMNS] + _to_sheet_values(df, COLUMNS),
+            value_input_option="USER_ENTERED",
+            insert_data_option="INSERT_ROWS",
+        )
+        copied = self._part(name, self.archive_spreadsheet).read_all()
+        if log_fingerprint(copied) != log_fingerprint(df):
+            raise RuntimeError(f"{name} のアーカイブ先の内容が一致しません (元のシートは残しています)")
+        book = self.conn.client._open_spreadsheet()
+        book.del_worksheet(book.worksheet(name))
+        with self._lock:
+            self._known.discard(name)
+        return len(df)
+
+    def maintain(self, keep=2):
+        """閉じたパーティションを整理する: 新しい方から keep 個は既定のスプレッドシートに残して縮め、
+        それより古いものはアーカイブ先があれば移す。行ったことを (操作, パーティション名, 行数) のリストで返す"""
+        done = []
+        closed = [(n, s) for n, s in self.partitions().items() if s is None and self.is_closed(n)]
+        for i, (name, _) in enumerate(reversed(closed)):
+            if i >= keep and self.archive_spreadsheet:
+                done.append(("archive", name, self.archive(name)))
+            else:
+                done.append(("compact", name, self.compact(name)))
+        return done
+
+
+def _as_text_rows(rows_df):
+    """ローカル保存用に COLUMNS の順・文字列 (欠損は None) へ揃える"""
+    df = rows_df.reindex(columns=COLUMNS).astype(object)
+    df = df.where(pd.notna(df), None)
+    return df.map(lambda v: v if v is None else str(v))
+
+
+class SQLiteBackend(LogBackend):
+    """1 行 1 レコードの SQLite テーブル。生徒・メンター・日付にインデックスを張る"""
+
+    name = "sqlite"
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        cols = ", ".join(f'"{c}" TEXT' for c in COLUMNS)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(f"CREATE TABLE IF NOT EXISTS logs (id INTEGER PRIMARY KEY AUTOINCREMENT, {cols})")
+            # 記録ID・更新日時が無かった頃の DB には列を足す
+            existing = {row[1] for row in db.execute("PRAGMA table_info(logs)")}
+            for col in COLUMNS:
+                if col not in existing:
+                    db.execute(f'ALTER TABLE logs ADD COLUMN "{col}" TEXT')
+            db.execute('CREATE INDEX IF NOT EXISTS idx_logs_student ON logs ("生徒氏名", "日付")')
+            db.execute('CREATE INDEX IF NOT EXISTS idx_logs_mentor ON logs ("担当メンター", "日付")')
+            db.execute('CREATE INDEX IF NOT EXISTS idx_logs_date ON logs ("日付")')
+            db.execute('CREATE INDEX IF NOT EXISTS idx_logs_updated ON logs ("更新日時")')
+            status_cols = ", ".join(f'"{c}" TEXT' for c in ACTION_STATUS_COLUMNS)
+            db.execute(f"CREATE TABLE IF NOT EXISTS action_status (id INTEGER PRIMARY KEY AUTOINCREMENT, {status_cols})")
+
+    def _connect(self):
+        # セッション (スレッド) ごとに接続を開く。書き込みは SQLite 側のロックで直列化される
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _select(self, where="", params=()):
+        cols = ", ".join(f'"{c}"' for c in COLUMNS)
+        sql = f"SELECT {cols} FROM logs {where} ORDER BY \"日付\", id"
+        with self._connect() as db:
+            rows = db.execute(sql, params).fetchall()
+        return pd.DataFrame(rows, columns=COLUMNS)
+
+    def read_all(self):
+        return normalize_logs(self._select())
+
+    def is_empty(self):
+        with self._connect() as db:
+            return db.execute("SELECT 1 FROM logs LIMIT 1").fetchone() is None
+
+    def append(self, rows_df):
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        cols = ", ".join(f'"{c}"' for c in COLUMNS)
+        with self._connect() as db:
+            db.executemany(
+                f"INSERT INTO logs ({cols}) VALUES ({placeholders})",
+                _as_text_rows(rows_df).values.tolist(),
+            )
+
+    def read_action_status(self):
+        cols = ", ".join(f'"{c}"' for c in ACTION_STATUS_COLUMNS)
+        with self._connect() as db:
+            rows = db.execute(f"SELECT {cols} FROM action_status ORDER BY id").fetchall()
+        return pd.DataFrame(rows, columns=ACTION_STATUS_COLUMNS)
+
+    def append_action_status(self, rows_df):
+        placeholders = ", ".join("?" for _ in ACTION_STATUS_COLUMNS)
+        cols = ", ".join(f'"{c}"' for c in ACTION_STATUS_COLUMNS)
+        with self._connect() as db:
+            db.executemany(
+                f"INSERT INTO action_status ({cols}) VALUES ({placeholders})",
+                rows_df.reindex(columns=ACTION_STATUS_COLUMNS).astype(str).values.tolist(),
+            )
+
+    def read_changes(self, since):
+        changed = self._select('WHERE "更新日時" > ?', (since,))
+        with self._connect() as db:
+            keys = pd.DataFrame(db.execute('SELECT "記録ID", "更新日時" FROM logs').fetchall(), columns=[ROW_ID, UPDATED_AT])
+        return changed, {"columns": tuple(COLUMNS), "bytes": metrics.frame_bytes(keys, changed), **log_fingerprint(keys)}
+
+    def query(self, student=None, mentor=None, date_from=None, date_to=None, exact=False):
+        conds, params = [], []
+        if student:
+            if exact:
+                conds.append('"生徒氏名" = ?')
+                params.append(student)
+            else:
+                # 前方一致は範囲の条件にして idx_logs_student を使わせる (LIKE / instr ではインデックスが効かない)
+                conds.append('"生徒氏名" >= ? AND "生徒氏名" < ?')
+                params += [student, student + "\U0010ffff"]
+        if mentor:
+            conds.append('"担当メンター" = ?')
+            params.append(mentor)
+        if date_from:
+            conds.append('"日付" >= ?')
+            params.append(str(date_from))
+        if date_to:
+            conds.append('"日付" <= ?')
+            params.append(str(date_to))
+        where = f"WHERE {' AND '.join(conds)}" if conds else ""
+        return self._select(where, params)
+
+
+class ParquetBackend(LogBackend):
+    """Parquet の部品ファイルを追記していく列指向の保存先。
+
+    保存のたびに part-<時刻>.parquet を 1 つ足し、部品が COMPACT_AT 個を超えたら
+    日付順の 1 ファイルにまとめる。絞り込みは pyarrow の式として読み込み時に適用し、
+    条件に合わない行グループは読み飛ばす。pyarrow が必要。
+    """
+
+    name = "parquet"
+    COMPACT_AT = 64
+    ROW_GROUP_SIZE = 10_000
+
+    def __init__(self, path):
+        import pyarrow as pa
+
+        self.path = path
+        self.schema = pa.schema([(c, pa.string()) for c in COLUMNS])
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _parts(self):
+        return sorted(glob.glob(os.path.join(self.path, "*.parquet")))
+
+    def _read(self, expr=None, columns=None):
+        import pyarrow.dataset as ds
+
+        parts = self._parts()
+        if not parts:
+            return pd.DataFrame(columns=columns or COLUMNS)
+        # 記録ID・更新日時の無い古い部品ファイルは、その列を空として読む
+        table = ds.dataset(parts, schema=self.schema, format="parquet").to_table(columns=columns, filter=expr)
+        df = table.to_pandas().astype(object)
+        return df.where(pd.notna(df), None)
+
+    def _write(self, df, name):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(_as_text_rows(df), schema=self.schema, preserve_index=False)
+        tmp = os.path.join(self.path, f".{name}.tmp")
+        pq.write_table(table, tmp, row_group_size=self.ROW_GROUP_SIZE)
+        os.replace(tmp, os.path.join(self.path, name))
+
+    def read_all(self):
+        return normalize_logs(self._read())
+
+    def is_empty(self):
+        return not self._parts()
+
+    def ping(self):
+        if not os.path.isdir(self.path):
+            raise FileNotFoundError(f"保存先のフォルダがありません: {self.path}")
+
+    def append(self, rows_df):
+        with self._lock:
+            self._write(rows_df, f"part-{time.time_ns()}.parquet")
+            if len(self._parts()) > self.COMPACT_AT:
+                self.compact()
+
+    def read_action_status(self):
+        # 完了状態は action_status/ の下に追記ごとの小さなファイルとして置く (部品のまとめ直しはしない)
+        parts = sorted(glob.glob(os.path.join(self.path, ACTION_STATUS_WORKSHEET, "*.parquet")))
+        if not parts:
+            return pd.DataFrame(columns=ACTION_STATUS_COLUMNS)
+        return pd.concat([pd.read_parquet(p) for p in parts], ignore_index=True)
+
+    def append_action_status(self, rows_df):
+        folder = os.path.join(self.path, ACTION_STATUS_WORKSHEET)
+        os.makedirs(folder, exist_ok=True)
+        name = f"part-{time.time_ns()}.parquet"
+        tmp = os.path.join(folder, f".{name}.tmp")
+        rows_df.reindex(columns=ACTION_STATUS_COLUMNS).astype(str).to_parquet(tmp, index=False)
+        os.replace(tmp, os.path.join(folder, name))
+
+    def read_changes(self, since):
+        import pyarrow.dataset as ds
+
+        changed = self._read(ds.field(UPDATED_AT) > since)
+        keys = self._read(columns=[ROW_ID, UPDATED_AT])
+        return changed, {"columns": tuple(COLUMNS), "bytes": metrics.frame_bytes(keys, changed), **log_fingerprint(keys)}
+
+    def compact(self):
+        """部品ファイルを日付順の 1 ファイルにまとめる"""
+        parts = self._parts()
+        if len(parts) <= 1:
+            return
+        df, _ = upgrade_logs(self.read_all())
+        # base-* は part-* より前に並ぶので、書き込み後に古い部品を消しても順序は保たれる
+        self._write(df, f"base-{time.time_ns()}.parquet")
+        for p in parts:
+            os.remove(p)
+
+    def query(self, student=None, mentor=None, date_from=None, date_to=None, exact=False):
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+
+        conds = []
+        if student:
+            name = ds.field("生徒氏名")
+            conds.append(name == student if exact else pc.starts_with(name, student))
+        if mentor:
+            conds.append(ds.field("担当メンター") == mentor)
+        if date_from:
+            conds.append(ds.field("日付") >= str(date_from))
+        if date_to:
+            conds.append(ds.field("日付") <= str(date_to))
+        expr = None
+        for cond in conds:
+            expr = cond if expr is None else expr & cond
+        return normalize_logs(self._read(expr))
+
+
+def create_backend(kind, conn=None, path=None, partition=None, archive_spreadsheet=None):
+    """設定値 storage_backend からエンジンを作る。gsheets は partition (year / month) で期間ごとに分ける"""
+    if kind == "gsheets":
+        if partition:
+            return PartitionedSheetsBackend(conn, scheme=partition, archive_spreadsheet=archive_spreadsheet)
+        return GSheetsBackend(conn)
+    if kind == "sqlite":
+        return SQLiteBackend(path or os.path.join("data", "aloha_logs.db"))
+    if kind == "parquet":
+        return ParquetBackend(path or os.path.join("data", "aloha_logs_parquet"))
+    raise ValueError(f"未対応の保存先です: {kind}")
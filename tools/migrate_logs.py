@@ -0,0 +1,60 @@
+"""保存先エンジン間でログを移し替える
+
+例:
+    python tools/migrate_logs.py --src gsheets --dst sqlite --dst-path data/aloha_logs.db
+    python tools/migrate_logs.py --src sqlite --src-path data/aloha_logs.db --dst parquet
+
+gsheets を使う場合はアプリと同じ .streamlit/secrets.toml を読むため、リポジトリ直下で実行する。
+移行先は空であることを前提にし、既に行があれば --force なしでは中断する。
+記録ID の無い古い行には移行時に ID を振る。
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import create_backend, fill_row_ids  # noqa: E402
+
+BATCH_SIZE = 5_000
+
+
+def _open(kind, path):
+    if kind == "gsheets":
+        import streamlit as st
+        from streamlit_gsheets import GSheetsConnection
+
+        return create_backend("gsheets", conn=st.connection("gsheets", type=GSheetsConnection))
+    return create_backend(kind, path=path)
+
+
+def migrate(src, dst, force=False):
+    """src の全行を古い順のまま dst に追記し、移した行数を返す"""
+    if not dst.is_empty() and not force:
+        raise SystemExit("移行先に既にデータがあります (上書き追記するなら --force)")
+    # 記録ID の無い古い行には ID を振ってから移す (アクションの完了状態は 記録ID で行を指す)
+    df = fill_row_ids(src.read_all())
+    for start in range(0, len(df), BATCH_SIZE):
+        dst.append(df.iloc[start:start + BATCH_SIZE])
+    return len(df)
+
+
+def main():
+    kinds = ["gsheets", "sqlite", "parquet"]
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--src", choices=kinds, required=True)
+    parser.add_argument("--src-path")
+    parser.add_argument("--dst", choices=kinds, required=True)
+    parser.add_argument("--dst-path")
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    src = _open(args.src, args.src_path)
+    dst = _open(args.dst, args.dst_path)
+    n = migrate(src, dst, force=args.force)
+    check = len(dst.read_all())
+    print(f"{n} 行を {args.src} → {args.dst} に移行しました (移行先の総行数: {check})")
+
+
+if __name__ == "__main__":
+    main()
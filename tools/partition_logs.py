@@ -0,0 +1,115 @@
+"""Google Sheets のログを期間ごとのワークシート (パーティション) に分ける・整理する
+
+例:
+    python tools/partition_logs.py cutover --scheme year --dry-run   # 分け方だけ表示
+    python tools/partition_logs.py cutover --scheme year             # logs を logs_2025, logs_2026, ... に分割
+    python tools/partition_logs.py list --scheme year
+    python tools/partition_logs.py maintain --scheme year --keep 2 --archive "aloha ログ (アーカイブ)"
+
+cutover は 1 枚の logs シートを読み、更新日時 (無い古い行は 日付) の期間ごとにワークシートを作って書き込む。
+書き込んだ内容を読み直して (記録ID, 更新日時) の指紋が一致したら、logs を logs_before_partition に改名して残す。
+切り替えの間はアプリを止めるか、保存が logs に届かないよう書き込みキューを止めておくこと。
+終わったら secrets の log_partition に同じ単位 (year / month) を設定する。
+
+アプリと同じ .streamlit/secrets.toml を読むため、リポジトリ直下で実行する。
+"""
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import (  # noqa: E402
+    LOG_WORKSHEET, PARTITION_SCHEMES, PARTITION_TZ, UPDATED_AT, GSheetsBackend, PartitionedSheetsBackend,
+    append_logs, fill_row_ids, log_fingerprint, partition_name, _stamp_time,
+)
+
+BATCH_SIZE = 5_000
+BACKUP_WORKSHEET = "logs_before_partition"
+
+
+def _connect():
+    import streamlit as st
+    from streamlit_gsheets import GSheetsConnection
+
+    return st.connection("gsheets", type=GSheetsConnection)
+
+
+def assign_partitions(df, scheme):
+    """各行のパーティション名の Series。更新日時 があればその時刻、無ければ 日付 で決める"""
+    stamps = df[UPDATED_AT].fillna("").astype(str)
+    dates = pd.to_datetime(df["日付"], errors="coerce")
+    fallback = pd.Timestamp.now(tz=PARTITION_TZ).tz_localize(None)
+    names = []
+    for stamp, date in zip(stamps, dates):
+        t = _stamp_time(stamp) if stamp else (date if pd.notna(date) else fallback)
+        names.append(partition_name(t, scheme))
+    return pd.Series(names, index=df.index)
+
+
+def cutover(conn, scheme, dry_run=False, force=False):
+    """logs をパーティションに分けて書き込み、{パーティション名: 行数} を返す"""
+    df = GSheetsBackend(conn).read_all()
+    # 記録ID の無い古い行には ID を振る (更新日時 は書いた時刻が分からないので空のまま)
+    df = fill_row_ids(df)
+    groups = {name: group for name, group in df.groupby(assign_partitions(df, scheme), sort=True)}
+    counts = {name: len(group) for name, group in groups.items()}
+    if dry_run:
+        return counts
+
+    backend = PartitionedSheetsBackend(conn, scheme=scheme)
+    existing = backend.partitions()
+    if existing and not force:
+        raise SystemExit(f"既にパーティションがあります: {', '.join(existing)} (そのまま追記するなら --force)")
+    for name, group in groups.items():
+        backend._ensure_partition(name)
+        for start in range(0, len(group), BATCH_SIZE):
+            append_logs(conn, group.iloc[start:start + BATCH_SIZE], worksheet=name)
+        if not existing:
+            written = GSheetsBackend(conn, worksheet=name).read_all()
+            if log_fingerprint(written) != log_fingerprint(group):
+                raise SystemExit(f"{name} の書き込み内容が一致しません。logs はそのまま残しています")
+
+    book = conn.client._open_spreadsheet()
+    book.worksheet(LOG_WORKSHEET).update_title(BACKUP_WORKSHEET)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["cutover", "list", "compact", "archive", "maintain"])
+    parser.add_argument("partitions", nargs="*", help="compact / archive の対象 (例: logs_2024)")
+    parser.add_argument("--scheme", choices=PARTITION_SCHEMES, default="year")
+    parser.add_argument("--archive", help="アーカイブ先のスプレッドシート (名前か URL)")
+    parser.add_argument("--keep", type=int, default=2, help="maintain で既定のスプレッドシートに残す閉じたパーティションの数")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    conn = _connect()
+    if args.command == "cutover":
+        counts = cutover(conn, args.scheme, dry_run=args.dry_run, force=args.force)
+        for name, n in counts.items():
+            print(f"{name}: {n} 行")
+        if not args.dry_run:
+            print(f"{LOG_WORKSHEET} を {BACKUP_WORKSHEET} に改名しました。log_partition = \"{args.scheme}\" を設定してください")
+        return
+
+    backend = PartitionedSheetsBackend(conn, scheme=args.scheme, archive_spreadsheet=args.archive)
+    if args.command == "list":
+        for name, source in backend.partitions().items():
+            state = "閉じた" if backend.is_closed(name) else "書き込み中"
+            print(f"{name}\t{source or '既定'}\t{state}")
+    elif args.command == "maintain":
+        for op, name, n in backend.maintain(keep=args.keep):
+            print(f"{op}: {name} ({n} 行)")
+    else:
+        action = backend.compact if args.command == "compact" else backend.archive
+        for name in args.partitions:
+            print(f"{args.command}: {name} ({action(name)} 行)")
+
+
+if __name__ == "__main__":
+    main()
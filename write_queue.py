@@ -0,0 +1,172 @@
+"""保存の書き込みキュー (ローカルの先行書き込みログ)
+
+save_data() は行をこのキューのファイルに追記 (fsync) した時点で完了とし、
+保存先 (Google Sheets など) への送信はバックグラウンドの Flusher がまとめて行う。
+送信に失敗した行はファイルに残り、指数バックオフで再送する。アプリを再起動しても失われない。
+
+ファイルは JSON Lines で、次の 2 種類の行からなる。
+
+    {"id": 3, "ts": 1760000000.0, "rows": [{...}, ...]}   # 保存された行
+    {"done": [1, 2, 3]}                                     # 送信済みになった id
+
+送信済みでない行が無くなったらファイルを空にする。
+送信に成功した直後 (done を書く前) にプロセスが落ちると、その行は再起動後にもう一度送られる。
+"""
+import json
+import os
+import random
+import threading
+import time
+
+import pandas as pd
+
+import metrics
+from storage import COLUMNS, stamp_rows
+
+
+def _rows_to_records(rows_df):
+    df = rows_df.astype(object)
+    return df.where(pd.notna(df), None).to_dict("records")
+
+
+class WriteQueue:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = {}  # id → 行 (dict) のリスト。追加順
+        self._next_id = 1
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # 書き込み途中で落ちた最終行
+                if "done" in entry:
+                    for entry_id in entry["done"]:
+                        self._pending.pop(entry_id, None)
+                else:
+                    self._pending[entry["id"]] = entry["rows"]
+                    self._next_id = max(self._next_id, entry["id"] + 1)
+
+    def _append_line(self, obj):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    def enqueue(self, rows_df):
+        """行をファイルに書き、id を返す。ここで返った時点で保存は確定している"""
+        rows = _rows_to_records(rows_df)
+        with self._lock:
+            entry_id = self._next_id
+            self._append_line({"id": entry_id, "ts": time.time(), "rows": rows})
+            self._pending[entry_id] = rows
+            self._next_id += 1
+        return entry_id
+
+    def peek(self, max_entries=None):
+        """送信待ちの (id, 行のリスト) を古い順に返す"""
+        with self._lock:
+            entries = list(self._pending.items())
+        return entries[:max_entries] if max_entries else entries
+
+    def mark_done(self, entry_ids):
+        with self._lock:
+            self._append_line({"done": list(entry_ids)})
+            for entry_id in entry_ids:
+                self._pending.pop(entry_id, None)
+            if not self._pending:
+                open(self.path, "w").close()
+
+    def pending_rows(self):
+        """送信待ちの行を古い順の DataFrame で返す"""
+        rows = [row for _, entry_rows in self.peek() for row in entry_rows]
+        return pd.DataFrame(rows, columns=COLUMNS)
+
+
+class Flusher:
+    """WriteQueue の中身を保存先へまとめて送るバックグラウンドスレッド。
+
+    送信に失敗すると base_delay 秒から 2 倍ずつ (上限 max_delay 秒、揺らぎあり) 待って再送する。
+    on_flushed は送信に成功するたびに呼ばれる (スナップショットの読み直しなどに使う)。
+    """
+
+    def __init__(self, queue, backend, batch_entries=50, base_delay=1.0, max_delay=60.0, on_flushed=None):
+        self.queue = queue
+        self.backend = backend
+        self.batch_entries = batch_entries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_flushed = on_flushed
+        self.status = {
+            "flushed_rows": 0,
+            "failures": 0,          # 連続失敗回数
+            "last_error": None,
+            "last_flush_at": None,
+            "next_retry_at": None,
+        }
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="aloha-flusher", daemon=True)
+            self._thread.start()
+        self.wake()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self):
+        """新しい行が入ったことを知らせる (待機中なら即座に送信する)"""
+        self._wake.set()
+
+    def flush_once(self):
+        """送信待ちを 1 バッチ送る。送るものが無いか成功すれば True"""
+        entries = self.queue.peek(self.batch_entries)
+        if not entries:
+            return True
+        rows = [row for _, entry_rows in entries for row in entry_rows]
+        # 更新日時は保存先に書いた時刻にする (差分同期は保存先に現れた順に拾うため)
+        rows_df = stamp_rows(pd.DataFrame(rows, columns=COLUMNS))
+        started = time.perf_counter()
+        try:
+            self.backend.append(rows_df)
+            metrics.record("flush.append", time.perf_counter() - started, metrics.frame_bytes(rows_df))
+        except Exception as e:
+            self.status["failures"] += 1
+            self.status["last_error"] = f"{type(e).__name__}: {e}"
+            return False
+        self.queue.mark_done([entry_id for entry_id, _ in entries])
+        self.status.update(failures=0, last_error=None, last_flush_at=time.time(), next_retry_at=None)
+        self.status["flushed_rows"] += len(rows)
+        if self.on_flushed is not None:
+            self.on_flushed()
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            if len(self.queue) == 0:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            if self.flush_once():
+                continue
+            delay = min(self.max_delay, self.base_delay * 2 ** (self.status["failures"] - 1))
+            delay *= random.uniform(0.5, 1.0)
+            self.status["next_retry_at"] = time.time() + delay
+            # バックオフ中は新しい保存が来ても待つ (クォータ超過時に連打しない)
+            self._stop.wait(delay)